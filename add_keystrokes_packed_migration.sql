@@ -0,0 +1,8 @@
+-- Migration script to add the compact keystroke column to typing_progress
+-- Run this script to update existing databases, then convert the stored
+-- JSON logs with:  flask --app app pack-keystrokes
+
+USE dyslexia_study;
+
+ALTER TABLE typing_progress
+ADD COLUMN IF NOT EXISTS keystrokes_packed LONGBLOB AFTER keystrokes;
@@ -1,11 +1,37 @@
-from flask import Flask, request, jsonify, session, flash, redirect, url_for, render_template, send_from_directory
+from flask import Flask, request, jsonify, session, flash, redirect, url_for, render_template, g, has_app_context, Response, stream_with_context
 from flask_cors import CORS
 import mysql.connector
+from db_pool import ConnectionPool
+from sql_timing import SqlTiming
+from attempts import resolve_active_attempt, find_active_attempt, start_new_attempt, complete_attempt, remember_committed_attempts
+from catalog import TaskCatalog, TaskMatrix, VersionSignal
+from class_levels import ClassLevelCache
+from content_cache import ContentCache
+import audio_uploads
+import audio_jobs
+import image_renditions
+import job_queue
+import student_import
+import import_jobs
+import study_export
+import study_snapshot
+from storage import LocalBlobStore, UploadStorage, ensure_table as ensure_upload_files_schema
+from reading_picker import ReadingTaskPicker, seen as seen_reading_tasks, remember as remember_reading_task
+from autosave import ProgressBuffer
+from keystrokes import ensure_schema as ensure_keystroke_schema, append_chunk, load_keystrokes, drop_chunks, pack_legacy_rows, MAX_CHUNK_EVENTS
+from keystroke_codec import pack as pack_keystrokes, unpack as unpack_keystrokes
+from class_stats import ensure_table as ensure_class_statistics_schema, changed_users as class_stats_changed_users, changed_classes as class_stats_changed_classes, mark_class_changed, mark_classes_of_users, mark_user_changed, refresh_for_users as refresh_class_stats_for_users, rebuild as rebuild_class_stats, school_statistics
+from children import load_children, load_task_progress, recent_activity as recent_task_activity, pick
+from migrations import migrate as run_migrations, pending as pending_migrations
+from explain_check import check as explain_hot_queries, HOT_QUERIES
+from typing_features import ensure_table as ensure_typing_features_table, refresh_stored as refresh_typing_features, refresh_all as refresh_all_typing_features
 from datetime import datetime
 import json
+import click
 import bcrypt
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, send_file as werkzeug_send_file
+from urllib.parse import quote
 from authlib.integrations.flask_client import OAuth
 
 
@@ -26,6 +52,78 @@ DB_CONFIG = {
     "port": int(os.getenv("MYSQLPORT", 3306))
 }
 
+def ensure_typing_keystroke_storage():
+    """Create typing_keystroke_chunks, typing_progress.keystrokes_packed and typing_features if they don't exist."""
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        ensure_keystroke_schema(conn)
+        ensure_typing_features_table(conn)
+    except Exception as e:
+        print(f"Error ensuring typing keystroke storage: {e}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def warn_pending_migrations():
+    """Warn loudly at startup while schema migrations are pending."""
+    # Upserts keyed on attempt_id and demographics user_id write duplicate rows without the keys they add
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        waiting = pending_migrations(conn)
+        if waiting:
+            print("=" * 72)
+            print(f"WARNING: {len(waiting)} schema migrations are pending; run `flask db-migrate`:")
+            for version, name, _ in waiting:
+                print(f"  {version}: {name}")
+            print("=" * 72)
+    except Exception as e:
+        print(f"Error checking schema migrations: {e}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def ensure_upload_tables():
+    """Create the upload, post-processing and import job tables if they don't exist."""
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        audio_uploads.ensure_table(conn)
+        ensure_upload_files_schema(conn)
+        audio_jobs.ensure_tables(conn)
+        image_renditions.ensure_tables(conn)
+        import_jobs.ensure_table(conn)
+    except Exception as e:
+        print(f"Error ensuring upload tables: {e}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def ensure_class_statistics_table():
+    """Create class_statistics table if it doesn't exist."""
+    conn = connect_db()
+    if not conn:
+        return
+    try:
+        ensure_class_statistics_schema(conn)
+    except Exception as e:
+        print(f"Error ensuring class_statistics table: {e}")
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 def ensure_suggested_tasks_table():
     """Create suggested_tasks table if it doesn't exist."""
     conn = connect_db()
@@ -60,34 +158,114 @@ def ensure_suggested_tasks_table():
         except Exception:
             pass
 
+# Query timing (Server-Timing header and slow-query log, see sql_timing.py); off unless SQL_TIMING=1
+sql_timing = SqlTiming(
+    slow_ms=float(os.getenv("SQL_SLOW_MS", 200)),
+    log_path=os.getenv("SQL_SLOW_LOG") or None,
+) if os.getenv("SQL_TIMING", "0") == "1" else None
+if sql_timing:
+    sql_timing.init_app(app)
+
+# Buffered cursors so helpers sharing the request connection never trip over unread results
+db_pool = ConnectionPool(
+    dict(DB_CONFIG, buffered=True),
+    size=int(os.getenv("DB_POOL_SIZE", 5)),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    ping_on_borrow=os.getenv("DB_POOL_PING", "1") != "0",
+    wrap_cursor=sql_timing.wrap if sql_timing else None,
+)
+
 def connect_db():
-    """Establishes a connection to the MySQL database."""
+    """Returns the pooled connection bound to the current request (or a pooled one outside a request)."""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        print("Connected to the database successfully!")
-        return conn
+        if has_app_context():
+            if 'db_conn' not in g:
+                g.db_conn = db_pool.connection(request_bound=True)
+            return g.db_conn
+        return db_pool.connection()
     except mysql.connector.Error as err:
         print(f"Error: {err}")
         return None
 
-def _get_user_class_level(conn, user_id):
-    """Helper function to get user's class level from demographics"""
+# Active attempts go into the session only once the request that found them succeeded
+app.after_request(remember_committed_attempts)
+
+@app.teardown_request
+def refresh_changed_class_statistics(exc):
+    """Recomputes class statistics for classes whose students or attempts changed in this request."""
+    users = class_stats_changed_users()
+    classes = class_stats_changed_classes()
+    conn = g.get('db_conn')
+    if not (users or classes) or conn is None:
+        return
     try:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT d.education_level 
-            FROM demographics d 
-            WHERE d.user_id = %s
-        """, (user_id,))
-        result = cursor.fetchone()
-        cursor.close()
-        return result['education_level'] if result else None
+        # Work the handler left uncommitted (an error path) is discarded, never committed here
+        if conn.in_transaction:
+            conn.rollback()
+        refresh_class_stats_for_users(conn, users, classes)
+        conn.commit()
     except Exception as e:
-        print(f"Error getting user class level: {e}")
-        return None
+        print(f"Class statistics refresh error: {e}")
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Hands the request's connection back to the pool, discarding uncommitted work."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
+
+# Version files other workers stat() to notice admin changes to cached data
+CACHE_SIGNAL_DIR = os.getenv("CACHE_SIGNAL_DIR", app.instance_path)
+task_catalog = TaskCatalog(connect_db, VersionSignal(os.path.join(CACHE_SIGNAL_DIR, 'tasks.version')))
+# Resolved class levels, per worker and in the user's session (see class_levels.py)
+class_levels = ClassLevelCache(
+    VersionSignal(os.path.join(CACHE_SIGNAL_DIR, 'class_levels.version')),
+    ttl=float(os.getenv("CLASS_LEVEL_CACHE_TTL", 300)),
+)
+# Which task categories have content for each class level, and section assignments
+task_matrix = TaskMatrix(connect_db, VersionSignal(os.path.join(CACHE_SIGNAL_DIR, 'task_matrix.version')))
+# Rendered JSON of the /api/<category>-tasks/<user_id> endpoints, per class level
+content_cache = ContentCache(CACHE_SIGNAL_DIR)
+# Reading Aloud passages indexed by age for /api/reading-tasks-random (READING_PICK_WEIGHTED=1 favours rarely served ones)
+reading_picker = ReadingTaskPicker(
+    connect_db,
+    VersionSignal(os.path.join(CACHE_SIGNAL_DIR, 'reading_picker.version')),
+    weighted=os.getenv("READING_PICK_WEIGHTED", "0") == "1",
+)
+
+# Autosaves are coalesced per attempt in a spool shared by the workers and written in batches (AUTOSAVE_BUFFER=0 writes through)
+progress_buffer = ProgressBuffer(
+    db_pool.connection,
+    os.getenv("AUTOSAVE_SPOOL_DIR", os.path.join(app.instance_path, 'autosave')),
+    interval=float(os.getenv("AUTOSAVE_FLUSH_INTERVAL", 2)),
+    enabled=os.getenv("AUTOSAVE_BUFFER", "1") != "0",
+    # Tasks marked In Progress count in class statistics; the request's own refresh ran before the flush
+    on_status_change=refresh_class_stats_for_users,
+)
+# Keystroke logs are stored encoded (keystroke_codec) in keystrokes_packed
+progress_buffer.register('typing_progress', ['text', 'keystrokes_packed', 'timer'], keep_null=['keystrokes_packed'])
+progress_buffer.register('comprehension_progress', ['q1', 'q2', 'q3', 'status'])
+progress_buffer.register('mathematical_comprehension_progress', ['q1', 'q2', 'q3', 'status'])
+progress_buffer.register('aptitude_progress', [
+    'logical_reasoning_score', 'numerical_ability_score', 'verbal_ability_score', 'spatial_reasoning_score',
+    'total_score', 'status', 'answers', 'current_section', 'answered_count', 'progress_percent'
+])
 
 # Ensure suggested_tasks table exists after DB connector is defined
 ensure_suggested_tasks_table()
+ensure_typing_keystroke_storage()
+ensure_class_statistics_table()
+ensure_upload_tables()
+warn_pending_migrations()
+try:
+    task_matrix.load()
+except Exception as e:
+    print(f"Error building task matrix: {e}")
+try:
+    reading_picker.load()
+except Exception as e:
+    print(f"Error building reading task index: {e}")
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 ALLOWED_EXTENSIONS = {'wav', 'webm', 'mp3', 'ogg', 'm4a', 'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tiff', 'webp'}
@@ -96,6 +274,25 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Uploaded files are stored content-addressed under uploads/blobs (see storage.py)
+upload_storage = UploadStorage(LocalBlobStore(UPLOAD_FOLDER), UPLOAD_FOLDER)
+
+# How /uploads bytes are sent: by this process (''), or by the front proxy via
+# 'x-sendfile' (Apache, lighttpd) or 'x-accel' (nginx internal location at UPLOADS_ACCEL_PREFIX)
+UPLOADS_SENDFILE = os.getenv("UPLOADS_SENDFILE", "").lower()
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+
+# Spreadsheets waiting for the worker to import them; not served to anyone
+IMPORT_FOLDER = os.path.join(app.instance_path, 'imports')
+
+# Columnar snapshot of the study data written by `flask snapshot` (see study_snapshot.py)
+SNAPSHOT_FOLDER = os.getenv("SNAPSHOT_FOLDER", os.path.join(app.instance_path, 'snapshot'))
+
+# Resumable audio uploads: the chunk size clients are told to use, and hard limits
+AUDIO_UPLOAD_CHUNK_BYTES = int(os.getenv("AUDIO_UPLOAD_CHUNK_BYTES", 1024 * 1024))
+AUDIO_UPLOAD_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+AUDIO_UPLOAD_MAX_BYTES = int(os.getenv("AUDIO_UPLOAD_MAX_BYTES", 200 * 1024 * 1024))
+
 # Set up OAuth
 oauth = OAuth(app)
 google = oauth.register(
@@ -567,6 +764,7 @@ def api_demographics():
         conn.commit()
         cursor.close()
         conn.close()
+        class_levels.invalidate(int(user_id))
         return jsonify({'success': True, 'message': 'Demographics recorded'})
     except Exception as e:
         print(f"Demographics error: {e}")
@@ -1080,44 +1278,11 @@ def get_parent_child_details():
             return jsonify({'success': False, 'message': 'Database connection failed'}), 500
         cursor = conn.cursor(dictionary=True)
         try:
-            # Ensure the child belongs to this parent (direct parent_id or via parent_children table)
-            cursor.execute(
-                """
-                SELECT u.id FROM users u
-                WHERE u.id = %s AND u.user_type = 'child' AND (
-                    u.parent_id = %s OR EXISTS (
-                        SELECT 1 FROM parent_children pc WHERE pc.child_id = u.id AND pc.parent_id = %s
-                    )
-                )
-                """,
-                (child_id, session['user_id'], session['user_id'])
-            )
-            if not cursor.fetchone():
-                cursor.close(); conn.close()
-                return jsonify({'success': False, 'message': 'Child not found'}), 404
-
-            # Fetch child details with joins to section, class, school
-            cursor.execute(
-                """
-                SELECT 
-                    u.id, u.name, u.email, u.created_at,
-                    u.school_id,
-                    scls.name AS school_name,
-                    sec.id AS section_id,
-                    sec.name AS section_name,
-                    cls.id AS class_id,
-                    cls.name AS class_name,
-                    d.age, d.gender, d.dyslexia_status, d.education_level, d.native_language
-                FROM users u
-                LEFT JOIN class_sections sec ON sec.id = u.section_id
-                LEFT JOIN school_classes cls ON cls.id = sec.class_id
-                LEFT JOIN schools scls ON scls.id = u.school_id
-                LEFT JOIN demographics d ON d.user_id = u.id
-                WHERE u.id = %s
-                """,
-                (child_id,)
-            )
-            row = cursor.fetchone()
+            # Fetch the child only if it belongs to this parent (direct parent_id or via parent_children
+            # table), with its section, class and school
+            parent_id = session['user_id']
+            matches = load_children(cursor, [{'id': parent_id}], include_linked=True, child_id=child_id)[parent_id]
+            row = matches[0] if matches else None
             if not row:
                 cursor.close(); conn.close()
                 return jsonify({'success': False, 'message': 'Child not found'}), 404
@@ -1383,26 +1548,13 @@ def get_school_parents():
             cursor.execute(query, (session['school_id'],))
             parents = cursor.fetchall()
             
-            # For each parent, get their children with class and section info
+            # Children of all parents (linked or pending by email) with class and section info, in one query
+            children_by_parent = load_children(cursor, parents, school_id=session['school_id'], match_pending_email=True)
             for parent in parents:
-                children_query = """
-                SELECT 
-                    c.id,
-                    c.name,
-                    c.email,
-                    cs.name AS section_name,
-                    sc.name AS class_name,
-                    sc.academic_year
-                FROM users c
-                LEFT JOIN class_sections cs ON cs.id = c.section_id
-                LEFT JOIN school_classes sc ON sc.id = cs.class_id
-                WHERE (c.parent_id = %s OR c.pending_parent_email = %s)
-                AND c.user_type = 'child'
-                AND c.school_id = %s
-                ORDER BY c.name ASC
-                """
-                cursor.execute(children_query, (parent['id'], parent['email'], session['school_id']))
-                parent['children'] = cursor.fetchall()
+                parent['children'] = [
+                    pick(child, ['id', 'name', 'email', 'section_name', 'class_name', 'academic_year'])
+                    for child in children_by_parent[parent['id']]
+                ]
             
             cursor.close()
             conn.close()
@@ -1488,6 +1640,7 @@ def _delete_parent_and_children(cur, parent_id: int, parent_email: str = None):
         for row in cur.fetchall() or []:
             child_ids.add(row[0])
     if child_ids:
+        mark_classes_of_users(cur, child_ids)
         placeholders = ','.join(['%s'] * len(child_ids))
         cur.execute(f"DELETE FROM users WHERE id IN ({placeholders})", list(child_ids))
     cur.execute("DELETE FROM users WHERE id=%s AND user_type='parent'", (parent_id,))
@@ -1644,16 +1797,18 @@ def delete_section(section_id: int):
     try:
         cur.execute(
             """
-            SELECT s.id FROM class_sections s
+            SELECT s.id, s.class_id FROM class_sections s
             JOIN school_classes c ON c.id = s.class_id
             WHERE s.id=%s AND c.school_id=%s
             """,
             (section_id, session['school_id'])
         )
-        if not cur.fetchone():
+        section = cur.fetchone()
+        if not section:
             return jsonify({'success': False, 'message': 'Not found'}), 404
         _delete_section_and_dependents(cur, section_id)
         conn.commit()
+        mark_class_changed(session['school_id'], section[1])
         return jsonify({'success': True})
     except Exception as e:
         conn.rollback()
@@ -1683,13 +1838,14 @@ def add_student_to_section(section_id: int):
             # Verify section belongs to school
             cur.execute(
                 """
-                SELECT s.id FROM class_sections s
+                SELECT s.id, s.class_id FROM class_sections s
                 JOIN school_classes c ON c.id = s.class_id
                 WHERE s.id=%s AND c.school_id=%s
                 """,
                 (section_id, session['school_id'])
             )
-            if not cur.fetchone():
+            section = cur.fetchone()
+            if not section:
                 return jsonify({'success': False, 'message': 'Not found'}), 404
 
             # Ensure parent user exists or create placeholder inactive parent under this school
@@ -1728,6 +1884,10 @@ def add_student_to_section(section_id: int):
                     pass
 
             conn.commit()
+            mark_class_changed(session['school_id'], section[1])
+            if parent_user:
+                # An existing parent moved to this section
+                class_levels.invalidate(parent_id)
             return jsonify({'success': True, 'child_id': child_id})
         except Exception as e:
             conn.rollback(); print(f"Add student error: {e}")
@@ -1754,6 +1914,7 @@ def delete_student(student_id: int):
         )
         if not cur.fetchone():
             return jsonify({'success': False, 'message': 'Not found'}), 404
+        mark_classes_of_users(cur, [student_id])
         cur.execute("DELETE FROM users WHERE id=%s", (student_id,))
         conn.commit()
         return jsonify({'success': True})
@@ -1769,75 +1930,100 @@ def bulk_add_students(section_id: int):
     auth = ensure_school_logged_in()
     if auth:
         return auth
+    data = request.get_json() or {}
+    rows = data.get('students') or []
+    if not isinstance(rows, list):
+        return jsonify({'success': False, 'message': 'students must be a list'}), 400
+    return _import_students(section_id, student_import.rows_from_json(rows))
+
+
+@app.route('/api/school/sections/<int:section_id>/students/import', methods=['POST'])
+def import_students_xlsx(section_id: int):
+    """Queue an import of students from an uploaded .xlsx (columns as in Book1.xlsx: Name, Email)"""
+    auth = ensure_school_logged_in()
+    if auth:
+        return auth
+    file = request.files.get('file')
+    if not file or not file.filename:
+        return jsonify({'success': False, 'message': 'No file provided'}), 400
+    if not file.filename.lower().endswith('.xlsx'):
+        return jsonify({'success': False, 'message': 'Please upload an .xlsx file'}), 400
+    conn, cur = get_db_cursor()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
     try:
-        data = request.get_json() or {}
-        rows = data.get('students') or []
-        if not isinstance(rows, list):
-            return jsonify({'success': False, 'message': 'students must be a list'}), 400
-        conn, cur = get_db_cursor()
-        if not conn:
-            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
-        added = 0; failed = 0
-        try:
-            # Verify section belongs to school
-            cur.execute(
-                """
-                SELECT s.id FROM class_sections s
-                JOIN school_classes c ON c.id = s.class_id
-                WHERE s.id=%s AND c.school_id=%s
-                """,
-                (section_id, session['school_id'])
-            )
-            if not cur.fetchone():
-                return jsonify({'success': False, 'message': 'Not found'}), 404
-            for row in rows:
-                try:
-                    student_name = (row.get('student_name') or row.get('name') or '').strip()
-                    parent_email = (row.get('parent_email') or row.get('Parent Email') or '').strip().lower()
-                    student_email = (row.get('student_email') or row.get('Email') or '').strip().lower() or None
-                    if not student_name or not parent_email:
-                        failed += 1; continue
-                    # ensure parent
-                    cur.execute("SELECT id FROM users WHERE email=%s AND user_type='parent'", (parent_email,))
-                    res = cur.fetchone()
-                    if res:
-                        parent_id = res[0]
-                        try:
-                            cur.execute("UPDATE users SET school_id=%s, section_id=%s WHERE id=%s AND user_type='parent'", (session['school_id'], section_id, parent_id))
-                        except Exception:
-                            pass
-                    else:
-                        cur.execute(
-                            "INSERT INTO users (name, email, password_hash, is_18_or_above, user_type, school_id, section_id) VALUES (%s,%s,%s,%s,%s,%s,%s)",
-                            (parent_email.split('@')[0].title(), parent_email, None, True, 'parent', session['school_id'], section_id)
-                        )
-                        parent_id = cur.lastrowid
-                    # child
-                    cur.execute(
-                        """
-                        INSERT INTO users (name, email, password_hash, is_18_or_above, user_type, parent_id, school_id, section_id, is_active, pending_parent_email)
-                        VALUES (%s,%s,%s,%s,'child',%s,%s,%s,%s,%s)
-                        """,
-                        (student_name, student_email, None, True, parent_id, session['school_id'], section_id, False, parent_email)
-                    )
-                    child_id = cur.lastrowid
-                    try:
-                        cur.execute("INSERT IGNORE INTO parent_children (parent_id, child_id) VALUES (%s,%s)", (parent_id, child_id))
-                    except Exception:
-                        pass
-                    added += 1
-                except Exception as ie:
-                    print(f"Row failed: {ie}"); failed += 1
-            conn.commit()
-            return jsonify({'success': True, 'added': added, 'failed': failed})
-        except Exception as e:
-            conn.rollback(); print(f"Bulk add error: {e}")
-            return jsonify({'success': False, 'message': 'Failed to bulk add'}), 500
-        finally:
-            cur.close(); conn.close()
+        # Verify section belongs to school
+        cur.execute(
+            """
+            SELECT s.id FROM class_sections s
+            JOIN school_classes c ON c.id = s.class_id
+            WHERE s.id=%s AND c.school_id=%s
+            """,
+            (section_id, session['school_id'])
+        )
+        if not cur.fetchone():
+            return jsonify({'success': False, 'message': 'Not found'}), 404
+        job_id = import_jobs.create(conn, IMPORT_FOLDER, session['school_id'], section_id, file.stream, secure_filename(file.filename))
+        return jsonify({'success': True, 'job_id': job_id, 'status_url': url_for('import_job_status', job_id=job_id)}), 202
     except Exception as e:
-        print(f"Bulk add outer error: {e}")
-        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+        conn.rollback(); print(f"Queue import error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to queue the import'}), 500
+    finally:
+        cur.close(); conn.close()
+
+
+@app.route('/api/school/import-jobs/<int:job_id>', methods=['GET'])
+def import_job_status(job_id: int):
+    """Progress of a queued student import: rows done, added, failed, row errors and ETA"""
+    auth = ensure_school_logged_in()
+    if auth:
+        return auth
+    conn = connect_db()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    try:
+        job = import_jobs.status(conn, job_id, session['school_id'])
+        if not job:
+            return jsonify({'success': False, 'message': 'Not found'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        print(f"Import job status error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to load import status'}), 500
+    finally:
+        conn.close()
+
+
+def _import_students(section_id, rows):
+    """Runs a bulk import into one of the logged-in school's sections and reports per-row errors"""
+    conn, cur = get_db_cursor()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    try:
+        # Verify section belongs to school
+        cur.execute(
+            """
+            SELECT s.id, s.class_id FROM class_sections s
+            JOIN school_classes c ON c.id = s.class_id
+            WHERE s.id=%s AND c.school_id=%s
+            """,
+            (section_id, session['school_id'])
+        )
+        section = cur.fetchone()
+        if not section:
+            return jsonify({'success': False, 'message': 'Not found'}), 404
+        # Chunks commit as they go, so the class is refreshed even if a later one fails
+        mark_class_changed(session['school_id'], section[1])
+        result = student_import.import_students(conn, session['school_id'], section_id, rows)
+        if result.moved_parents:
+            class_levels.invalidate()
+        return jsonify({'success': True, **result.as_dict()})
+    except student_import.ImportFileError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        conn.rollback(); print(f"Bulk add error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to bulk add'}), 500
+    finally:
+        cur.close(); conn.close()
 
 # ---------- Section Assessments ----------
 
@@ -1858,13 +2044,14 @@ def assign_assessments(section_id: int):
             # Verify section belongs to school
             cur.execute(
                 """
-                SELECT s.id FROM class_sections s
+                SELECT s.id, s.class_id FROM class_sections s
                 JOIN school_classes c ON c.id = s.class_id
                 WHERE s.id=%s AND c.school_id=%s
                 """,
                 (section_id, session['school_id'])
             )
-            if not cur.fetchone():
+            section = cur.fetchone()
+            if not section:
                 return jsonify({'success': False, 'message': 'Not found'}), 404
             # Insert assignments
             for tname in task_names:
@@ -1873,6 +2060,8 @@ def assign_assessments(section_id: int):
                     (section_id, tname)
                 )
             conn.commit()
+            task_matrix.invalidate()
+            mark_class_changed(session['school_id'], section[1])
             return jsonify({'success': True})
         except Exception as e:
             conn.rollback(); print(f"Assign assessments error: {e}")
@@ -1899,13 +2088,14 @@ def delete_assigned_assessment(section_id: int):
     try:
         cur.execute(
             """
-            SELECT s.id FROM class_sections s
+            SELECT s.id, s.class_id FROM class_sections s
             JOIN school_classes c ON c.id = s.class_id
             WHERE s.id=%s AND c.school_id=%s
             """,
             (section_id, session['school_id'])
         )
-        if not cur.fetchone():
+        section = cur.fetchone()
+        if not section:
             return jsonify({'success': False, 'message': 'Not found'}), 404
         cur.execute(
             "DELETE FROM section_assessments WHERE section_id=%s AND task_name=%s",
@@ -1914,6 +2104,8 @@ def delete_assigned_assessment(section_id: int):
         if cur.rowcount == 0:
             return jsonify({'success': False, 'message': 'Assignment not found'}), 404
         conn.commit()
+        task_matrix.invalidate()
+        mark_class_changed(session['school_id'], section[1])
         return jsonify({'success': True})
     except Exception as e:
         conn.rollback()
@@ -2212,39 +2404,8 @@ def participant_dashboard():
                 'Aptitude Test'
             ]
             
-            # Determine allowed tasks based on class level from demographics
-            # Get user's class level from demographics
-            class_level = _get_user_class_level(conn, user_id)
-            
-            if class_level:
-                # Show class-appropriate tasks based on class level
-                # Get tasks that have class-specific content for this user's class
-                db_tasks = []
-                
-                # Check each task category for class-appropriate content
-                task_categories = [
-                    ('Reading Aloud Task 1', 'reading_tasks'),
-                    ('Typing Task', 'typing_tasks'), 
-                    ('Reading Comprehension', 'reading_comprehension_tasks'),
-                    ('Mathematical Comprehension', 'mathematical_comprehension_tasks'),
-                    ('Writing Task', 'writing_tasks'),
-                    ('Aptitude Test', 'aptitude_tasks')
-                ]
-                
-                for task_name, table_name in task_categories:
-                    # Check if there are class-appropriate tasks for this category
-                    cursor.execute(f"SELECT COUNT(*) as count FROM {table_name} WHERE class_level = %s", (class_level,))
-                    count_result = cursor.fetchone()
-                    if count_result and count_result['count'] > 0:
-                        db_tasks.append(task_name)
-                
-                # If no class-specific tasks found, show all core tasks as fallback
-                if not db_tasks:
-                    db_tasks = core_tasks
-            else:
-                # No class level found: show all tasks as fallback
-                cursor.execute("SELECT task_name FROM tasks")
-                db_tasks = [row['task_name'] for row in cursor.fetchall()]
+            # Allowed tasks come from the in-memory task matrix
+            db_tasks = _allowed_task_names(conn, user_id, lambda: core_tasks)
             
             # Get user task statuses
             cursor.execute("SELECT task_name, status FROM user_tasks WHERE user_id = %s", (user_id,))
@@ -2503,67 +2664,69 @@ def _category_config(category_slug: str):
     }.get(category_slug)
 
 
+def _task_content_changed(category_slug: str):
+    """Drop caches derived from a category table after an admin edit."""
+    task_matrix.invalidate()
+    content_cache.invalidate(category_slug)
+    if category_slug == 'reading-aloud':
+        reading_picker.invalidate()
+    if category_slug == 'typing':
+        # typing_tasks names are aliases in the task catalog
+        task_catalog.invalidate()
+
+
 def _get_user_class_level(conn, user_id: int):
     """Determine numeric class_level (1-12) for a user based on demographics.education_level, users.class, or their section's class name."""
     try:
-        cur = conn.cursor(dictionary=True)
-        class_level = None
-        
-        # First try demographics.education_level (stores class numbers 1-12)
-        cur.execute("SELECT education_level FROM demographics WHERE user_id=%s", (user_id,))
-        demo_row = cur.fetchone()
-        if demo_row and demo_row.get('education_level'):
-            try:
-                class_level = int(demo_row['education_level'])
-                if 1 <= class_level <= 12:
-                    cur.close()
-                    return class_level
-            except (ValueError, TypeError):
-                pass
-        
-        # Fallback to users.class (e.g., "Class 6" or "6")
-        cur.execute("SELECT class, section_id FROM users WHERE id=%s", (user_id,))
-        row = cur.fetchone()
-        if row:
-            user_class = row.get('class')
-            if user_class:
-                import re
-                m = re.search(r"(\d+)", str(user_class))
-                if m:
-                    num = int(m.group(1))
-                    if 1 <= num <= 12:
-                        class_level = num
-            if class_level is None and row.get('section_id'):
-                # Derive via section -> school_classes.name (e.g., "Class 5")
-                cur2 = conn.cursor(dictionary=True)
-                cur2.execute(
-                    """
-                    SELECT sc.name AS class_name
-                    FROM class_sections s
-                    JOIN school_classes sc ON sc.id = s.class_id
-                    WHERE s.id = %s
-                    """,
-                    (row['section_id'],)
-                )
-                r2 = cur2.fetchone()
-                cur2.close()
-                if r2 and r2.get('class_name'):
-                    import re as _re
-                    m2 = _re.search(r"(\d+)", str(r2['class_name']))
-                    if m2:
-                        num2 = int(m2.group(1))
-                        if 1 <= num2 <= 12:
-                            class_level = num2
-        cur.close()
-        return class_level
-    except Exception:
-        try:
-            cur.close()
-        except Exception:
-            pass
+        return class_levels.get(conn, user_id)
+    except Exception as e:
+        print(f"Error getting user class level: {e}")
         return None
 
 
+def _task_content_response(category_slug: str, class_level, render, scope=None):
+    """Serve a task content body from content_cache with a strong ETag.
+
+    render() builds the response on a miss; only 200 responses are cached.
+    Clients revalidate every load (no-cache) and get a 304 while the ETag matches.
+    """
+    version = content_cache.version(category_slug)
+    entry = content_cache.get(category_slug, class_level, version, scope)
+    if entry is None:
+        rendered = app.make_response(render())
+        if rendered.status_code != 200:
+            return rendered
+        entry = content_cache.put(category_slug, class_level, rendered.get_data(), version, scope)
+    body, etag = entry
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def _all_task_names():
+    """Every task name, ordered by tasks.id."""
+    ids = task_catalog.names()
+    return sorted(ids, key=ids.get)
+
+
+def _allowed_task_names(conn, user_id: int, fallback):
+    """Tasks a participant sees: their section's assigned assessments, else the categories
+    with content for their class level (fallback when there are none), else every task."""
+    try:
+        section_id = class_levels.section(conn, user_id)
+    except Exception as e:
+        print(f"Error getting user section: {e}")
+        section_id = None
+    assigned = task_matrix.section_tasks(section_id)
+    if assigned:
+        return assigned
+    class_level = _get_user_class_level(conn, user_id)
+    if class_level:
+        return task_matrix.categories(class_level) or fallback()
+    return _all_task_names()
+
+
 @app.route('/api/admin/categories/<string:category_slug>/tasks', methods=['GET', 'POST'])
 def admin_category_tasks(category_slug: str):
     if not session.get('is_admin'):
@@ -2665,6 +2828,7 @@ def admin_category_tasks(category_slug: str):
                         )
                     )
             conn.commit()
+            _task_content_changed(category_slug)
             return jsonify({'success': True})
     except Exception as e:
         if 'conn' in locals():
@@ -2692,6 +2856,7 @@ def admin_category_task_detail(category_slug: str, task_id: int):
         if request.method == 'DELETE':
             cursor.execute(f"DELETE FROM {table} WHERE id = %s", (task_id,))
             conn.commit()
+            _task_content_changed(category_slug)
             return jsonify({'success': True})
         elif request.method == 'GET':
             # Single task fetch, with schema normalization for aptitude
@@ -2870,6 +3035,7 @@ def admin_category_task_detail(category_slug: str, task_id: int):
                         )
                     )
             conn.commit()
+            _task_content_changed(category_slug)
             return jsonify({'success': True})
     except Exception as e:
         if 'conn' in locals():
@@ -2923,19 +3089,17 @@ def get_random_reading_task(user_id: int):
                 today = datetime.now()
                 dob = demo['date_of_birth']
                 user_age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-        if not user_age:
-            # fallback to any
-            cursor.execute("SELECT id FROM reading_tasks ORDER BY RAND() LIMIT 1")
-        else:
-            cursor.execute("""
-                SELECT id FROM reading_tasks WHERE age_min <= %s AND age_max >= %s ORDER BY RAND() LIMIT 1
-            """, (user_age, user_age))
-        row = cursor.fetchone()
+        # Picked from the in-memory index, skipping passages this user already opened
+        task_id = reading_picker.pick(
+            age=user_age,
+            class_level=_get_user_class_level(conn, user_id),
+            exclude=seen_reading_tasks(user_id),
+        )
         cursor.close()
         conn.close()
-        if not row:
+        if task_id is None:
             return jsonify({'success': False, 'message': 'No reading tasks available'}), 404
-        return jsonify({'success': True, 'task_id': row['id']})
+        return jsonify({'success': True, 'task_id': task_id})
     except Exception as e:
         print(f"Random reading task error: {e}")
         return jsonify({'success': False, 'message': 'Failed to get random task'}), 500
@@ -2982,46 +3146,8 @@ def api_allowed_tasks():
         user_id = session['user_id']
         conn = connect_db()
         cursor = conn.cursor(dictionary=True)
-        # Determine if school child
-        cursor.execute("SELECT section_id, school_id FROM users WHERE id = %s", (user_id,))
-        row = cursor.fetchone()
-        section_id = row['section_id'] if row else None
-        school_id = row['school_id'] if row else None
-
         tasks = []
-        
-        # Get user's class level from demographics
-        class_level = _get_user_class_level(conn, user_id)
-        
-        if class_level:
-            # Show class-appropriate tasks based on class level
-            allowed = []
-            
-            # Check each task category for class-appropriate content
-            task_categories = [
-                ('Reading Aloud Task 1', 'reading_tasks'),
-                ('Typing Task', 'typing_tasks'), 
-                ('Reading Comprehension', 'reading_comprehension_tasks'),
-                ('Mathematical Comprehension', 'mathematical_comprehension_tasks'),
-                ('Writing Task', 'writing_tasks'),
-                ('Aptitude Test', 'aptitude_tasks')
-            ]
-            
-            for task_name, table_name in task_categories:
-                # Check if there are class-appropriate tasks for this category
-                cursor.execute(f"SELECT COUNT(*) as count FROM {table_name} WHERE class_level = %s", (class_level,))
-                count_result = cursor.fetchone()
-                if count_result and count_result['count'] > 0:
-                    allowed.append(task_name)
-            
-            # If no class-specific tasks found, show all core tasks as fallback
-            if not allowed:
-                cursor.execute("SELECT task_name FROM tasks ORDER BY id")
-                allowed = [r['task_name'] for r in cursor.fetchall()]
-        else:
-            # No class level found: show all tasks as fallback
-            cursor.execute("SELECT task_name FROM tasks ORDER BY id")
-            allowed = [r['task_name'] for r in cursor.fetchall()]
+        allowed = _allowed_task_names(conn, user_id, _all_task_names)
 
         # Map with user status
         cursor.execute("SELECT task_name, status FROM user_tasks WHERE user_id = %s", (user_id,))
@@ -3055,6 +3181,7 @@ def update_user_task():
         """
         cursor.execute(query, (session['user_id'], task_name, status))
         conn.commit()
+        mark_user_changed(session['user_id'])
         cursor.close()
         conn.close()
         return jsonify({'success': True, 'message': 'Task status updated'})
@@ -3126,6 +3253,7 @@ def update_profile():
         conn.commit()
         cursor.close()
         conn.close()
+        class_levels.invalidate(user_id)
         session['email'] = email
         return jsonify({'success': True, 'message': 'Profile updated'})
     except Exception as e:
@@ -3165,6 +3293,9 @@ def task11():
     user_id = session.get('user_id')
     if not user_id:
         return redirect(url_for('signin'))
+    task_id = request.args.get('task_id', type=int)
+    if task_id:
+        remember_reading_task(user_id, task_id)
     return render_template('task11.html', user_id=user_id)
 
 @app.route('/task22.html')
@@ -3213,9 +3344,70 @@ def aptitude():
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _can_read_upload(conn, owner_id):
+    """Admins read every upload; participants their own, parents their children's, schools their students'."""
+    if session.get('is_admin'):
+        return True
+    user_id = session.get('user_id')
+    school_id = session.get('school_id')
+    if owner_id is None or (user_id is None and school_id is None):
+        return False
+    if user_id == owner_id:
+        return True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT 1 FROM users u
+            WHERE u.id = %s AND (
+                u.parent_id = %s
+                OR EXISTS (SELECT 1 FROM parent_children pc WHERE pc.parent_id = %s AND pc.child_id = u.id)
+                OR u.school_id = %s
+            )
+            LIMIT 1
+        """, (owner_id, user_id, user_id, school_id))
+        return cursor.fetchone() is not None
+    finally:
+        cursor.close()
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve an upload with Range (206), ETag and Last-Modified (304) support, or hand it to the front proxy.
+
+    ?size=review or ?size=thumb serves that rendition of an image once the worker has made it.
+    """
+    if not any(key in session for key in ('user_id', 'school_id', 'is_admin')):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    conn = connect_db()
+    located = None
+    size = request.args.get('size')
+    if size in image_renditions.RENDITIONS:
+        located = upload_storage.locate(conn, image_renditions.rendition_name(filename, size))
+    if not located:
+        located = upload_storage.locate(conn, filename)
+    # Someone else's file answers like a missing one, so names cannot be probed
+    if not located or not _can_read_upload(conn, located[3]):
+        return jsonify({'success': False, 'message': 'File not found'}), 404
+    # Blob content never changes, so its sha256 is a strong ETag; flat-folder files get one from mtime and size
+    path, sha256, content_type, _ = located
+    mimetype = content_type or 'application/octet-stream'
+    if UPLOADS_SENDFILE == 'x-accel':
+        response = app.response_class(mimetype=mimetype)
+        relative_path = os.path.relpath(path, UPLOAD_FOLDER).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = UPLOADS_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative_path)
+        if sha256:
+            response.set_etag(sha256)
+    else:
+        response = werkzeug_send_file(
+            path, request.environ, mimetype=mimetype, etag=sha256 or True, conditional=True,
+            use_x_sendfile=UPLOADS_SENDFILE == 'x-sendfile', response_class=app.response_class
+        )
+        # Werkzeug only sends Accept-Ranges on 206s; media players look for it on the first response
+        response.accept_ranges = 'bytes'
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    # The type comes from the allowlisted extension; browsers must not sniff another one
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
 
 @app.route('/api/save-progress', methods=['POST'])
 def save_progress():
@@ -3231,51 +3423,26 @@ def save_progress():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(f"user{session['user_id']}_" + datetime.now().strftime('%Y%m%d%H%M%S') + '_' + file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         try:
             conn = connect_db()
             cursor = conn.cursor()
+            upload_storage.save(cursor, filename, file.stream, session['user_id'])
             
             # Get or create task attempt
-            cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-            task_row = cursor.fetchone()
-            if not task_row:
+            task_id = task_catalog.task_id(task_name)
+            if not task_id:
                 return jsonify({'success': False, 'message': 'Task not found'}), 404
             
-            task_id = task_row[0]
-            
             # Get current attempt or create new one
-            cursor.execute("""
-                SELECT id, attempt_number FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-                ORDER BY attempt_number DESC LIMIT 1
-            """, (session['user_id'], task_id))
-            
-            attempt_row = cursor.fetchone()
-            if attempt_row:
-                attempt_id = attempt_row[0]
-                attempt_number = attempt_row[1]
-            else:
-                # Create new attempt
-                cursor.execute("""
-                    SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                    WHERE user_id = %s AND task_id = %s
-                """, (session['user_id'], task_id))
-                attempt_number = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-                attempt_id = cursor.lastrowid
+            attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
             
             # Save audio recording with attempt_id
             cursor.execute("""
                 INSERT INTO audio_recordings (attempt_id, filename, uploaded_at)
                 VALUES (%s, %s, NOW())
             """, (attempt_id, filename))
+            audio_jobs.enqueue(cursor, cursor.lastrowid, filename)
             
             # Mark task as In Progress
             cursor.execute("""
@@ -3333,88 +3500,77 @@ def save_progress():
 
 
 
-@app.route('/api/upload-audio', methods=['POST'])
-def upload_audio():
-    """Upload audio recording and mark task as completed"""
-    if 'user_id' not in session:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
-    
-    if 'audio' not in request.files:
-        return jsonify({'success': False, 'message': 'No audio file provided'}), 400
-    
-    file = request.files['audio']
-    if file.filename == '':
-        return jsonify({'success': False, 'message': 'No selected file'}), 400
-    
-    task_name = request.form.get('task_name', 'Reading Aloud Task 1')
-    is_retake = request.form.get('retake') == 'true'
-    
+def _audio_filename(user_id, is_retake, original_name):
+    """Unique stored name for a submitted recording; the timestamp preserves all submissions."""
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return secure_filename(f"user{user_id}_{timestamp}_{'retake_' if is_retake else ''}{original_name}")
+
+
+def _record_audio_submission(conn, user_id, task_name, filename):
+    """Store a submitted recording against the active attempt and complete it (the caller commits).
+
+    Returns (attempt_id, attempt_number), or None when task_name is unknown.
+    """
+    task_id = task_catalog.task_id(task_name)
+    if not task_id:
+        return None
+    cursor = conn.cursor()
+    try:
+        # Get current attempt or create new one
+        attempt_id, attempt_number = resolve_active_attempt(conn, user_id, task_id)
+        
+        # Mark attempt as completed (first: a stale cached attempt is swapped for the current one)
+        attempt_id, attempt_number = complete_attempt(conn, user_id, task_id, attempt_id, attempt_number)
+        
+        # Save audio recording with attempt_id
+        cursor.execute("""
+            INSERT INTO audio_recordings (attempt_id, filename, uploaded_at)
+            VALUES (%s, %s, NOW())
+        """, (attempt_id, filename))
+        # Analysis runs in `flask worker`; queueing it is one insert in this transaction
+        audio_jobs.enqueue(cursor, cursor.lastrowid, filename)
+        
+        # Mark user_tasks as Completed
+        cursor.execute("""
+            INSERT INTO user_tasks (user_id, task_name, status)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
+        """, (user_id, task_name, 'Completed'))
+    finally:
+        cursor.close()
+    return attempt_id, attempt_number
+
+
+@app.route('/api/upload-audio', methods=['POST'])
+def upload_audio():
+    """Upload audio recording and mark task as completed"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if 'audio' not in request.files:
+        return jsonify({'success': False, 'message': 'No audio file provided'}), 400
+    
+    file = request.files['audio']
+    if file.filename == '':
+        return jsonify({'success': False, 'message': 'No selected file'}), 400
+    
+    task_name = request.form.get('task_name', 'Reading Aloud Task 1')
+    is_retake = request.form.get('retake') == 'true'
+    
     if file and allowed_file(file.filename):
-        # Generate a unique filename including timestamp to preserve all submissions
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        filename = secure_filename(f"user{session['user_id']}_{timestamp}_{'retake_' if is_retake else ''}{file.filename}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        filename = _audio_filename(session['user_id'], is_retake, file.filename)
         
         try:
             conn = connect_db()
             cursor = conn.cursor()
-            
-            # Get or create task attempt
-            cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-            task_row = cursor.fetchone()
-            if not task_row:
+            upload_storage.save(cursor, filename, file.stream, session['user_id'])
+            cursor.close()
+            submitted = _record_audio_submission(conn, session['user_id'], task_name, filename)
+            if not submitted:
                 return jsonify({'success': False, 'message': 'Task not found'}), 404
-            
-            task_id = task_row[0]
-            
-            # Get current attempt or create new one
-            cursor.execute("""
-                SELECT id, attempt_number FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-                ORDER BY attempt_number DESC LIMIT 1
-            """, (session['user_id'], task_id))
-            
-            attempt_row = cursor.fetchone()
-            if attempt_row:
-                attempt_id = attempt_row[0]
-                attempt_number = attempt_row[1]
-            else:
-                # Create new attempt
-                cursor.execute("""
-                    SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                    WHERE user_id = %s AND task_id = %s
-                """, (session['user_id'], task_id))
-                attempt_number = cursor.fetchone()[0]
-                
-                cursor.execute("""
-                    INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                    VALUES (%s, %s, %s, %s, NOW())
-                """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-                attempt_id = cursor.lastrowid
-            
-            # Save audio recording with attempt_id
-            cursor.execute("""
-                INSERT INTO audio_recordings (attempt_id, filename, uploaded_at)
-                VALUES (%s, %s, NOW())
-            """, (attempt_id, filename))
-            
-            # Mark attempt as completed
-            cursor.execute("""
-                UPDATE user_task_attempts 
-                SET status = 'Completed', completed_at = NOW()
-                WHERE id = %s
-            """, (attempt_id,))
-            
-            # Mark user_tasks as Completed
-            cursor.execute("""
-                INSERT INTO user_tasks (user_id, task_name, status)
-                VALUES (%s, %s, %s)
-                ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
-            """, (session['user_id'], task_name, 'Completed'))
+            attempt_id, attempt_number = submitted
             
             conn.commit()
-            cursor.close()
             conn.close()
             
             return jsonify({
@@ -3431,6 +3587,181 @@ def upload_audio():
         return jsonify({'success': False, 'message': 'Invalid file type'}), 400
     
     
+@app.route('/api/audio-uploads', methods=['POST'])
+def create_audio_upload():
+    """Open a resumable upload for a recording; chunks are then PUT at increasing offsets"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    data = request.get_json() or {}
+    task_name = data.get('task_name', 'Reading Aloud Task 1')
+    original_name = secure_filename(data.get('filename') or 'recording.webm')
+    total_bytes = data.get('size')
+    if not allowed_file(original_name):
+        return jsonify({'success': False, 'message': 'Invalid file type'}), 400
+    if total_bytes is not None and (not isinstance(total_bytes, int) or not 0 < total_bytes <= AUDIO_UPLOAD_MAX_BYTES):
+        return jsonify({'success': False, 'message': 'Invalid upload size'}), 400
+    if not task_catalog.task_id(task_name):
+        return jsonify({'success': False, 'message': 'Task not found'}), 404
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        upload_id = audio_uploads.new_upload_id()
+        audio_uploads.start(UPLOAD_FOLDER, upload_id)
+        cursor.execute("""
+            INSERT INTO audio_uploads (id, user_id, task_name, is_retake, original_name, total_bytes)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (upload_id, session['user_id'], task_name, bool(data.get('retake')), original_name, total_bytes))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        return jsonify({
+            'success': True,
+            'upload_id': upload_id,
+            'offset': 0,
+            'chunk_size': AUDIO_UPLOAD_CHUNK_BYTES
+        })
+    except Exception as e:
+        print(f"Create audio upload error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to start upload'}), 500
+
+
+def _find_audio_upload(cursor, upload_id, user_id, for_update=False):
+    """The user's audio_uploads row (dictionary cursor), or None."""
+    cursor.execute(
+        f"SELECT * FROM audio_uploads WHERE id = %s AND user_id = %s{' FOR UPDATE' if for_update else ''}",
+        (upload_id, user_id)
+    )
+    return cursor.fetchone()
+
+
+@app.route('/api/audio-uploads/<upload_id>', methods=['GET'])
+def audio_upload_status(upload_id):
+    """How many bytes of an upload are stored, so a client can resume after a failure"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        upload = _find_audio_upload(cursor, upload_id, session['user_id'])
+        cursor.close()
+        conn.close()
+        if not upload:
+            return jsonify({'success': False, 'message': 'Upload not found'}), 404
+        if upload['status'] == 'finalized':
+            return jsonify({'success': True, 'status': 'finalized', 'filename': upload['filename']})
+        return jsonify({
+            'success': True,
+            'status': 'open',
+            'offset': audio_uploads.received_bytes(UPLOAD_FOLDER, upload_id),
+            'size': upload['total_bytes']
+        })
+    except Exception as e:
+        print(f"Audio upload status error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to read upload status'}), 500
+
+
+@app.route('/api/audio-uploads/<upload_id>', methods=['PUT'])
+def append_audio_upload(upload_id):
+    """Append one chunk (the raw request body) at ?offset=N"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'message': 'offset is required'}), 400
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        upload = _find_audio_upload(cursor, upload_id, session['user_id'])
+        cursor.close()
+        # Handed back now, not at teardown: a slow client's chunk must not hold a pooled connection
+        g.pop('db_conn').release()
+        if not upload:
+            return jsonify({'success': False, 'message': 'Upload not found'}), 404
+        if upload['status'] != 'open':
+            return jsonify({'success': False, 'message': 'Upload already finalized'}), 409
+        max_total = upload['total_bytes'] or AUDIO_UPLOAD_MAX_BYTES
+        # request.stream reads the body as it arrives; nothing is spooled
+        received = audio_uploads.append(
+            UPLOAD_FOLDER, upload_id, offset, request.stream,
+            AUDIO_UPLOAD_MAX_CHUNK_BYTES, max_total
+        )
+        return jsonify({'success': True, 'offset': received})
+    except audio_uploads.OffsetMismatch as e:
+        return jsonify({'success': False, 'message': 'Offset mismatch', 'offset': e.received}), 409
+    except audio_uploads.UploadTooLarge:
+        return jsonify({'success': False, 'message': 'Chunk or upload too large'}), 413
+    except audio_uploads.UploadSealed:
+        return jsonify({'success': False, 'message': 'Upload already finalized'}), 409
+    except Exception as e:
+        print(f"Append audio upload error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to store chunk'}), 500
+
+
+@app.route('/api/audio-uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_audio_upload(upload_id):
+    """Store the uploaded recording and mark the task as completed; repeated calls return the same result"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    user_id = session['user_id']
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
+        # The row lock serializes concurrent finalize calls for the same upload
+        upload = _find_audio_upload(cursor, upload_id, user_id, for_update=True)
+        if not upload:
+            return jsonify({'success': False, 'message': 'Upload not found'}), 404
+        if upload['status'] == 'finalized':
+            conn.rollback()
+            return jsonify({
+                'success': True,
+                'message': 'Audio uploaded successfully and task marked as completed',
+                'filename': upload['filename'],
+                'attempt_id': upload['attempt_id'],
+                'attempt_number': upload['attempt_number']
+            })
+        # Sealing waits for any chunk still being written and rejects later ones,
+        # so the bytes hashed into the store cannot change underneath it
+        try:
+            sealed = audio_uploads.seal(UPLOAD_FOLDER, upload_id)
+        except FileNotFoundError:
+            conn.rollback()
+            return jsonify({'success': False, 'message': 'Upload incomplete', 'offset': 0}), 409
+        received = os.path.getsize(sealed)
+        if not received or (upload['total_bytes'] is not None and received != upload['total_bytes']):
+            audio_uploads.unseal(UPLOAD_FOLDER, upload_id)
+            conn.rollback()
+            return jsonify({'success': False, 'message': 'Upload incomplete', 'offset': received}), 409
+
+        filename = _audio_filename(user_id, upload['is_retake'], upload['original_name'])
+        # The sealed file stays in place until the commit, so a failed finalize can be retried
+        upload_storage.save_file(cursor, filename, sealed, user_id)
+        submitted = _record_audio_submission(conn, user_id, upload['task_name'], filename)
+        if not submitted:
+            raise ValueError(f"task {upload['task_name']!r} not found")
+        attempt_id, attempt_number = submitted
+        cursor.execute("""
+            UPDATE audio_uploads
+            SET status = 'finalized', filename = %s, attempt_id = %s, attempt_number = %s, finalized_at = NOW()
+            WHERE id = %s
+        """, (filename, attempt_id, attempt_number, upload_id))
+        conn.commit()
+        cursor.close()
+        conn.close()
+        audio_uploads.discard(UPLOAD_FOLDER, upload_id)
+        return jsonify({
+            'success': True,
+            'message': 'Audio uploaded successfully and task marked as completed',
+            'filename': filename,
+            'attempt_id': attempt_id,
+            'attempt_number': attempt_number
+        })
+    except Exception as e:
+        if 'conn' in locals():
+            conn.rollback()
+        print(f"Finalize audio upload error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to finalize upload'}), 500
+
+
 @app.route('/api/retake-task', methods=['POST'])
 def retake_task():
     """Create a new attempt for retaking while preserving previous submissions"""
@@ -3445,26 +3776,12 @@ def retake_task():
         cursor = conn.cursor()
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row[0]
-        
-        # Get next attempt number
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        attempt_number = cursor.fetchone()[0]
-        
         # Create new attempt
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-        attempt_id = cursor.lastrowid
+        attempt_id, attempt_number = start_new_attempt(conn, session['user_id'], task_id)
         
         # Mark user_tasks as In Progress
         cursor.execute("""
@@ -3500,13 +3817,10 @@ def get_saved_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get the latest IN PROGRESS attempt and its audio recording (not completed ones)
         # Order by audio uploaded_at to get the most recent saved audio
         cursor.execute("""
@@ -3551,157 +3865,126 @@ def save_typing_progress():
         return jsonify({'success': False, 'message': 'User not logged in'}), 401
     data = request.get_json()
     text = data.get('text', '')
-    keystrokes = data.get('keystrokes', '')
+    # Older clients send the whole log; clients using /api/typing-keystrokes leave it out
+    keystrokes = data.get('keystrokes')
     timer = data.get('timer', '')
     task_name = data.get('task_name', 'Typing Task')
     if not text:
         return jsonify({'success': False, 'message': 'No text provided'}), 400
     try:
         conn = connect_db()
-        cursor = conn.cursor()
-        
-        # Get or create task attempt - handle both main tasks and typing tasks
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        
-        if not task_row:
-            # If not found in main tasks table, try typing_tasks table
-            cursor.execute("SELECT id FROM typing_tasks WHERE task_name = %s", (task_name,))
-            typing_task_row = cursor.fetchone()
-            if typing_task_row:
-                # For typing tasks, we need to use the main "Typing Task" as the parent task
-                cursor.execute("SELECT id FROM tasks WHERE task_name = 'Typing Task'")
-                main_task_row = cursor.fetchone()
-                if main_task_row:
-                    task_id = main_task_row[0]
-                else:
-                    return jsonify({'success': False, 'message': 'Typing Task not found in main tasks'}), 404
-            else:
-                return jsonify({'success': False, 'message': 'Task not found'}), 404
-        else:
-            task_id = task_row[0]
-        
-        # Get current attempt or create new one
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
         
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row[0]
-            attempt_number = attempt_row[1]
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            attempt_number = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-            attempt_id = cursor.lastrowid
-        
-        # Save progress to typing_progress table
-        cursor.execute('''
-            INSERT INTO typing_progress (attempt_id, text, keystrokes, timer, updated_at)
-            VALUES (%s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE text=VALUES(text), keystrokes=VALUES(keystrokes), timer=VALUES(timer), updated_at=NOW()
-        ''', (attempt_id, text, keystrokes, timer))
+        # Get or create task attempt - typing prompts (typing_tasks) are recorded under the main "Typing Task"
+        task_id = task_catalog.task_id(task_name, include_aliases=True)
+        if not task_id:
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        # Mark user_tasks as In Progress
-        cursor.execute('''
-            INSERT INTO user_tasks (user_id, task_name, status)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
-        ''', (session['user_id'], task_name, 'In Progress'))
+        # Get current attempt or create new one (committed now so the buffered write can find it)
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        if conn.in_transaction:
+            conn.commit()
         
-        conn.commit()
-        cursor.close()
+        # Queue progress; the buffer writes typing_progress and marks user_tasks In Progress
+        progress_buffer.put('typing_progress', attempt_id, {'text': text, 'keystrokes_packed': pack_keystrokes(keystrokes), 'timer': timer},
+                            session['user_id'], task_id, task_name, conn=conn)
         conn.close()
         return jsonify({'success': True, 'message': 'Progress saved successfully', 'attempt_id': attempt_id, 'attempt_number': attempt_number})
     except Exception as e:
         print(f"Save typing progress DB error: {e}")
         return jsonify({'success': False, 'message': 'Failed to save progress'}), 500
 
+@app.route('/api/typing-keystrokes', methods=['POST'])
+def append_typing_keystrokes():
+    """Append keystroke events numbered from `seq`; returns the seq the client should send from next"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'User not logged in'}), 401
+    data = request.get_json() or {}
+    task_name = data.get('task_name', 'Typing Task')
+    events = data.get('events') or []
+    try:
+        seq = int(data.get('seq', 0))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid seq'}), 400
+    if seq < 0 or not isinstance(events, list) or len(events) > MAX_CHUNK_EVENTS:
+        return jsonify({'success': False, 'message': 'Invalid keystroke chunk'}), 400
+    try:
+        conn = connect_db()
+        
+        task_id = task_catalog.task_id(task_name, include_aliases=True)
+        if not task_id:
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
+        
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        next_seq = append_chunk(conn, attempt_id, seq, events)
+        conn.commit()
+        conn.close()
+        return jsonify({'success': True, 'attempt_id': attempt_id, 'attempt_number': attempt_number, 'next_seq': next_seq})
+    except Exception as e:
+        print(f"Append typing keystrokes DB error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to save keystrokes'}), 500
+
 @app.route('/api/submit-typing-task', methods=['POST'])
 def submit_typing_task():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'User not logged in'}), 401
     data = request.get_json()
     text = data.get('text', '')
-    keystrokes = data.get('keystrokes', '')
+    keystrokes = data.get('keystrokes')
     timer = data.get('timer', '')
     task_name = data.get('task_name', 'Typing Task')
     if not text:
         return jsonify({'success': False, 'message': 'No text provided'}), 400
+    # The unacknowledged tail is checked like a chunk sent to /api/typing-keystrokes
+    chunk = None
+    if 'keystroke_events' in data:
+        events = data.get('keystroke_events') or []
+        try:
+            seq = int(data.get('keystroke_seq', 0))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid keystroke_seq'}), 400
+        if seq < 0 or not isinstance(events, list) or len(events) > MAX_CHUNK_EVENTS:
+            return jsonify({'success': False, 'message': 'Invalid keystroke chunk'}), 400
+        chunk = (seq, events)
     try:
         conn = connect_db()
         cursor = conn.cursor()
         
-        # Get or create task attempt - handle both main tasks and typing tasks
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        
-        if not task_row:
-            # If not found in main tasks table, try typing_tasks table
-            cursor.execute("SELECT id FROM typing_tasks WHERE task_name = %s", (task_name,))
-            typing_task_row = cursor.fetchone()
-            if typing_task_row:
-                # For typing tasks, we need to use the main "Typing Task" as the parent task
-                cursor.execute("SELECT id FROM tasks WHERE task_name = 'Typing Task'")
-                main_task_row = cursor.fetchone()
-                if main_task_row:
-                    task_id = main_task_row[0]
-                else:
-                    return jsonify({'success': False, 'message': 'Typing Task not found in main tasks'}), 404
-            else:
-                return jsonify({'success': False, 'message': 'Task not found'}), 404
-        else:
-            task_id = task_row[0]
+        # Get or create task attempt - typing prompts (typing_tasks) are recorded under the main "Typing Task"
+        task_id = task_catalog.task_id(task_name, include_aliases=True)
+        if not task_id:
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
         
         # Get current attempt or create new one
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row[0]
-            attempt_number = attempt_row[1]
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            attempt_number = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-            attempt_id = cursor.lastrowid
-        
-        # Save final progress to typing_progress table
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        
+        # Flush buffered autosaves, then mark attempt as completed before writing the final state
+        progress_buffer.flush(attempt_id=attempt_id, conn=conn)
+        attempt_id, attempt_number = complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)
+        
+        # Delta clients send the unacknowledged tail with the submit; the full log is
+        # then written once to typing_progress and the chunks are dropped
+        if chunk:
+            append_chunk(conn, attempt_id, *chunk)
+        rebuilt = load_keystrokes(conn, attempt_id)
+        if rebuilt:
+            keystrokes = json.dumps(rebuilt[0])
+            drop_chunks(conn, attempt_id)
+        
+        # Save final progress to typing_progress table (a packed log replaces any legacy JSON copy)
         cursor.execute('''
-            INSERT INTO typing_progress (attempt_id, text, keystrokes, timer, updated_at)
+            INSERT INTO typing_progress (attempt_id, text, keystrokes_packed, timer, updated_at)
             VALUES (%s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE text=VALUES(text), keystrokes=VALUES(keystrokes), timer=VALUES(timer), updated_at=NOW()
-        ''', (attempt_id, text, keystrokes, timer))
+            ON DUPLICATE KEY UPDATE text=VALUES(text),
+                keystrokes=IF(VALUES(keystrokes_packed) IS NULL, keystrokes, NULL),
+                keystrokes_packed=COALESCE(VALUES(keystrokes_packed), keystrokes_packed),
+                timer=VALUES(timer), updated_at=NOW()
+        ''', (attempt_id, text, pack_keystrokes(keystrokes), timer))
         
-        # Mark attempt as completed
-        cursor.execute("""
-            UPDATE user_task_attempts 
-            SET status = 'Completed', completed_at = NOW()
-            WHERE id = %s
-        """, (attempt_id,))
+        # Typing-dynamics features for the final log; a failure here must not lose the submit
+        try:
+            refresh_typing_features(conn, attempt_id)
+        except Exception as e:
+            print(f"Typing features error for attempt {attempt_id}: {e}")
         
         # Mark user_tasks as Completed
         cursor.execute('''
@@ -3730,12 +4013,12 @@ def get_typing_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
+        # Write out spooled autosaves (from any worker) first so the read sees them
+        progress_buffer.flush(user_id=session['user_id'], task_id=task_id, conn=conn)
         
         # Get the latest IN PROGRESS attempt and its progress (not completed ones)
         # Order by progress updated_at to get the most recent saved progress
@@ -3746,7 +4029,7 @@ def get_typing_progress():
                 uta.status as attempt_status,
                 uta.started_at,
                 uta.completed_at,
-                tp.text, tp.keystrokes, tp.timer, tp.updated_at
+                tp.text, tp.keystrokes, tp.keystrokes_packed, tp.timer, tp.updated_at
             FROM user_task_attempts uta
             LEFT JOIN typing_progress tp ON tp.attempt_id = uta.id
             WHERE uta.user_id = %s AND uta.task_id = %s AND uta.status = 'In Progress'
@@ -3756,6 +4039,16 @@ def get_typing_progress():
         
         result = cursor.fetchone()
         cursor.close()
+        
+        # Logs sent through /api/typing-keystrokes are rebuilt from their chunks
+        keystroke_seq = 0
+        if result and result.get('text'):
+            rebuilt = load_keystrokes(conn, result['attempt_id'])
+            if rebuilt:
+                result['keystrokes'] = json.dumps(rebuilt[0])
+                keystroke_seq = rebuilt[1]
+            elif result.get('keystrokes_packed') is not None:
+                result['keystrokes'] = unpack_keystrokes(result['keystrokes_packed'])
         conn.close()
         
         if result and result.get('text'):
@@ -3764,6 +4057,7 @@ def get_typing_progress():
                 'progress': {
                     'text': result.get('text', ''),
                     'keystrokes': result.get('keystrokes', ''),
+                    'keystroke_seq': keystroke_seq,
                     'timer': result.get('timer', 0),
                     'updated_at': result.get('updated_at'),
                     'attempt_id': result.get('attempt_id'),
@@ -3793,26 +4087,12 @@ def retake_typing():
         cursor = conn.cursor()
 
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
 
-        task_id = task_row[0]
-
-        # Get next attempt number
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        attempt_number = cursor.fetchone()[0]
-
         # Create new attempt
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-        attempt_id = cursor.lastrowid
+        attempt_id, attempt_number = start_new_attempt(conn, session['user_id'], task_id)
 
         # Mark user_tasks as In Progress
         cursor.execute('''
@@ -3841,57 +4121,20 @@ def save_comprehension_progress():
     
     try:
         conn = connect_db()
-        cursor = conn.cursor()
         
         # Get or create task attempt
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row[0]
-        
-        # Get current attempt or create new one
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row[0]
-            attempt_number = attempt_row[1]
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            attempt_number = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-            attempt_id = cursor.lastrowid
-        
-        # Save progress to comprehension_progress table
-        cursor.execute('''
-            INSERT INTO comprehension_progress (attempt_id, q1, q2, q3, status, updated_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE q1=VALUES(q1), q2=VALUES(q2), q3=VALUES(q3), status=VALUES(status), updated_at=NOW()
-        ''', (attempt_id, q1, q2, q3, 'In Progress'))
-        
-        # Mark user_tasks as In Progress
-        cursor.execute('''
-            INSERT INTO user_tasks (user_id, task_name, status)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
-        ''', (session['user_id'], task_name, 'In Progress'))
+        # Get current attempt or create new one (committed now so the buffered write can find it)
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        if conn.in_transaction:
+            conn.commit()
         
-        conn.commit()
-        cursor.close()
+        # Queue progress; the buffer writes comprehension_progress and marks user_tasks In Progress
+        progress_buffer.put('comprehension_progress', attempt_id, {'q1': q1, 'q2': q2, 'q3': q3, 'status': 'In Progress'},
+                            session['user_id'], task_id, task_name, conn=conn)
         conn.close()
         return jsonify({'success': True, 'message': 'Progress saved successfully', 'attempt_id': attempt_id, 'attempt_number': attempt_number})
     except Exception as e:
@@ -3910,12 +4153,12 @@ def get_comprehension_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
+        # Write out spooled autosaves (from any worker) first so the read sees them
+        progress_buffer.flush(user_id=session['user_id'], task_id=task_id, conn=conn)
         
         # Get the latest IN PROGRESS attempt and its progress (not completed ones)
         # Order by progress updated_at to get the most recent saved progress
@@ -3976,37 +4219,16 @@ def submit_comprehension():
         cursor = conn.cursor()
         
         # Get or create task attempt
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row[0]
-        
         # Get current attempt or create new one
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
         
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row[0]
-            attempt_number = attempt_row[1]
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            attempt_number = cursor.fetchone()[0]
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-            attempt_id = cursor.lastrowid
+        # Flush buffered autosaves, then mark attempt as completed before writing the final state
+        progress_buffer.flush(attempt_id=attempt_id, conn=conn)
+        attempt_id, attempt_number = complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)
         
         # Calculate score by comparing answers with correct answers
         score = 0
@@ -4060,13 +4282,6 @@ def submit_comprehension():
             ON DUPLICATE KEY UPDATE q1=VALUES(q1), q2=VALUES(q2), q3=VALUES(q3), status=VALUES(status), score=VALUES(score), max_score=VALUES(max_score), updated_at=NOW()
         ''', (attempt_id, q1, q2, q3, 'Completed', score, max_score))
         
-        # Mark attempt as completed
-        cursor.execute("""
-            UPDATE user_task_attempts 
-            SET status = 'Completed', completed_at = NOW()
-            WHERE id = %s
-        """, (attempt_id,))
-        
         # Mark user_tasks as Completed
         cursor.execute('''
             INSERT INTO user_tasks (user_id, task_name, status)
@@ -4096,26 +4311,12 @@ def retake_comprehension():
         cursor = conn.cursor()
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row[0]
-        
-        # Get next attempt number
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        attempt_number = cursor.fetchone()[0]
-        
         # Create new attempt
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """, (session['user_id'], task_id, attempt_number, 'In Progress'))
-        attempt_id = cursor.lastrowid
+        attempt_id, attempt_number = start_new_attempt(conn, session['user_id'], task_id)
         
         # Mark user_tasks as In Progress
         cursor.execute('''
@@ -4165,43 +4366,16 @@ def save_aptitude_progress():
     
     try:
         conn = connect_db()
-        cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
-        # Get or create IN PROGRESS attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row['id']
-            attempt_number = attempt_row['attempt_number']
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt 
-                FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            next_attempt = cursor.fetchone()['next_attempt']
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session['user_id'], task_id, next_attempt, 'In Progress'))
-            
-            attempt_id = cursor.lastrowid
-            attempt_number = next_attempt
+        # Get or create IN PROGRESS attempt (committed now so the buffered write can find it)
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        if conn.in_transaction:
+            conn.commit()
         
         # Save/update aptitude progress
         # Handle JSON serialization properly
@@ -4216,45 +4390,19 @@ def save_aptitude_progress():
         else:
             print("No answers to serialize")  # Debug logging
         
-        # Debug the SQL parameters
-        sql_params = (
-            attempt_id, logical_reasoning_score, numerical_ability_score,
-            verbal_ability_score, spatial_reasoning_score, total_score,
-            'In Progress', answers_json,
-            current_section, answered_count, progress_percent
-        )
-        print(f"SQL parameters: {sql_params}")  # Debug logging
-        
-        cursor.execute("""
-            INSERT INTO aptitude_progress (
-                attempt_id, logical_reasoning_score, numerical_ability_score, 
-                verbal_ability_score, spatial_reasoning_score, total_score, 
-                status, answers, current_section, answered_count, progress_percent, updated_at
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE 
-                logical_reasoning_score=VALUES(logical_reasoning_score), 
-                numerical_ability_score=VALUES(numerical_ability_score), 
-                verbal_ability_score=VALUES(verbal_ability_score), 
-                spatial_reasoning_score=VALUES(spatial_reasoning_score), 
-                total_score=VALUES(total_score), 
-                status=VALUES(status), 
-                answers=VALUES(answers),
-                current_section=VALUES(current_section),
-                answered_count=VALUES(answered_count),
-                progress_percent=VALUES(progress_percent),
-                updated_at=NOW()
-        """, sql_params)
-        
-        # Mark user_tasks as In Progress
-        cursor.execute("""
-            INSERT INTO user_tasks (user_id, task_name, status)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
-        """, (session['user_id'], task_name, 'In Progress'))
-        
-        conn.commit()
-        cursor.close()
+        # Queue progress; the buffer writes aptitude_progress and marks user_tasks In Progress
+        progress_buffer.put('aptitude_progress', attempt_id, {
+            'logical_reasoning_score': logical_reasoning_score,
+            'numerical_ability_score': numerical_ability_score,
+            'verbal_ability_score': verbal_ability_score,
+            'spatial_reasoning_score': spatial_reasoning_score,
+            'total_score': total_score,
+            'status': 'In Progress',
+            'answers': answers_json,
+            'current_section': current_section,
+            'answered_count': answered_count,
+            'progress_percent': progress_percent
+        }, session['user_id'], task_id, task_name, conn=conn)
         conn.close()
         
         return jsonify({
@@ -4281,12 +4429,12 @@ def get_aptitude_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
+        # Write out spooled autosaves (from any worker) first so the read sees them
+        progress_buffer.flush(user_id=session['user_id'], task_id=task_id, conn=conn)
         
         # Get the latest attempt and its progress (regardless of status)
         cursor.execute('''
@@ -4361,26 +4509,20 @@ def submit_aptitude():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get the latest IN PROGRESS attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if not attempt_row:
+        active_attempt = find_active_attempt(conn, session['user_id'], task_id)
+        if not active_attempt:
             return jsonify({'success': False, 'message': 'No active attempt found'}), 404
         
-        attempt_id = attempt_row['id']
-        attempt_number = attempt_row['attempt_number']
+        attempt_id, attempt_number = active_attempt
+        
+        # Flush buffered autosaves, then mark attempt as completed before writing the final state
+        progress_buffer.flush(attempt_id=attempt_id, conn=conn)
+        attempt_id, attempt_number = complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)
         
         # Update aptitude progress to completed
         # Handle JSON serialization properly
@@ -4426,13 +4568,6 @@ def submit_aptitude():
             current_section, answered_count, progress_percent
         ))
         
-        # Mark attempt as completed
-        cursor.execute("""
-            UPDATE user_task_attempts 
-            SET status = 'Completed', completed_at = NOW()
-            WHERE id = %s
-        """, (attempt_id,))
-        
         # Mark user_tasks as Completed
         cursor.execute("""
             INSERT INTO user_tasks (user_id, task_name, status)
@@ -4468,27 +4603,12 @@ def retake_aptitude():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Create new attempt
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt 
-            FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        next_attempt = cursor.fetchone()['next_attempt']
-        
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, %s, NOW())
-        """, (session['user_id'], task_id, next_attempt, 'In Progress'))
-        
-        attempt_id = cursor.lastrowid
+        attempt_id, next_attempt = start_new_attempt(conn, session['user_id'], task_id)
         
         # Mark user_tasks as In Progress
         cursor.execute("""
@@ -4534,9 +4654,29 @@ def get_reading_tasks(user_id):
         
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        cursor.close()
+        conn.close()
         if not class_level:
             print("No class level; returning default reading tasks")
-            return getDefaultReadingTasks()
+            return _task_content_response('reading-aloud', None, getDefaultReadingTasks)
+        
+        return _task_content_response('reading-aloud', class_level, lambda: getClassReadingTasks(class_level))
+        
+    except Exception as e:
+        print(f"Get reading tasks error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Failed to fetch reading tasks: {str(e)}'}), 500
+
+
+def getClassReadingTasks(class_level):
+    """Return reading tasks for a class level"""
+    try:
+        conn = connect_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+        cursor = conn.cursor(dictionary=True)
         
         # Check if reading_tasks table exists
         cursor.execute("SHOW TABLES LIKE 'reading_tasks'")
@@ -4569,9 +4709,7 @@ def get_reading_tasks(user_id):
         })
         
     except Exception as e:
-        print(f"Get reading tasks error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Get class reading tasks error: {e}")
         return jsonify({'success': False, 'message': f'Failed to fetch reading tasks: {str(e)}'}), 500
 
 
@@ -4659,9 +4797,29 @@ def get_reading_comprehension_tasks(user_id):
         
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        cursor.close()
+        conn.close()
         if not class_level:
             print("No class level; returning default RC tasks")
-            return getDefaultReadingComprehensionTasks()
+            return _task_content_response('reading-comprehension', None, getDefaultReadingComprehensionTasks)
+        
+        return _task_content_response('reading-comprehension', class_level, lambda: getClassReadingComprehensionTasks(class_level))
+        
+    except Exception as e:
+        print(f"Get reading comprehension tasks error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Failed to fetch reading comprehension tasks: {str(e)}'}), 500
+
+
+def getClassReadingComprehensionTasks(class_level):
+    """Return reading comprehension tasks for a class level"""
+    try:
+        conn = connect_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+        cursor = conn.cursor(dictionary=True)
         
         # Check if reading_comprehension_tasks table exists
         cursor.execute("SHOW TABLES LIKE 'reading_comprehension_tasks'")
@@ -4694,9 +4852,7 @@ def get_reading_comprehension_tasks(user_id):
         })
         
     except Exception as e:
-        print(f"Get reading comprehension tasks error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Get class reading comprehension tasks error: {e}")
         return jsonify({'success': False, 'message': f'Failed to fetch reading comprehension tasks: {str(e)}'}), 500
 
 
@@ -4784,9 +4940,29 @@ def get_typing_tasks(user_id):
         
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        cursor.close()
+        conn.close()
         if not class_level:
             print("No class level; returning default typing tasks")
-            return getDefaultTypingTasks()
+            return _task_content_response('typing', None, getDefaultTypingTasks)
+        
+        return _task_content_response('typing', class_level, lambda: getClassTypingTasks(class_level))
+        
+    except Exception as e:
+        print(f"Get typing tasks error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Failed to fetch typing tasks: {str(e)}'}), 500
+
+
+def getClassTypingTasks(class_level):
+    """Return typing tasks for a class level"""
+    try:
+        conn = connect_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+        cursor = conn.cursor(dictionary=True)
         
         # Check if typing_tasks table exists
         cursor.execute("SHOW TABLES LIKE 'typing_tasks'")
@@ -4819,9 +4995,7 @@ def get_typing_tasks(user_id):
         })
         
     except Exception as e:
-        print(f"Get typing tasks error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Get class typing tasks error: {e}")
         return jsonify({'success': False, 'message': f'Failed to fetch typing tasks: {str(e)}'}), 500
 
 
@@ -5014,9 +5188,29 @@ def get_mathematical_comprehension_tasks(user_id):
         
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        cursor.close()
+        conn.close()
         if not class_level:
             print("No class level; returning default math comp tasks")
-            return getDefaultMathematicalComprehensionTasks()
+            return _task_content_response('mathematical-comprehension', None, getDefaultMathematicalComprehensionTasks)
+        
+        return _task_content_response('mathematical-comprehension', class_level, lambda: getClassMathematicalComprehensionTasks(class_level))
+        
+    except Exception as e:
+        print(f"Get mathematical comprehension tasks error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Failed to fetch mathematical comprehension tasks: {str(e)}'}), 500
+
+
+def getClassMathematicalComprehensionTasks(class_level):
+    """Return mathematical comprehension tasks for a class level"""
+    try:
+        conn = connect_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+        cursor = conn.cursor(dictionary=True)
         
         # Check if mathematical_comprehension_tasks table exists
         cursor.execute("SHOW TABLES LIKE 'mathematical_comprehension_tasks'")
@@ -5049,9 +5243,7 @@ def get_mathematical_comprehension_tasks(user_id):
         })
         
     except Exception as e:
-        print(f"Get mathematical comprehension tasks error: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Get class mathematical comprehension tasks error: {e}")
         return jsonify({'success': False, 'message': f'Failed to fetch mathematical comprehension tasks: {str(e)}'}), 500
 
 
@@ -5159,12 +5351,23 @@ def get_writing_tasks(user_id):
         if not conn:
             return jsonify({'success': False, 'message': 'Database connection failed'}), 500
             
-        cursor = conn.cursor(dictionary=True)
-        
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        conn.close()
         if not class_level:
-            return getDefaultWritingTasks()
+            return _task_content_response('writing', None, getDefaultWritingTasks)
+        
+        return _task_content_response('writing', class_level, lambda: getClassWritingTasks(class_level))
+            
+    except Exception as e:
+        print(f"Get writing tasks error: {e}")
+        return jsonify({'success': False, 'message': 'Failed to load writing tasks'}), 500
+
+def getClassWritingTasks(class_level):
+    """Get writing tasks for a class level, or the defaults when it has none"""
+    try:
+        conn = connect_db()
+        cursor = conn.cursor(dictionary=True)
         
         # Get writing tasks for class
         cursor.execute("""
@@ -5173,6 +5376,10 @@ def get_writing_tasks(user_id):
             ORDER BY difficulty_level, class_level
         """, (class_level,))
         tasks = cursor.fetchall()
+        
+        cursor.close()
+        conn.close()
+        
         if tasks:
             return jsonify({
                 'success': True,
@@ -5184,13 +5391,8 @@ def get_writing_tasks(user_id):
             return getDefaultWritingTasks()
             
     except Exception as e:
-        print(f"Get writing tasks error: {e}")
+        print(f"Get class writing tasks error: {e}")
         return jsonify({'success': False, 'message': 'Failed to load writing tasks'}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
 
 def getDefaultWritingTasks():
     """Get default writing tasks when class is not available"""
@@ -5295,17 +5497,42 @@ def get_aptitude_tasks(user_id):
             
         cursor = conn.cursor(dictionary=True)
         
-        # First check if user exists
-        cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+        # First check if user exists (and their school, which can scope aptitude tasks)
+        cursor.execute("SELECT id, school_id FROM users WHERE id = %s", (user_id,))
         user_exists = cursor.fetchone()
         if not user_exists:
             print(f"User {user_id} not found")
             return jsonify({'success': False, 'message': 'User not found'}), 404
+        user_school_id = user_exists.get('school_id')
         
         # Determine user's class level
         class_level = _get_user_class_level(conn, user_id)
+        cursor.close()
+        conn.close()
         if not class_level:
-            return getDefaultAptitudeTasks()
+            return _task_content_response('aptitude', None, getDefaultAptitudeTasks)
+        
+        return _task_content_response(
+            'aptitude', class_level,
+            lambda: getClassAptitudeTasks(class_level, user_school_id),
+            scope=user_school_id,
+        )
+        
+    except Exception as e:
+        print(f"Get aptitude tasks error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Failed to fetch aptitude tasks: {str(e)}'}), 500
+
+
+def getClassAptitudeTasks(class_level, user_school_id):
+    """Return aptitude tasks for a class level (and the user's school, when tasks are school-scoped)"""
+    try:
+        conn = connect_db()
+        if not conn:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+        cursor = conn.cursor(dictionary=True)
         
         # Check if aptitude_tasks table exists
         cursor.execute("SHOW TABLES LIKE 'aptitude_tasks'")
@@ -5313,11 +5540,6 @@ def get_aptitude_tasks(user_id):
         if not table_exists:
             print("aptitude_tasks table does not exist")
             return jsonify({'success': False, 'message': 'Aptitude tasks not configured. Please contact administrator.'}), 500
-        
-        # Determine user's school (if any)
-        cursor.execute("SELECT school_id FROM users WHERE id=%s", (user_id,))
-        urow = cursor.fetchone() or {}
-        user_school_id = urow.get('school_id')
 
         # Check if aptitude_tasks has school_id column (optional school scoping)
         cursor.execute("SHOW COLUMNS FROM aptitude_tasks LIKE 'school_id'")
@@ -5358,11 +5580,9 @@ def get_aptitude_tasks(user_id):
             'class_level': class_level,
             'total_tasks': len(tasks)
         })
-        
-    except Exception as e:
-        print(f"Get aptitude tasks error: {e}")
-        import traceback
-        traceback.print_exc()
+        
+    except Exception as e:
+        print(f"Get class aptitude tasks error: {e}")
         return jsonify({'success': False, 'message': f'Failed to fetch aptitude tasks: {str(e)}'}), 500
 
 
@@ -5484,39 +5704,17 @@ def upload_writing():
     # Check if file is an image
     if file and allowed_file(file.filename):
         filename = secure_filename(f"writing_user{session['user_id']}_task{task_id}_" + datetime.now().strftime('%Y%m%d%H%M%S') + '_' + file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         try:
             conn = connect_db()
             cursor = conn.cursor(dictionary=True)
+            upload_storage.save(cursor, filename, file.stream, session['user_id'])
             
             # Get or create task attempt
-            cursor.execute("""
-                SELECT id, attempt_number FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-                ORDER BY attempt_number DESC LIMIT 1
-            """, (session['user_id'], task_id))
+            attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
             
-            attempt_row = cursor.fetchone()
-            if attempt_row:
-                attempt_id = attempt_row['id']
-                attempt_number = attempt_row['attempt_number']
-            else:
-                # Create new attempt
-                cursor.execute("""
-                    SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-                    FROM user_task_attempts 
-                    WHERE user_id = %s AND task_id = %s
-                """, (session['user_id'], task_id))
-                next_attempt = cursor.fetchone()['next_attempt']
-                
-                cursor.execute("""
-                    INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                    VALUES (%s, %s, %s, 'In Progress', NOW())
-                """, (session['user_id'], task_id, next_attempt))
-                attempt_id = cursor.lastrowid
-                attempt_number = next_attempt
+            # Mark attempt as completed (first: a stale cached attempt is swapped for the current one)
+            attempt_id, attempt_number = complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)
             
             # Save writing sample to database as completed
             cursor.execute("""
@@ -5524,13 +5722,7 @@ def upload_writing():
                 VALUES (%s, %s, %s, NOW())
                 ON DUPLICATE KEY UPDATE filename = VALUES(filename), status = VALUES(status), uploaded_at = NOW()
             """, (attempt_id, filename, 'Completed'))
-            
-            # Mark attempt as completed
-            cursor.execute("""
-                UPDATE user_task_attempts 
-                SET status = 'Completed', completed_at = NOW()
-                WHERE id = %s
-            """, (attempt_id,))
+            image_renditions.enqueue(cursor, filename)
             
             # Mark user_tasks as Completed
             cursor.execute("""
@@ -5573,39 +5765,14 @@ def save_writing_progress():
     # Check if file is an image
     if file and allowed_file(file.filename):
         filename = secure_filename(f"writing_user{session['user_id']}_task{task_id}_" + datetime.now().strftime('%Y%m%d%H%M%S') + '_' + file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
         
         try:
             conn = connect_db()
             cursor = conn.cursor(dictionary=True)
+            upload_storage.save(cursor, filename, file.stream, session['user_id'])
             
             # Get or create task attempt
-            cursor.execute("""
-                SELECT id, attempt_number FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-                ORDER BY attempt_number DESC LIMIT 1
-            """, (session['user_id'], task_id))
-            
-            attempt_row = cursor.fetchone()
-            if attempt_row:
-                attempt_id = attempt_row['id']
-                attempt_number = attempt_row['attempt_number']
-            else:
-                # Create new attempt
-                cursor.execute("""
-                    SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-                    FROM user_task_attempts 
-                    WHERE user_id = %s AND task_id = %s
-                """, (session['user_id'], task_id))
-                next_attempt = cursor.fetchone()['next_attempt']
-                
-                cursor.execute("""
-                    INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                    VALUES (%s, %s, %s, 'In Progress', NOW())
-                """, (session['user_id'], task_id, next_attempt))
-                attempt_id = cursor.lastrowid
-                attempt_number = next_attempt
+            attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
             
             # Save writing sample to database with In Progress status
             cursor.execute("""
@@ -5613,6 +5780,7 @@ def save_writing_progress():
                 VALUES (%s, %s, %s, NOW())
                 ON DUPLICATE KEY UPDATE filename = VALUES(filename), uploaded_at = NOW()
             """, (attempt_id, filename, 'In Progress'))
+            image_renditions.enqueue(cursor, filename)
             
             # Mark user_tasks as In Progress
             cursor.execute("""
@@ -5634,6 +5802,21 @@ def save_writing_progress():
         return jsonify({'success': False, 'message': 'Invalid file type. Please upload an image.'}), 400
 
 
+@app.route('/api/admin/jobs', methods=['GET'])
+def get_jobs_backlog():
+    """Background job queue depths, for monitoring the worker"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        conn = connect_db()
+        backlog = {name: queue.backlog(conn) for name, (queue, _) in WORKER_QUEUES.items()}
+        conn.close()
+        return jsonify({'success': True, 'backlog': backlog})
+    except Exception as e:
+        print(f"Jobs backlog error: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+
 @app.route('/api/admin/tasks', methods=['GET'])
 def get_all_tasks():
     if not session.get('is_admin'):
@@ -5708,6 +5891,7 @@ def add_task():
             VALUES (%s, %s, %s, %s, %s, %s)
         ''', (task_name, description, instructions, estimated_time, devices_required, example))
         conn.commit()
+        task_catalog.invalidate()
         # Create the HTML file for the task
         create_task_html(task_name, instructions, estimated_time, devices_required, example, main_content)
         return jsonify({'success': True, 'message': 'Task added'})
@@ -5732,6 +5916,7 @@ def edit_task(task_id):
     try:
         cursor.execute('UPDATE tasks SET task_name = %s, description = %s WHERE id = %s', (task_name, description, task_id))
         conn.commit()
+        task_catalog.invalidate()
         return jsonify({'success': True, 'message': 'Task updated'})
     except Exception as e:
         conn.rollback()
@@ -5764,6 +5949,7 @@ def delete_task(task_id):
         # Finally, delete from tasks table
         cursor.execute('DELETE FROM tasks WHERE id = %s', (task_id,))
         conn.commit()
+        task_catalog.invalidate()
         return jsonify({'success': True, 'message': 'Task deleted'})
     except Exception as e:
         conn.rollback()
@@ -5868,35 +6054,11 @@ def admin_parent_detail(parent_id: int):
         if not parent:
             return jsonify({'success': False, 'message': 'Parent not found'}), 404
 
-        cursor.execute(
-            """
-            SELECT 
-                c.id,
-                c.name,
-                c.email,
-                c.is_active,
-                c.created_at,
-                d.age,
-                cls.name AS class_name,
-                sec.name AS section_name,
-                sch.name AS school_name
-            FROM users c
-            LEFT JOIN demographics d ON d.user_id = c.id
-            LEFT JOIN class_sections sec ON sec.id = c.section_id
-            LEFT JOIN school_classes cls ON cls.id = sec.class_id
-            LEFT JOIN schools sch ON sch.id = c.school_id
-            WHERE c.user_type = 'child'
-              AND (
-                    c.parent_id = %s OR EXISTS (
-                        SELECT 1 FROM parent_children pc
-                        WHERE pc.child_id = c.id AND pc.parent_id = %s
-                    )
-                  )
-            ORDER BY c.created_at DESC
-            """,
-            (parent_id, parent_id)
-        )
-        children = cursor.fetchall()
+        children = [
+            pick(child, ['id', 'name', 'email', 'is_active', 'created_at', 'age',
+                         'class_name', 'section_name', 'school_name'])
+            for child in load_children(cursor, [parent], include_linked=True, order='created_at_desc')[parent_id]
+        ]
         parent['total_children'] = len(children)
 
         return jsonify({
@@ -6092,6 +6254,37 @@ def admin_user_export(user_id):
         cursor.close()
         conn.close()
 
+@app.route('/api/admin/export', methods=['GET'])
+def admin_study_export():
+    """Streams the whole study's research data (?format=ndjson|csv, gzip=1, school_id, class_level, since, until)"""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in study_export.FORMATS:
+        return jsonify({'success': False, 'message': 'format must be ndjson or csv'}), 400
+    try:
+        filters = study_export.parse_filters(
+            request.args.get('school_id'), request.args.get('class_level'),
+            request.args.get('since'), request.args.get('until'),
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    conn = connect_db()
+    if not conn:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    compress = request.args.get('gzip') in ('1', 'true')
+    mimetype, extension = study_export.FORMATS[fmt]
+    filename = f"study_export_{datetime.now():%Y%m%d_%H%M%S}.{extension}{'.gz' if compress else ''}"
+    # stream_with_context keeps the request (and its pooled connection) alive until the last chunk
+    response = Response(
+        stream_with_context(study_export.stream(conn, fmt, compress, **filters)),
+        mimetype='application/gzip' if compress else mimetype,
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    # Stop nginx from buffering the whole download before sending it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/admin/dashboard-stats', methods=['GET'])
 def admin_dashboard_stats():
     if not session.get('is_admin'):
@@ -6107,18 +6300,20 @@ def admin_dashboard_stats():
         total_participants = cursor.fetchone()['total']
         stats['totalParticipants'] = total_participants
 
-        # Average completion rate (average progress across all users)
-        cursor.execute('SELECT id FROM users')
-        user_ids = [row['id'] for row in cursor.fetchall()]
-        total_progress = 0
-        for user_id in user_ids:
-            cursor.execute('SELECT COUNT(*) as total FROM user_tasks WHERE user_id = %s', (user_id,))
-            total_tasks = cursor.fetchone()['total']
-            cursor.execute("SELECT COUNT(*) as completed FROM user_tasks WHERE user_id = %s AND status = 'Completed'", (user_id,))
-            completed_tasks = cursor.fetchone()['completed']
-            progress = int((completed_tasks / total_tasks) * 100) if total_tasks else 0
-            total_progress += progress
-        avg_completion = int(total_progress / len(user_ids)) if user_ids else 0
+        # Average completion rate (average progress across all users; users without tasks count as 0%)
+        # One grouped pass over user_tasks instead of two COUNT queries per user
+        cursor.execute("""
+            SELECT COUNT(*) AS total_users, COALESCE(SUM(ut.progress), 0) AS total_progress
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, FLOOR(SUM(status = 'Completed') * 100 / COUNT(*)) AS progress
+                FROM user_tasks
+                GROUP BY user_id
+            ) ut ON ut.user_id = u.id
+        """)
+        completion = cursor.fetchone()
+        total_users = completion['total_users']
+        avg_completion = int(completion['total_progress'] / total_users) if total_users else 0
         stats['completionRate'] = avg_completion
 
         # Active studies (number of tasks)
@@ -6148,6 +6343,13 @@ def admin_dashboard_stats():
         cursor.close()
         conn.close()
 
+@app.route('/api/admin/db-pool-stats', methods=['GET'])
+def admin_db_pool_stats():
+    """Connection pool gauges (in use, idle, checkout wait) and autosave buffer gauges."""
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return jsonify({'success': True, 'pool': db_pool.stats(), 'autosave': progress_buffer.stats()})
+
 @app.route('/api/admin/get-child-tasks', methods=['GET'])
 def admin_get_child_tasks():
     """Get all tasks for a specific child user"""
@@ -6200,13 +6402,10 @@ def get_writing_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get the latest IN PROGRESS attempt and its progress (not completed ones)
         # Order by progress uploaded_at to get the most recent saved progress
         cursor.execute('''
@@ -6268,6 +6467,7 @@ def admin_set_user_task_status():
             ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
         ''', (user_id, task_name, status))
         conn.commit()
+        mark_user_changed(user_id)
         return jsonify({'success': True})
     except Exception as e:
         conn.rollback()
@@ -6497,248 +6697,8 @@ def get_class_wise_statistics():
             return jsonify({'success': False, 'message': 'Database connection failed'}), 500
         school_id = session['school_id']
 
-        # Get all classes for this school
-        cursor.execute("""
-            SELECT id, name, academic_year
-            FROM school_classes
-            WHERE school_id = %s
-            ORDER BY academic_year DESC, name ASC
-        """, (school_id,))
-        classes = cursor.fetchall()
-
-        class_statistics = []
-
-        for class_info in classes:
-            class_id = class_info['id']
-            class_name = class_info['name']
-            academic_year = class_info['academic_year']
-
-            # Get all students (children) in this class (through sections)
-            cursor.execute("""
-                SELECT DISTINCT u.id as student_id
-                FROM users u
-                JOIN class_sections cs ON u.section_id = cs.id
-                WHERE cs.class_id = %s AND u.user_type = 'child' AND u.school_id = %s
-            """, (class_id, school_id))
-            students = cursor.fetchall()
-            student_ids = [s['student_id'] for s in students]
-            total_students = len(student_ids)
-
-            if total_students == 0:
-                # No students in this class, add empty stats
-                class_statistics.append({
-                    'class_id': class_id,
-                    'class_name': class_name,
-                    'academic_year': academic_year,
-                    'total_students': 0,
-                    'total_tasks_completed': 0,
-                    'students_attempted_all_tasks': 0,
-                    'students_completed_all_tasks': 0,
-                    'reading_comprehension': {
-                        'average_score': 0,
-                        'min_score': 0,
-                        'max_score': 0,
-                        'students_attempted': 0,
-                        'students_completed': 0
-                    },
-                    'mathematical_comprehension': {
-                        'average_score': 0,
-                        'min_score': 0,
-                        'max_score': 0,
-                        'students_attempted': 0,
-                        'students_completed': 0
-                    },
-                    'aptitude': {
-                        'average_score': 0,
-                        'min_score': 0,
-                        'max_score': 0,
-                        'students_attempted': 0,
-                        'students_completed': 0
-                    }
-                })
-                continue
-
-            # Get task IDs for the three main tasks
-            cursor.execute("""
-                SELECT id, task_name FROM tasks 
-                WHERE task_name IN ('Reading Comprehension', 'Mathematical Comprehension', 'Aptitude Test')
-            """)
-            task_map = {row['task_name']: row['id'] for row in cursor.fetchall()}
-
-            # 1. Total tasks completed (count distinct completed tasks across all students)
-            if student_ids:
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT ut.task_name) as total_tasks_completed
-                    FROM user_tasks ut
-                    WHERE ut.user_id IN ({}) AND ut.status = 'Completed'
-                """.format(','.join(['%s'] * len(student_ids))), student_ids)
-                total_tasks_completed_result = cursor.fetchone()
-                total_tasks_completed = total_tasks_completed_result['total_tasks_completed'] if total_tasks_completed_result else 0
-            else:
-                total_tasks_completed = 0
-
-            # 2. Students attempted and completed all tasks
-            # Get all available tasks (from tasks table or from section_assessments)
-            # First, try to get tasks assigned to sections in this class
-            cursor.execute("""
-                SELECT DISTINCT sa.task_name
-                FROM section_assessments sa
-                JOIN class_sections cs ON sa.section_id = cs.id
-                WHERE cs.class_id = %s
-            """, (class_id,))
-            assigned_tasks = [row['task_name'] for row in cursor.fetchall()]
-            
-            # If no assigned tasks, get all tasks from tasks table
-            if not assigned_tasks:
-                cursor.execute("SELECT DISTINCT task_name FROM tasks")
-                assigned_tasks = [row['task_name'] for row in cursor.fetchall()]
-            
-            total_available_tasks = len(assigned_tasks) if assigned_tasks else 0
-
-            # Count students who attempted and completed all tasks
-            students_attempted_all = 0
-            students_completed_all = 0
-
-            if total_available_tasks > 0 and student_ids:
-                # Get task counts for each student
-                cursor.execute("""
-                    SELECT ut.user_id, 
-                           COUNT(DISTINCT ut.task_name) as attempted_tasks,
-                           COUNT(DISTINCT CASE WHEN ut.status = 'Completed' THEN ut.task_name END) as completed_tasks
-                    FROM user_tasks ut
-                    WHERE ut.user_id IN ({})
-                    GROUP BY ut.user_id
-                """.format(','.join(['%s'] * len(student_ids))), student_ids)
-                
-                for row in cursor.fetchall():
-                    if row['attempted_tasks'] == total_available_tasks:
-                        students_attempted_all += 1
-                    if row['completed_tasks'] == total_available_tasks:
-                        students_completed_all += 1
-
-            # 3. Reading Comprehension Statistics
-            reading_stats = {'average_score': 0, 'min_score': 0, 'max_score': 0, 'students_attempted': 0, 'students_completed': 0}
-            if 'Reading Comprehension' in task_map and student_ids:
-                reading_task_id = task_map['Reading Comprehension']
-                # Count students who attempted (any attempt)
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT uta.user_id) as students_attempted
-                    FROM user_task_attempts uta
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [reading_task_id])
-                attempted_result = cursor.fetchone()
-                students_attempted = int(attempted_result['students_attempted']) if attempted_result and attempted_result['students_attempted'] else 0
-                
-                # Get score statistics from completed attempts only
-                cursor.execute("""
-                    SELECT 
-                        AVG(cp.score) as avg_score,
-                        MIN(cp.score) as min_score,
-                        MAX(cp.score) as max_score,
-                        COUNT(DISTINCT uta.user_id) as students_completed
-                    FROM user_task_attempts uta
-                    INNER JOIN comprehension_progress cp ON cp.attempt_id = uta.id AND cp.status = 'Completed'
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s AND uta.status = 'Completed'
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [reading_task_id])
-                
-                reading_result = cursor.fetchone()
-                if reading_result and reading_result['avg_score'] is not None:
-                    reading_stats = {
-                        'average_score': round(float(reading_result['avg_score']), 2),
-                        'min_score': int(reading_result['min_score']) if reading_result['min_score'] is not None else 0,
-                        'max_score': int(reading_result['max_score']) if reading_result['max_score'] is not None else 0,
-                        'students_attempted': students_attempted,
-                        'students_completed': int(reading_result['students_completed']) if reading_result['students_completed'] else 0
-                    }
-                else:
-                    reading_stats['students_attempted'] = students_attempted
-
-            # 4. Mathematical Comprehension Statistics
-            math_stats = {'average_score': 0, 'min_score': 0, 'max_score': 0, 'students_attempted': 0, 'students_completed': 0}
-            if 'Mathematical Comprehension' in task_map and student_ids:
-                math_task_id = task_map['Mathematical Comprehension']
-                # Count students who attempted (any attempt)
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT uta.user_id) as students_attempted
-                    FROM user_task_attempts uta
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [math_task_id])
-                attempted_result = cursor.fetchone()
-                students_attempted = int(attempted_result['students_attempted']) if attempted_result and attempted_result['students_attempted'] else 0
-                
-                # Get score statistics from completed attempts only
-                cursor.execute("""
-                    SELECT 
-                        AVG(mcp.score) as avg_score,
-                        MIN(mcp.score) as min_score,
-                        MAX(mcp.score) as max_score,
-                        COUNT(DISTINCT uta.user_id) as students_completed
-                    FROM user_task_attempts uta
-                    INNER JOIN mathematical_comprehension_progress mcp ON mcp.attempt_id = uta.id AND mcp.status = 'Completed'
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s AND uta.status = 'Completed'
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [math_task_id])
-                
-                math_result = cursor.fetchone()
-                if math_result and math_result['avg_score'] is not None:
-                    math_stats = {
-                        'average_score': round(float(math_result['avg_score']), 2),
-                        'min_score': int(math_result['min_score']) if math_result['min_score'] is not None else 0,
-                        'max_score': int(math_result['max_score']) if math_result['max_score'] is not None else 0,
-                        'students_attempted': students_attempted,
-                        'students_completed': int(math_result['students_completed']) if math_result['students_completed'] else 0
-                    }
-                else:
-                    math_stats['students_attempted'] = students_attempted
-
-            # 5. Aptitude Test Statistics
-            aptitude_stats = {'average_score': 0, 'min_score': 0, 'max_score': 0, 'students_attempted': 0, 'students_completed': 0}
-            if 'Aptitude Test' in task_map and student_ids:
-                aptitude_task_id = task_map['Aptitude Test']
-                # Count students who attempted (any attempt)
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT uta.user_id) as students_attempted
-                    FROM user_task_attempts uta
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [aptitude_task_id])
-                attempted_result = cursor.fetchone()
-                students_attempted = int(attempted_result['students_attempted']) if attempted_result and attempted_result['students_attempted'] else 0
-                
-                # Get score statistics from completed attempts only
-                cursor.execute("""
-                    SELECT 
-                        AVG(ap.total_score) as avg_score,
-                        MIN(ap.total_score) as min_score,
-                        MAX(ap.total_score) as max_score,
-                        COUNT(DISTINCT uta.user_id) as students_completed
-                    FROM user_task_attempts uta
-                    INNER JOIN aptitude_progress ap ON ap.attempt_id = uta.id AND ap.status = 'Completed'
-                    WHERE uta.user_id IN ({}) AND uta.task_id = %s AND uta.status = 'Completed'
-                """.format(','.join(['%s'] * len(student_ids))), student_ids + [aptitude_task_id])
-                
-                aptitude_result = cursor.fetchone()
-                if aptitude_result and aptitude_result['avg_score'] is not None:
-                    aptitude_stats = {
-                        'average_score': round(float(aptitude_result['avg_score']), 2),
-                        'min_score': int(aptitude_result['min_score']) if aptitude_result['min_score'] is not None else 0,
-                        'max_score': int(aptitude_result['max_score']) if aptitude_result['max_score'] is not None else 0,
-                        'students_attempted': students_attempted,
-                        'students_completed': int(aptitude_result['students_completed']) if aptitude_result['students_completed'] else 0
-                    }
-                else:
-                    aptitude_stats['students_attempted'] = students_attempted
-
-            class_statistics.append({
-                'class_id': class_id,
-                'class_name': class_name,
-                'academic_year': academic_year,
-                'total_students': total_students,
-                'total_tasks_completed': total_tasks_completed,
-                'students_attempted_all_tasks': students_attempted_all,
-                'students_completed_all_tasks': students_completed_all,
-                'reading_comprehension': reading_stats,
-                'mathematical_comprehension': math_stats,
-                'aptitude': aptitude_stats
-            })
+        # One read of the materialized per-class rows (kept current as attempts start/complete)
+        class_statistics = school_statistics(conn, school_id)
 
         return jsonify({
             'success': True,
@@ -6767,65 +6727,27 @@ def get_parent_statistics():
         cursor = conn.cursor(dictionary=True)
         parent_id = session['user_id']
 
-        # Get parent's children
-        cursor.execute('''
-            SELECT 
-                u.id, u.name, u.email, u.class, u.is_active,
-                d.age, d.gender, d.dyslexia_status, d.education_level,
-                s.name as school_name
-            FROM users u
-            LEFT JOIN demographics d ON u.id = d.user_id
-            LEFT JOIN schools s ON u.school_id = s.id
-            WHERE u.parent_id = %s AND u.user_type = 'child'
-            ORDER BY u.name
-        ''', (parent_id,))
-        children = cursor.fetchall()
+        # Get parent's children and all their task rows (two queries in total)
+        children = load_children(cursor, [{'id': parent_id}])[parent_id]
+        progress_by_child = load_task_progress(cursor, [child['id'] for child in children])
 
         # Get detailed statistics for each child
         children_stats = []
         for child in children:
             child_id = child['id']
-            
-            # Get task progress for this child
-            cursor.execute('''
-                SELECT 
-                    ut.task_name,
-                    ut.status,
-                    ut.updated_at,
-                    CASE 
-                        WHEN ut.status = 'Completed' THEN 100
-                        WHEN ut.status = 'In Progress' THEN 50
-                        ELSE 0
-                    END as progress_percentage
-                FROM user_tasks ut
-                WHERE ut.user_id = %s
-                ORDER BY ut.task_name
-            ''', (child_id,))
-            task_progress = cursor.fetchall()
+            task_progress = progress_by_child[child_id]
 
             # Calculate overall progress
             total_tasks = len(task_progress)
             completed_tasks = len([t for t in task_progress if t['status'] == 'Completed'])
             overall_progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
 
-            # Get recent activity for this child
-            cursor.execute('''
-                SELECT 
-                    ut.task_name,
-                    ut.status,
-                    ut.updated_at
-                FROM user_tasks ut
-                WHERE ut.user_id = %s
-                ORDER BY ut.updated_at DESC
-                LIMIT 5
-            ''', (child_id,))
-            recent_activity = cursor.fetchall()
-
             children_stats.append({
-                'child_info': child,
+                'child_info': pick(child, ['id', 'name', 'email', 'class', 'is_active', 'age', 'gender',
+                                           'dyslexia_status', 'education_level', 'school_name']),
                 'task_progress': task_progress,
                 'overall_progress': round(overall_progress, 1),
-                'recent_activity': recent_activity
+                'recent_activity': recent_task_activity(task_progress)
             })
 
         cursor.close()
@@ -7148,59 +7070,20 @@ def save_mathematical_comprehension_progress():
     
     try:
         conn = connect_db()
-        cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
-        # Get or create task attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row['id']
-            attempt_number = attempt_row['attempt_number']
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-                FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            next_attempt = cursor.fetchone()['next_attempt']
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, 'In Progress', NOW())
-            """, (session['user_id'], task_id, next_attempt))
-            attempt_id = cursor.lastrowid
-            attempt_number = next_attempt
-        
-        # Save progress
-        cursor.execute('''
-            INSERT INTO mathematical_comprehension_progress (attempt_id, q1, q2, q3, status, updated_at)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE q1=VALUES(q1), q2=VALUES(q2), q3=VALUES(q3), status=VALUES(status), updated_at=NOW()
-        ''', (attempt_id, q1, q2, q3, 'In Progress'))
-        
-        # Mark user_tasks as In Progress
-        cursor.execute('''
-            INSERT INTO user_tasks (user_id, task_name, status)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
-        ''', (session['user_id'], task_name, 'In Progress'))
+        # Get or create task attempt (committed now so the buffered write can find it)
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
+        if conn.in_transaction:
+            conn.commit()
         
-        conn.commit()
-        cursor.close()
+        # Queue progress; the buffer writes it and marks user_tasks In Progress
+        progress_buffer.put('mathematical_comprehension_progress', attempt_id, {'q1': q1, 'q2': q2, 'q3': q3, 'status': 'In Progress'},
+                            session['user_id'], task_id, task_name, conn=conn)
         conn.close()
         return jsonify({'success': True, 'message': 'Progress saved successfully', 'attempt_id': attempt_id, 'attempt_number': attempt_number})
     except Exception as e:
@@ -7219,12 +7102,12 @@ def get_mathematical_comprehension_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
+        # Write out spooled autosaves (from any worker) first so the read sees them
+        progress_buffer.flush(user_id=session['user_id'], task_id=task_id, conn=conn)
         
         # Get the latest IN PROGRESS attempt and its progress (not completed ones)
         # Order by progress updated_at to get the most recent saved progress
@@ -7285,39 +7168,16 @@ def submit_mathematical_comprehension():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id from tasks table
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get or create task attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
+        attempt_id, attempt_number = resolve_active_attempt(conn, session['user_id'], task_id)
         
-        attempt_row = cursor.fetchone()
-        if attempt_row:
-            attempt_id = attempt_row['id']
-            attempt_number = attempt_row['attempt_number']
-        else:
-            # Create new attempt
-            cursor.execute("""
-                SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-                FROM user_task_attempts 
-                WHERE user_id = %s AND task_id = %s
-            """, (session['user_id'], task_id))
-            next_attempt = cursor.fetchone()['next_attempt']
-            
-            cursor.execute("""
-                INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-                VALUES (%s, %s, %s, 'In Progress', NOW())
-            """, (session['user_id'], task_id, next_attempt))
-            attempt_id = cursor.lastrowid
-            attempt_number = next_attempt
+        # Flush buffered autosaves, then mark attempt as completed before writing the final state
+        progress_buffer.flush(attempt_id=attempt_id, conn=conn)
+        attempt_id, attempt_number = complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)
         
         # Calculate score by comparing answers with correct answers
         score = 0
@@ -7374,13 +7234,6 @@ def submit_mathematical_comprehension():
             ON DUPLICATE KEY UPDATE q1=VALUES(q1), q2=VALUES(q2), q3=VALUES(q3), status=VALUES(status), score=VALUES(score), max_score=VALUES(max_score), updated_at=NOW()
         ''', (attempt_id, q1, q2, q3, 'Completed', score, max_score))
         
-        # Mark attempt as completed
-        cursor.execute("""
-            UPDATE user_task_attempts 
-            SET status = 'Completed', completed_at = NOW()
-            WHERE id = %s
-        """, (attempt_id,))
-        
         # Mark user_tasks as Completed
         cursor.execute('''
             INSERT INTO user_tasks (user_id, task_name, status)
@@ -7804,27 +7657,12 @@ def retake_mathematical_comprehension():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
-        # Get next attempt number
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-            FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        next_attempt = cursor.fetchone()['next_attempt']
-        
         # Create new attempt
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, 'In Progress', NOW())
-        """, (session['user_id'], task_id, next_attempt))
-        attempt_id = cursor.lastrowid
+        attempt_id, next_attempt = start_new_attempt(conn, session['user_id'], task_id)
         
         # Mark user_tasks as In Progress
         cursor.execute('''
@@ -7861,27 +7699,12 @@ def retake_writing():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
-        # Get next attempt number
-        cursor.execute("""
-            SELECT COALESCE(MAX(attempt_number), 0) + 1 as next_attempt
-            FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s
-        """, (session['user_id'], task_id))
-        next_attempt = cursor.fetchone()['next_attempt']
-        
         # Create new attempt
-        cursor.execute("""
-            INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
-            VALUES (%s, %s, %s, 'In Progress', NOW())
-        """, (session['user_id'], task_id, next_attempt))
-        attempt_id = cursor.lastrowid
+        attempt_id, next_attempt = start_new_attempt(conn, session['user_id'], task_id)
         
         # Mark user_tasks as In Progress
         cursor.execute('''
@@ -7919,26 +7742,22 @@ def submit_saved_writing():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get the latest IN PROGRESS attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if not attempt_row:
+        active_attempt = find_active_attempt(conn, session['user_id'], task_id)
+        if not active_attempt:
             return jsonify({'success': False, 'message': 'No saved progress found'}), 404
         
-        attempt_id = attempt_row['id']
-        attempt_number = attempt_row['attempt_number']
+        attempt_id, attempt_number = active_attempt
+        
+        # Mark attempt as completed; the saved sample belongs to this attempt, so a
+        # stale one (already submitted elsewhere) is not swapped for a new, empty attempt
+        if complete_attempt(conn, session['user_id'], task_id, attempt_id, attempt_number)[0] != attempt_id:
+            conn.rollback()
+            return jsonify({'success': False, 'message': 'No saved progress found'}), 404
         
         # Update the writing sample status to completed
         cursor.execute("""
@@ -7947,13 +7766,6 @@ def submit_saved_writing():
             WHERE attempt_id = %s
         """, (attempt_id,))
         
-        # Mark attempt as completed
-        cursor.execute("""
-            UPDATE user_task_attempts 
-            SET status = 'Completed', completed_at = NOW()
-            WHERE id = %s
-        """, (attempt_id,))
-        
         # Mark user_tasks as Completed
         cursor.execute("""
             INSERT INTO user_tasks (user_id, task_name, status)
@@ -7989,26 +7801,16 @@ def save_existing_writing_progress():
         cursor = conn.cursor(dictionary=True)
         
         # Get task_id
-        cursor.execute("SELECT id FROM tasks WHERE task_name = %s", (task_name,))
-        task_row = cursor.fetchone()
-        if not task_row:
+        task_id = task_catalog.task_id(task_name)
+        if not task_id:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        task_id = task_row['id']
-        
         # Get the latest IN PROGRESS attempt
-        cursor.execute("""
-            SELECT id, attempt_number FROM user_task_attempts 
-            WHERE user_id = %s AND task_id = %s AND status = 'In Progress'
-            ORDER BY attempt_number DESC LIMIT 1
-        """, (session['user_id'], task_id))
-        
-        attempt_row = cursor.fetchone()
-        if not attempt_row:
+        active_attempt = find_active_attempt(conn, session['user_id'], task_id)
+        if not active_attempt:
             return jsonify({'success': False, 'message': 'No saved progress found'}), 404
         
-        attempt_id = attempt_row['id']
-        attempt_number = attempt_row['attempt_number']
+        attempt_id, attempt_number = active_attempt
         
         # Update the writing sample uploaded_at timestamp (essentially a no-op but updates timestamp)
         cursor.execute("""
@@ -8038,5 +7840,206 @@ def save_existing_writing_progress():
         print(f"Error saving existing writing progress: {e}")
         return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
 
+@app.cli.command('pack-keystrokes')
+def pack_keystrokes_command():
+    """Convert stored typing keystroke JSON into the compact encoding."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        ensure_keystroke_schema(conn)
+        converted, before, after = pack_legacy_rows(conn)
+        ratio = f"{before / after:.1f}x" if after else "n/a"
+        print(f"Packed {converted} keystroke logs: {before} -> {after} bytes ({ratio})")
+    finally:
+        conn.close()
+
+@app.cli.command('typing-features')
+def typing_features_command():
+    """Recompute typing-dynamics features for every stored keystroke log."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        ensure_typing_features_table(conn)
+        processed, skipped = refresh_all_typing_features(conn)
+        print(f"Typing features computed for {processed} attempts ({skipped} without usable keystrokes)")
+    finally:
+        conn.close()
+
+@app.cli.command('rebuild-class-stats')
+@click.option('--school-id', type=int, default=None, help='Only rebuild this school\'s classes.')
+def rebuild_class_stats_command(school_id):
+    """Recompute the materialized class statistics to reconcile drift."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        ensure_class_statistics_schema(conn)
+        count = rebuild_class_stats(conn, school_id)
+        print(f"Rebuilt statistics for {count} classes")
+    finally:
+        conn.close()
+
+@app.cli.command('db-migrate')
+@click.option('--status', is_flag=True, help='Only list pending migrations.')
+def db_migrate_command(status):
+    """Apply pending schema migrations (see migrations.py)."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        if status:
+            waiting = pending_migrations(conn)
+            for version, name, _ in waiting:
+                print(f"Pending {version}: {name}")
+            print(f"{len(waiting)} pending migrations")
+            return
+        applied = run_migrations(conn)
+        print(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+    finally:
+        conn.close()
+
+@app.cli.command('explain-check')
+def explain_check_command():
+    """EXPLAIN the hot queries and fail if any of them scans a whole table."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        raise SystemExit(1)
+    try:
+        problems = explain_hot_queries(conn)
+    finally:
+        conn.close()
+    for name, table, plan in problems:
+        print(f"❌ {name}: full scan of {table} (rows={plan.get('rows')}, possible_keys={plan.get('possible_keys')})")
+    if problems:
+        raise SystemExit(1)
+    print(f"✅ {len(HOT_QUERIES)} hot queries use indexes")
+
+@app.cli.command('purge-audio-uploads')
+@click.option('--hours', type=int, default=48, help='Remove unfinished uploads older than this.')
+def purge_audio_uploads_command(hours):
+    """Delete abandoned resumable audio uploads and their partial files."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        count = audio_uploads.purge_stale(conn, UPLOAD_FOLDER, hours)
+        print(f"Removed {count} abandoned audio uploads")
+    finally:
+        conn.close()
+
+@app.cli.command('migrate-uploads')
+@click.option('--keep', is_flag=True, help='Leave the original files in the flat uploads folder.')
+def migrate_uploads_command(keep):
+    """Move files from the flat uploads folder into the content-addressed store."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        ensure_upload_files_schema(conn)
+        files, total, saved = upload_storage.migrate_flat_folder(conn, delete=not keep)
+        print(f"Migrated {files} files ({total} bytes, {saved} bytes saved by deduplication)")
+    finally:
+        conn.close()
+
+WORKER_QUEUES = {
+    'audio': (audio_jobs.QUEUE, lambda conn, job: audio_jobs.process(conn, upload_storage, job)),
+    'images': (image_renditions.QUEUE, lambda conn, job: image_renditions.process(conn, upload_storage, job)),
+    'imports': (import_jobs.QUEUE, lambda conn, job: import_jobs.process(conn, job, on_moved_parents=class_levels.invalidate)),
+}
+
+@app.cli.command('worker')
+@click.option('--once', is_flag=True, help='Exit when no job is due instead of polling.')
+@click.option('--poll', type=float, default=5.0, help='Seconds to wait when the queues are empty.')
+@click.option('--queue', 'queues', type=click.Choice(sorted(WORKER_QUEUES)), multiple=True, help='Only process these queues.')
+@click.option('--backfill', is_flag=True, help='First queue recordings and writing samples that were never processed.')
+def worker_command(once, poll, queues, backfill):
+    """Process background jobs: audio measures and normalized WAVs, image renditions, student imports."""
+    queues = queues or sorted(WORKER_QUEUES)
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        audio_jobs.ensure_tables(conn)
+        image_renditions.ensure_tables(conn)
+        import_jobs.ensure_table(conn)
+        if backfill:
+            if 'audio' in queues:
+                print(f"Queued {audio_jobs.enqueue_missing(conn)} recordings")
+            if 'images' in queues:
+                print(f"Queued {image_renditions.enqueue_missing(conn)} writing samples")
+    finally:
+        conn.close()
+    done, failed = job_queue.run(connect_db, [WORKER_QUEUES[name] for name in queues], once=once, poll_interval=poll)
+    print(f"Processed {done} jobs, {failed} failed")
+
+@app.cli.command('jobs')
+def jobs_command():
+    """Print the background job backlog."""
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        for name, (queue, _) in sorted(WORKER_QUEUES.items()):
+            counts = ', '.join(f"{key}={value}" for key, value in queue.backlog(conn).items())
+            print(f"{name}: {counts}")
+    finally:
+        conn.close()
+
+@app.cli.command('export-study')
+@click.option('--format', 'fmt', type=click.Choice(sorted(study_export.FORMATS)), default='ndjson')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--school-id', default=None, help='Only this school\'s participants.')
+@click.option('--class-level', default=None, help='Only participants in this class (1-12).')
+@click.option('--since', default=None, help='Only attempts started on or after this date (YYYY-MM-DD).')
+@click.option('--until', default=None, help='Only attempts started on or before this date (YYYY-MM-DD).')
+@click.option('--output', '-o', default='-', help='File to write (default: standard output).')
+def export_study_command(fmt, compress, school_id, class_level, since, until, output):
+    """Export the study's research data as NDJSON or CSV (see study_export.py)."""
+    try:
+        filters = study_export.parse_filters(school_id, class_level, since, until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        written = 0
+        with click.open_file(output, 'wb') as fh:
+            for chunk in study_export.stream(conn, fmt, compress, **filters):
+                fh.write(chunk)
+                written += len(chunk)
+    finally:
+        conn.close()
+    if output != '-':
+        print(f"Wrote {written} bytes to {output}")
+
+@app.cli.command('snapshot')
+@click.option('--full', is_flag=True, help='Rebuild from scratch instead of appending newly completed attempts.')
+@click.option('--output', '-o', default=None, help='Snapshot directory (default: SNAPSHOT_FOLDER).')
+def snapshot_command(full, output):
+    """Write the columnar .npy snapshot of participants and completed attempts."""
+    folder = output or SNAPSHOT_FOLDER
+    conn = connect_db()
+    if not conn:
+        print("Database connection failed")
+        return
+    try:
+        participants, added, total = study_snapshot.build(conn, folder, full=full)
+        print(f"Snapshot in {folder}: {participants} participants, {total} attempts ({added} new)")
+    finally:
+        conn.close()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,166 @@
+from flask import g, session, has_request_context
+import mysql.connector
+
+from class_stats import mark_user_changed
+
+# Active attempt per (user, task) kept in the session so steady-state autosaves skip the lookup.
+# Attempts found or created during a request are only written to the session by
+# remember_committed_attempts once the request succeeded, so a rolled-back
+# attempt is never cached.
+SESSION_KEY = 'active_attempts'
+
+
+def _cache_key(user_id, task_id):
+    return f"{user_id}:{task_id}"
+
+
+def _cached(user_id, task_id):
+    if not has_request_context():
+        return None
+    key = _cache_key(user_id, task_id)
+    entry = g.get('pending_attempts', {}).get(key) or session.get(SESSION_KEY, {}).get(key)
+    return tuple(entry) if entry else None
+
+
+def _remember(user_id, task_id, attempt_id, attempt_number):
+    if not has_request_context():
+        return
+    g.setdefault('pending_attempts', {})[_cache_key(user_id, task_id)] = [attempt_id, attempt_number]
+
+
+def remember_committed_attempts(response):
+    """after_request hook: caches this request's attempts in the session if it succeeded (and so committed)."""
+    pending = g.pop('pending_attempts', None)
+    if pending and 200 <= response.status_code < 300:
+        cache = session.get(SESSION_KEY, {})
+        cache.update(pending)
+        session[SESSION_KEY] = cache
+        session.modified = True
+    return response
+
+
+def forget_active_attempt(user_id, task_id):
+    """Drops the cached active attempt for (user, task)."""
+    if not has_request_context():
+        return
+    g.get('pending_attempts', {}).pop(_cache_key(user_id, task_id), None)
+    cache = session.get(SESSION_KEY, {})
+    if cache.pop(_cache_key(user_id, task_id), None) is not None:
+        session[SESSION_KEY] = cache
+        session.modified = True
+
+
+def _load_attempts(cursor, user_id, task_id, locking=False):
+    """One query: the newest In Progress attempt and the next free attempt number."""
+    cursor.execute(f"""
+        SELECT id, attempt_number, status FROM user_task_attempts
+        WHERE user_id = %s AND task_id = %s
+        ORDER BY attempt_number DESC
+        {'LOCK IN SHARE MODE' if locking else ''}
+    """, (user_id, task_id))
+    rows = cursor.fetchall()
+    active = next(((row[0], row[1]) for row in rows if row[2] == 'In Progress'), None)
+    next_number = (rows[0][1] + 1) if rows else 1
+    return active, next_number
+
+
+def _insert_attempt(cursor, user_id, task_id, attempt_number):
+    cursor.execute("""
+        INSERT INTO user_task_attempts (user_id, task_id, attempt_number, status, started_at)
+        VALUES (%s, %s, %s, 'In Progress', NOW())
+    """, (user_id, task_id, attempt_number))
+    mark_user_changed(user_id)
+    return cursor.lastrowid
+
+
+def _is_duplicate(err):
+    return isinstance(err, mysql.connector.IntegrityError) and err.errno == 1062
+
+
+def find_active_attempt(conn, user_id, task_id):
+    """Returns (attempt_id, attempt_number) of the In Progress attempt, or None."""
+    cached = _cached(user_id, task_id)
+    if cached:
+        return cached
+    cursor = conn.cursor()
+    try:
+        active, _ = _load_attempts(cursor, user_id, task_id)
+    finally:
+        cursor.close()
+    if active:
+        _remember(user_id, task_id, *active)
+    return active
+
+
+def resolve_active_attempt(conn, user_id, task_id):
+    """Returns (attempt_id, attempt_number) of the In Progress attempt, creating it if needed.
+
+    A concurrent request creating the same attempt trips the unique_attempt key;
+    in that case the winner's row is re-read with a locking read and reused.
+    """
+    cached = _cached(user_id, task_id)
+    if cached:
+        return cached
+    cursor = conn.cursor()
+    try:
+        active, next_number = _load_attempts(cursor, user_id, task_id)
+        if not active:
+            try:
+                active = (_insert_attempt(cursor, user_id, task_id, next_number), next_number)
+            except mysql.connector.Error as err:
+                if not _is_duplicate(err):
+                    raise
+                active, next_number = _load_attempts(cursor, user_id, task_id, locking=True)
+                if not active:
+                    active = (_insert_attempt(cursor, user_id, task_id, next_number), next_number)
+    finally:
+        cursor.close()
+    _remember(user_id, task_id, *active)
+    return active
+
+
+def start_new_attempt(conn, user_id, task_id):
+    """Creates a fresh In Progress attempt (retakes) and makes it the active one."""
+    cursor = conn.cursor()
+    try:
+        for locking in (False, True):
+            _, next_number = _load_attempts(cursor, user_id, task_id, locking=locking)
+            try:
+                attempt_id = _insert_attempt(cursor, user_id, task_id, next_number)
+                break
+            except mysql.connector.Error as err:
+                if locking or not _is_duplicate(err):
+                    raise
+    finally:
+        cursor.close()
+    _remember(user_id, task_id, attempt_id, next_number)
+    return attempt_id, next_number
+
+
+def complete_attempt(conn, user_id, task_id, attempt_id, attempt_number):
+    """Marks the attempt Completed and drops it from the active-attempt cache.
+
+    Returns the (attempt_id, attempt_number) actually completed. If the given
+    attempt is no longer In Progress (a stale cache entry: completed on another
+    device, or deleted), it is left alone and the user's current attempt is
+    resolved and completed instead, so callers must use the returned ids.
+    """
+    cursor = conn.cursor()
+    try:
+        for _ in range(2):
+            cursor.execute("""
+                UPDATE user_task_attempts
+                SET status = 'Completed', completed_at = NOW()
+                WHERE id = %s AND status = 'In Progress'
+            """, (attempt_id,))
+            forget_active_attempt(user_id, task_id)
+            if cursor.rowcount:
+                break
+            attempt_id, attempt_number = resolve_active_attempt(conn, user_id, task_id)
+        else:
+            raise RuntimeError(f"attempt {attempt_id} could not be completed")
+    finally:
+        cursor.close()
+    forget_active_attempt(user_id, task_id)
+    mark_user_changed(user_id)
+    return attempt_id, attempt_number
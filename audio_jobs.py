@@ -0,0 +1,254 @@
+import json
+import os
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+from job_queue import JobQueue
+
+# Background post-processing of Reading Aloud recordings.
+#
+# Saving an audio_recordings row also inserts a pending audio_jobs row in the
+# same transaction, which is all the upload request pays for. The worker
+# (`flask worker`, see job_queue.py) decodes the recording to 16 kHz
+# mono PCM (ffmpeg for webm/ogg/mp3/m4a, the wave module for PCM WAV), stores a
+# normalized WAV next to it and writes loudness and speech measures to
+# audio_features.
+
+SAMPLE_RATE = 16000
+FRAME_MS = 20              # analysis frame
+ENVELOPE_MS = 100          # resolution of the stored RMS envelope
+SILENCE_FLOOR_DBFS = -45.0  # frames quieter than this are always silence
+DYNAMIC_RANGE_DB = 30.0    # ...and so are frames this far below the loud (95th percentile) level
+MIN_GAP_MS = 200           # shorter pauses do not split a speech segment
+MIN_SEGMENT_MS = 100       # shorter voiced runs are treated as noise
+
+FFMPEG = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS audio_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        recording_id INT NOT NULL UNIQUE,
+        filename VARCHAR(255) NOT NULL,
+        status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        last_error TEXT NULL,
+        available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        locked_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP NULL,
+        INDEX idx_audio_jobs_status_available (status, available_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+FEATURES_DDL = """
+    CREATE TABLE IF NOT EXISTS audio_features (
+        recording_id INT PRIMARY KEY,
+        duration_ms INT NOT NULL,
+        normalized_filename VARCHAR(255) NULL,
+        rms_dbfs FLOAT,
+        peak_dbfs FLOAT,
+        silence_ratio FLOAT,
+        speech_segment_count INT NOT NULL,
+        speech_ms INT NOT NULL,
+        rms_envelope MEDIUMTEXT,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+COLUMNS = [
+    'duration_ms', 'normalized_filename', 'rms_dbfs', 'peak_dbfs', 'silence_ratio',
+    'speech_segment_count', 'speech_ms', 'rms_envelope',
+]
+
+UPSERT_SQL = f"""
+    INSERT INTO audio_features (recording_id, {', '.join(COLUMNS)})
+    VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})
+    ON DUPLICATE KEY UPDATE {', '.join(f'{col}=VALUES({col})' for col in COLUMNS)}
+"""
+
+
+QUEUE = JobQueue('audio_jobs', ['recording_id', 'filename'])
+
+
+class DecodeError(Exception):
+    """ffmpeg ran and rejected the file; retrying will not help."""
+
+
+class FfmpegError(Exception):
+    """ffmpeg could not be run or timed out (missing, not executable, overloaded); the job is retried."""
+
+
+def ensure_tables(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(JOBS_DDL)
+        cursor.execute(FEATURES_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def enqueue(cursor, recording_id, filename):
+    """Queues a recording for processing (the caller commits with the audio_recordings row)."""
+    cursor.execute("""
+        INSERT INTO audio_jobs (recording_id, filename) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE filename = VALUES(filename), status = 'pending', attempts = 0, available_at = NOW()
+    """, (recording_id, filename))
+
+
+def enqueue_missing(conn):
+    """Queues every recording that has never had a job; returns the count."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT IGNORE INTO audio_jobs (recording_id, filename)
+            SELECT ar.id, ar.filename FROM audio_recordings ar
+            LEFT JOIN audio_jobs j ON j.recording_id = ar.id
+            WHERE j.id IS NULL
+        """)
+        count = cursor.rowcount
+        conn.commit()
+    finally:
+        cursor.close()
+    return count
+
+
+def decode(path):
+    """Returns the recording as 16 kHz mono int16 samples."""
+    with open(path, 'rb') as fh:
+        header = fh.read(12)
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        samples = _decode_wav(path)
+        if samples is not None:
+            return samples
+    try:
+        result = subprocess.run(
+            [FFMPEG, '-nostdin', '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=300, check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise FfmpegError(f"ffmpeg failed: {e}") from e
+    if result.returncode != 0:
+        raise DecodeError(result.stderr.decode('utf-8', 'replace').strip()[-500:] or 'ffmpeg failed')
+    return np.frombuffer(result.stdout, dtype='<i2')
+
+
+def _decode_wav(path):
+    """Reads 16-bit PCM WAV at any rate and channel count; None for other encodings."""
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            return None
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples[:samples.size - samples.size % channels].reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and samples.size:
+        # Linear resampling is plenty for loudness and segment measures
+        positions = np.arange(int(samples.size * SAMPLE_RATE / rate)) * (rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(samples.size), samples)
+    return np.asarray(samples).round().astype('<i2')
+
+
+def write_wav(path, samples):
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.astype('<i2').tobytes())
+
+
+def _dbfs(rms):
+    return 20 * np.log10(np.maximum(rms, 1e-9))
+
+
+def _round(value, digits=2):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def _frame_rms(x, frame):
+    usable = x.size - x.size % frame
+    if not usable:
+        return np.zeros(0)
+    return np.sqrt(np.mean(np.square(x[:usable].reshape(-1, frame)), axis=1))
+
+
+def analyze(samples):
+    """Computes the audio_features dict for 16 kHz mono int16 samples."""
+    x = samples.astype(np.float32) / 32768.0
+    duration_ms = int(x.size * 1000 / SAMPLE_RATE)
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    db = _dbfs(_frame_rms(x, frame))
+    if not db.size:
+        return {
+            'duration_ms': duration_ms, 'rms_dbfs': None, 'peak_dbfs': None, 'silence_ratio': None,
+            'speech_segment_count': 0, 'speech_ms': 0, 'rms_envelope': json.dumps({'step_ms': ENVELOPE_MS, 'dbfs': []}),
+        }
+
+    threshold = max(SILENCE_FLOOR_DBFS, float(np.percentile(db, 95)) - DYNAMIC_RANGE_DB)
+    voiced = db >= threshold
+
+    # Runs of voiced frames; gaps shorter than MIN_GAP_MS are bridged, then short runs dropped
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if starts.size:
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] >= MIN_GAP_MS // FRAME_MS))
+        starts = starts[keep]
+        ends = np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+        lengths = ends - starts
+        lengths = lengths[lengths >= MIN_SEGMENT_MS // FRAME_MS]
+    else:
+        lengths = np.zeros(0, dtype=np.int64)
+
+    envelope = _dbfs(_frame_rms(x, SAMPLE_RATE * ENVELOPE_MS // 1000))
+    return {
+        'duration_ms': duration_ms,
+        'rms_dbfs': _round(_dbfs(np.sqrt(np.mean(np.square(x))))),
+        'peak_dbfs': _round(_dbfs(np.max(np.abs(x)))),
+        'silence_ratio': _round(1.0 - voiced.mean(), 4),
+        'speech_segment_count': int(lengths.size),
+        'speech_ms': int(lengths.sum() * FRAME_MS),
+        'rms_envelope': json.dumps({'step_ms': ENVELOPE_MS, 'dbfs': [round(float(v), 1) for v in envelope]}),
+    }
+
+
+def normalized_name(filename):
+    return f"{os.path.splitext(filename)[0]}_16k.wav"
+
+
+def process(conn, storage, job):
+    """Analyzes one claimed job and records the result or the failure."""
+    cursor = conn.cursor()
+    try:
+        try:
+            located = storage.locate(conn, job['filename'])
+            if not located:
+                raise FileNotFoundError(f"file {job['filename']!r} not found")
+            samples = decode(located[0])
+            features = analyze(samples)
+
+            features['normalized_filename'] = normalized_name(job['filename'])
+            fd, tmp_path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
+            try:
+                write_wav(tmp_path, samples)
+                storage.save_file(cursor, features['normalized_filename'], tmp_path, located[3])
+            finally:
+                os.remove(tmp_path)
+
+            cursor.execute(UPSERT_SQL, [job['recording_id']] + [features[col] for col in COLUMNS])
+            QUEUE.done(cursor, job)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Audio job {job['id']} (recording {job['recording_id']}) error: {e}")
+            # Retrying will not make a missing or undecodable file readable; FfmpegError (no binary, timeout) is retried
+            QUEUE.failed(cursor, job, e, retry=not isinstance(e, (DecodeError, FileNotFoundError)))
+            conn.commit()
+            return False
+    finally:
+        cursor.close()
+
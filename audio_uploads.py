@@ -0,0 +1,198 @@
+import os
+import secrets
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers: appends are not locked
+    fcntl = None
+
+# Resumable, chunked audio uploads for Reading Aloud.
+#
+# A client opens an upload (create), sends the recording in chunks with
+# PUT ?offset=N (append), asks for the current offset after a failure
+# (the status endpoint) and resumes from there, then finalizes. Chunks are
+# streamed from the request body straight into UPLOAD_FOLDER/partial/<id>.part,
+# so neither Werkzeug nor the app holds a whole recording in memory. The
+# audio_uploads row tracks ownership and is locked during finalize so the
+# audio_recordings row and attempt completion happen exactly once. Finalize
+# first seals the partial file (renames it under the append lock), so a late
+# or retried chunk can no longer change bytes that are being hashed into the
+# content-addressed store.
+
+TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS audio_uploads (
+        id CHAR(32) PRIMARY KEY,
+        user_id INT NOT NULL,
+        task_name VARCHAR(255) NOT NULL,
+        is_retake BOOLEAN NOT NULL DEFAULT FALSE,
+        original_name VARCHAR(255) NOT NULL,
+        total_bytes BIGINT NULL,
+        status ENUM('open', 'finalized') NOT NULL DEFAULT 'open',
+        filename VARCHAR(255) NULL,
+        attempt_id INT NULL,
+        attempt_number INT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finalized_at TIMESTAMP NULL,
+        INDEX idx_audio_uploads_user (user_id),
+        INDEX idx_audio_uploads_status_created (status, created_at),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+PARTIAL_DIR = 'partial'
+COPY_BUFFER = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+    """The chunk's offset is not where the stored file ends; `received` is the current size."""
+
+    def __init__(self, received):
+        super().__init__(f"expected offset {received}")
+        self.received = received
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadSealed(Exception):
+    """The upload is being finalized; no more chunks are accepted."""
+
+
+def ensure_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def new_upload_id():
+    return secrets.token_hex(16)
+
+
+def part_path(upload_folder, upload_id):
+    return os.path.join(upload_folder, PARTIAL_DIR, f"{upload_id}.part")
+
+
+def sealed_path(upload_folder, upload_id):
+    return os.path.join(upload_folder, PARTIAL_DIR, f"{upload_id}.sealed")
+
+
+def received_bytes(upload_folder, upload_id):
+    for path in (part_path(upload_folder, upload_id), sealed_path(upload_folder, upload_id)):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            pass
+    return 0
+
+
+def start(upload_folder, upload_id):
+    """Creates the empty partial file."""
+    path = part_path(upload_folder, upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def append(upload_folder, upload_id, offset, stream, max_chunk, max_total):
+    """Streams one chunk from `stream` onto the partial file at `offset`; returns the new size.
+
+    A chunk at an offset below the current size overwrites from there (a resend
+    after a lost response); any other mismatch raises OffsetMismatch.
+    """
+    path = part_path(upload_folder, upload_id)
+    try:
+        fh = open(path, 'r+b')
+    except FileNotFoundError:
+        if os.path.exists(sealed_path(upload_folder, upload_id)):
+            raise UploadSealed()
+        raise
+    with fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        # seal() may have renamed the file while this request waited for the lock
+        try:
+            current = os.stat(path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(fh.fileno()).st_ino:
+            raise UploadSealed()
+        size = os.fstat(fh.fileno()).st_size
+        if offset > size or offset < 0:
+            raise OffsetMismatch(size)
+        fh.seek(offset)
+        written = 0
+        while True:
+            block = stream.read(COPY_BUFFER)
+            if not block:
+                break
+            written += len(block)
+            if written > max_chunk or offset + written > max_total:
+                # Drop this chunk; the client asks for the offset and resends a smaller one
+                fh.truncate(offset)
+                raise UploadTooLarge()
+            fh.write(block)
+        end = offset + written
+        if end < size:
+            # A shorter resend replaces the tail
+            fh.truncate(end)
+        fh.flush()
+        os.fsync(fh.fileno())
+        return end
+
+
+def seal(upload_folder, upload_id):
+    """Stops further appends and returns the path of the finished file (idempotent).
+
+    The partial file is renamed while holding the append lock, so no chunk is
+    being written to it and none can be written afterwards.
+    """
+    path = part_path(upload_folder, upload_id)
+    sealed = sealed_path(upload_folder, upload_id)
+    try:
+        fh = open(path, 'rb')
+    except FileNotFoundError:
+        if os.path.exists(sealed):
+            return sealed
+        raise
+    with fh:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        os.replace(path, sealed)
+    return sealed
+
+
+def unseal(upload_folder, upload_id):
+    """Accepts chunks again after a finalize that found the upload incomplete."""
+    try:
+        os.replace(sealed_path(upload_folder, upload_id), part_path(upload_folder, upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def discard(upload_folder, upload_id):
+    for path in (part_path(upload_folder, upload_id), sealed_path(upload_folder, upload_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def purge_stale(conn, upload_folder, max_age_hours):
+    """Deletes open uploads (and their partial files) older than max_age_hours; returns the count."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id FROM audio_uploads
+            WHERE status = 'open' AND created_at < NOW() - INTERVAL %s HOUR
+        """, (max_age_hours,))
+        stale = [row[0] for row in cursor.fetchall()]
+        for upload_id in stale:
+            discard(upload_folder, upload_id)
+            cursor.execute("DELETE FROM audio_uploads WHERE id = %s AND status = 'open'", (upload_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+    return len(stale)
@@ -0,0 +1,270 @@
+import atexit
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows development servers: a single process, the thread lock suffices
+    fcntl = None
+
+# Seconds after which a spool temp file left by a crashed write is removed
+STALE_TMP_SECONDS = 60
+
+
+class ProgressBuffer:
+    """Write-behind buffer for task autosaves.
+
+    Autosaves are coalesced per (table, attempt) - only the latest state of an
+    attempt is kept - in a spool directory shared by every worker process on
+    the host, one file per attempt, and a background thread writes them out in
+    multi-row upserts every `interval` seconds, together with the matching
+    user_tasks 'In Progress' marks. Since the spool is shared, the flush a
+    read or submit does first picks up autosaves any worker received, and
+    queued autosaves survive a restart.
+
+    Rows are only written for attempts that are still In Progress, so a late
+    flush can never overwrite a submitted attempt (submit handlers update the
+    attempt row before writing their final state, which keeps lock order the
+    same as the flusher's).
+
+    on_status_change(conn, user_ids), if given, is called after a write has
+    committed with the users whose user_tasks row it set to 'In Progress'; the
+    hook commits its own work.
+    """
+
+    def __init__(self, connect, spool_dir, interval=2.0, batch_size=200, max_pending=2000, enabled=True,
+                 on_status_change=None):
+        self._connect = connect
+        self._on_status_change = on_status_change
+        self.spool_dir = spool_dir
+        self.interval = float(interval)
+        self.batch_size = int(batch_size)
+        self.max_pending = int(max_pending)
+        self.enabled = enabled
+        self._tables = {}
+        self._keep_null = {}
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread_pid = None
+        self._flushed_rows = 0
+        self._flush_errors = 0
+        self._last_flush_ms = 0.0
+        if enabled:
+            os.makedirs(spool_dir, exist_ok=True)
+        atexit.register(self.flush)
+
+    def register(self, table, columns, keep_null=()):
+        """Declares a progress table (keyed by attempt_id) and the columns autosaves write.
+
+        Columns in keep_null keep their stored value when an autosave leaves them out.
+        """
+        self._tables[table] = list(columns)
+        self._keep_null[table] = set(keep_null)
+
+    def put(self, table, attempt_id, values, user_id, task_id, task_name, conn=None):
+        """Queues the latest autosave state of an attempt.
+
+        conn, the caller's connection, is used (and committed) when the
+        autosave has to be written right away.
+        """
+        row = [values.get(col) for col in self._tables[table]]
+        entry = (user_id, task_id, task_name, row)
+        if not self.enabled:
+            self._write({(table, attempt_id): entry}, conn)
+            return
+        path = os.path.join(self.spool_dir, f'{table}.{attempt_id}.{user_id}.{task_id}.pending')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(entry, fh)
+        os.replace(tmp_path, path)
+        self._ensure_thread()
+        if self._pending_count() >= self.max_pending:
+            self.flush(conn=conn)
+
+    def flush(self, attempt_id=None, user_id=None, task_id=None, conn=None):
+        """Writes spooled autosaves now; optionally only those matching the filters.
+
+        Pass the request's connection as conn to write (and commit) on it
+        instead of checking out another one. Failures are logged and the
+        entries stay spooled for the next flush.
+        """
+        if not self.enabled:
+            return
+        with self._spool_lock():
+            self._recover()
+            taken = {}
+            for name in os.listdir(self.spool_dir):
+                if not name.endswith('.pending'):
+                    continue
+                table, key_attempt, key_user, key_task, _ = name.split('.')
+                if (attempt_id is not None and key_attempt != str(attempt_id)) \
+                        or (user_id is not None and key_user != str(user_id)) \
+                        or (task_id is not None and key_task != str(task_id)):
+                    continue
+                path = os.path.join(self.spool_dir, name)
+                # Claimed under a new name: an autosave arriving meanwhile starts a fresh file
+                claimed = f'{path}.flushing'
+                try:
+                    os.rename(path, claimed)
+                    with open(claimed, 'rb') as fh:
+                        entry = pickle.load(fh)
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    print(f"Autosave spool error: {name}: {e}")
+                    os.remove(claimed)
+                    continue
+                taken[(table, int(key_attempt))] = (entry, claimed)
+            if not taken:
+                return
+            try:
+                self._write({key: entry for key, (entry, _) in taken.items()}, conn)
+            except Exception as e:
+                self._flush_errors += 1
+                print(f"Autosave flush error: {e}")
+                self._recover()
+                return
+            for _, claimed in taken.values():
+                os.remove(claimed)
+
+    @contextmanager
+    def _spool_lock(self):
+        # One flush at a time per host: threads queue on the lock, processes on the flock
+        with self._flush_lock:
+            if not fcntl:
+                yield
+                return
+            with open(os.path.join(self.spool_dir, '.lock'), 'a') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                yield
+
+    def _recover(self):
+        """Puts claimed entries of a failed (or killed) flush back, unless a newer autosave replaced them."""
+        now = time.time()
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if name.endswith('.flushing'):
+                    try:
+                        os.link(path, path[:-len('.flushing')])
+                    except FileExistsError:
+                        pass
+                    os.remove(path)
+                elif name.endswith('.tmp') and now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _pending_count(self):
+        return sum(1 for name in os.listdir(self.spool_dir) if name.endswith('.pending'))
+
+    def _write(self, entries, conn=None):
+        started = time.monotonic()
+        by_table = {}
+        for (table, attempt_id), entry in entries.items():
+            by_table.setdefault(table, []).append((attempt_id, entry))
+        own = conn is None
+        if own:
+            conn = self._connect()
+            if not conn:
+                raise RuntimeError("Database connection failed")
+        changed = set()
+        cursor = conn.cursor()
+        try:
+            try:
+                for table, items in by_table.items():
+                    for i in range(0, len(items), self.batch_size):
+                        changed |= self._upsert(cursor, table, items[i:i + self.batch_size])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            if changed and self._on_status_change:
+                # The autosaves are committed; a failing hook must not queue them again
+                try:
+                    self._on_status_change(conn, changed)
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Autosave status change error: {e}")
+        finally:
+            if own:
+                conn.close()
+        self._flushed_rows += len(entries)
+        self._last_flush_ms = round((time.monotonic() - started) * 1000, 2)
+
+    def _upsert(self, cursor, table, items):
+        columns = self._tables[table]
+        keep_null = self._keep_null[table]
+        updates = ', '.join(
+            f'{col}=COALESCE(VALUES({col}), {col})' if col in keep_null else f'{col}=VALUES({col})'
+            for col in columns
+        )
+        first = "SELECT %s AS attempt_id, " + ", ".join(f"%s AS {col}" for col in columns)
+        rest = "SELECT " + ", ".join(["%s"] * (len(columns) + 1))
+        rows_sql = " UNION ALL ".join([first] + [rest] * (len(items) - 1))
+        params = []
+        for attempt_id, (_, _, _, row) in items:
+            params.append(attempt_id)
+            params.extend(row)
+        cursor.execute(f"""
+            INSERT INTO {table} (attempt_id, {', '.join(columns)}, updated_at)
+            SELECT v.attempt_id, {', '.join('v.' + col for col in columns)}, NOW()
+            FROM ({rows_sql}) AS v
+            JOIN user_task_attempts uta ON uta.id = v.attempt_id AND uta.status = 'In Progress'
+            ON DUPLICATE KEY UPDATE {updates}, updated_at=NOW()
+        """, params)
+
+        marks = {}
+        for attempt_id, (user_id, _, task_name, _) in items:
+            marks[(user_id, task_name)] = attempt_id
+        marks_sql = " UNION ALL ".join(
+            ["SELECT %s AS attempt_id, %s AS user_id, %s AS task_name"] + ["SELECT %s, %s, %s"] * (len(marks) - 1)
+        )
+        params = []
+        for (user_id, task_name), attempt_id in marks.items():
+            params.extend((attempt_id, user_id, task_name))
+        cursor.execute(f"""
+            SELECT user_id, task_name FROM user_tasks
+            WHERE status = 'In Progress' AND (user_id, task_name) IN ({', '.join(['(%s, %s)'] * len(marks))})
+        """, [value for key in marks for value in key])
+        already = {(user_id, task_name) for user_id, task_name in cursor.fetchall()}
+        cursor.execute(f"""
+            INSERT INTO user_tasks (user_id, task_name, status)
+            SELECT v.user_id, v.task_name, 'In Progress'
+            FROM ({marks_sql}) AS v
+            JOIN user_task_attempts uta ON uta.id = v.attempt_id AND uta.status = 'In Progress'
+            ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = CURRENT_TIMESTAMP
+        """, params)
+        return {user_id for user_id, task_name in marks if (user_id, task_name) not in already}
+
+    def _ensure_thread(self):
+        # Started lazily so each (forked) worker process gets its own flusher
+        if self._thread_pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='autosave-flusher', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def stats(self):
+        """Buffer gauges: spooled attempts, rows flushed, flush errors and last flush time."""
+        pending = self._pending_count() if self.enabled else 0
+        return {
+            'enabled': self.enabled,
+            'pending': pending,
+            'flushed_rows': self._flushed_rows,
+            'flush_errors': self._flush_errors,
+            'last_flush_ms': self._last_flush_ms,
+        }
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark for /api/admin/dashboard-stats
+
+Seeds BENCH_USERS participants (default 50,000) with a few user_tasks rows each,
+calls the endpoint through the Flask test client and checks that the number of
+SQL statements and the latency stay within budget. The seeded rows are removed
+afterwards.
+
+Run it against a scratch database that nothing else is using - statements are
+counted from the server's global 'Questions' counter:
+
+    MYSQLDATABASE=dyslexia_bench python benchmark_dashboard_stats.py
+"""
+
+import os
+import statistics
+import sys
+import time
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BENCH_USERS = int(os.getenv("BENCH_USERS", 50000))
+MAX_QUERIES = int(os.getenv("BENCH_MAX_QUERIES", 8))
+MAX_MS = float(os.getenv("BENCH_MAX_MS", 2000))
+RUNS = int(os.getenv("BENCH_RUNS", 5))
+EMAIL_DOMAIN = "dashboard-bench.invalid"
+TASK_NAMES = ['Reading Comprehension', 'Mathematical Comprehension', 'Aptitude Test', 'Typing Task']
+BATCH = 5000
+
+DB_CONFIG = {
+    "host": os.getenv("MYSQLHOST", "localhost"),
+    "user": os.getenv("MYSQLUSER", "root"),
+    "password": os.getenv("MYSQLPASSWORD", ""),
+    "database": os.getenv("MYSQLDATABASE", "dyslexia_study"),
+    "port": int(os.getenv("MYSQLPORT", 3306))
+}
+
+
+def questions(cursor):
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cursor.fetchone()[1])
+
+
+def seed(conn):
+    cursor = conn.cursor()
+    print(f"Seeding {BENCH_USERS} users...")
+    for start in range(0, BENCH_USERS, BATCH):
+        rows = [
+            (f"Bench {i}", f"bench{i}@{EMAIL_DOMAIN}", "x", True, 'child')
+            for i in range(start, min(start + BATCH, BENCH_USERS))
+        ]
+        cursor.executemany(
+            "INSERT INTO users (name, email, password_hash, is_18_or_above, user_type) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+    conn.commit()
+
+    # Every user gets 0-4 tasks with a mix of statuses
+    cursor.execute("SELECT id FROM users WHERE email LIKE %s ORDER BY id", (f"%@{EMAIL_DOMAIN}",))
+    user_ids = [row[0] for row in cursor.fetchall()]
+    rows = []
+    for n, user_id in enumerate(user_ids):
+        for t, task_name in enumerate(TASK_NAMES[:n % (len(TASK_NAMES) + 1)]):
+            rows.append((user_id, task_name, 'Completed' if (n + t) % 3 else 'In Progress'))
+    for start in range(0, len(rows), BATCH):
+        cursor.executemany(
+            "INSERT INTO user_tasks (user_id, task_name, status) VALUES (%s, %s, %s)",
+            rows[start:start + BATCH],
+        )
+    conn.commit()
+    cursor.close()
+    print(f"Seeded {len(user_ids)} users and {len(rows)} user_tasks rows")
+
+
+def cleanup(conn):
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM users WHERE email LIKE %s", (f"%@{EMAIL_DOMAIN}",))
+    conn.commit()
+    cursor.close()
+
+
+def run_benchmark():
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cleanup(conn)
+    seed(conn)
+    try:
+        from app import app
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['is_admin'] = True
+
+        # Warm up the pool and the server's buffer pool
+        client.get('/api/admin/dashboard-stats')
+
+        status_cursor = conn.cursor()
+        timings = []
+        query_counts = []
+        for _ in range(RUNS):
+            before = questions(status_cursor)
+            started = time.perf_counter()
+            response = client.get('/api/admin/dashboard-stats')
+            timings.append((time.perf_counter() - started) * 1000)
+            # The SHOW STATUS call itself is counted once
+            query_counts.append(questions(status_cursor) - before - 1)
+            data = response.get_json()
+            if not data or not data.get('success'):
+                print(f"❌ Endpoint failed: {data}")
+                return False
+        status_cursor.close()
+
+        median_ms = statistics.median(timings)
+        max_queries = max(query_counts)
+        print(f"Stats: {data['stats']}")
+        print(f"Latency median {median_ms:.1f} ms (budget {MAX_MS:.0f} ms), runs: {[round(t, 1) for t in timings]}")
+        print(f"Statements per request {max_queries} (budget {MAX_QUERIES})")
+
+        ok = True
+        if max_queries > MAX_QUERIES:
+            print("❌ Query budget exceeded")
+            ok = False
+        if median_ms > MAX_MS:
+            print("❌ Latency budget exceeded")
+            ok = False
+        if ok:
+            print("✅ Dashboard stats within budget")
+        return ok
+    finally:
+        cleanup(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+
+
+class VersionSignal:
+    """Cross-worker change marker backed by a small file.
+
+    Every bump atomically replaces the file, so (inode, mtime) changes and other
+    worker processes notice it with a single stat() call - no DB round trip.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def current(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_ino, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def bump(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as fh:
+            fh.write(str(time.time()))
+        os.replace(tmp, self.path)
+
+
+class TaskCatalog:
+    """In-memory task_name -> tasks.id map, reloaded when its VersionSignal changes.
+
+    Typing prompts (typing_tasks.task_name) are kept as aliases of the main
+    "Typing Task" row because their attempts are recorded under it.
+    """
+
+    TYPING_PARENT = 'Typing Task'
+
+    def __init__(self, connect, signal, miss_reload_interval=5.0):
+        self._connect = connect
+        self._signal = signal
+        self._miss_reload_interval = miss_reload_interval
+        self._lock = threading.Lock()
+        self._ids = None
+        self._aliases = {}
+        self._version = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        conn = self._connect()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, task_name FROM tasks")
+            ids = {name: task_id for task_id, name in cursor.fetchall()}
+            try:
+                cursor.execute("SELECT task_name FROM typing_tasks")
+                aliases = {row[0]: self.TYPING_PARENT for row in cursor.fetchall() if row[0]}
+            except Exception:
+                aliases = {}
+        finally:
+            cursor.close()
+            conn.close()
+        self._ids, self._aliases = ids, aliases
+        self._loaded_at = time.monotonic()
+        return True
+
+    def _ensure_fresh(self):
+        version = self._signal.current()
+        if self._ids is None or version != self._version:
+            with self._lock:
+                if self._ids is None or version != self._version:
+                    if self._load():
+                        self._version = version
+
+    def _lookup(self, task_name, include_aliases):
+        ids = self._ids or {}
+        task_id = ids.get(task_name)
+        if task_id is None and include_aliases and task_name in self._aliases:
+            task_id = ids.get(self._aliases[task_name])
+        return task_id
+
+    def task_id(self, task_name, include_aliases=False):
+        """Returns tasks.id for task_name (or its alias parent), or None."""
+        self._ensure_fresh()
+        task_id = self._lookup(task_name, include_aliases)
+        if task_id is None and time.monotonic() - self._loaded_at > self._miss_reload_interval:
+            # Rows added outside the admin API (e.g. SQL scripts) show up after a bounded delay
+            with self._lock:
+                self._load()
+            task_id = self._lookup(task_name, include_aliases)
+        return task_id
+
+    def names(self):
+        """Returns {task_name: id} for all tasks."""
+        self._ensure_fresh()
+        return dict(self._ids or {})
+
+    def invalidate(self):
+        """Drops this worker's copy and signals every other worker to reload."""
+        with self._lock:
+            self._ids = None
+        try:
+            self._signal.bump()
+        except OSError as e:
+            print(f"Task catalog signal error: {e}")
+
+
+class TaskMatrix:
+    """class_level -> task categories that have content for it, plus per-section assignments.
+
+    Participant dashboards decide which tasks to show from this instead of
+    counting rows in every category table. It is loaded with two queries and
+    reloaded when its VersionSignal changes (admin content or assignment edits)
+    or after max_age seconds, which picks up rows added by SQL scripts.
+    """
+
+    # Dashboard task name -> content table, in display order
+    CATEGORIES = [
+        ('Reading Aloud Task 1', 'reading_tasks'),
+        ('Typing Task', 'typing_tasks'),
+        ('Reading Comprehension', 'reading_comprehension_tasks'),
+        ('Mathematical Comprehension', 'mathematical_comprehension_tasks'),
+        ('Writing Task', 'writing_tasks'),
+        ('Aptitude Test', 'aptitude_tasks'),
+    ]
+
+    def __init__(self, connect, signal, max_age=300.0):
+        self._connect = connect
+        self._signal = signal
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._levels = None
+        self._sections = {}
+        self._version = None
+        self._loaded_at = 0.0
+
+    def load(self):
+        """Reads the matrix from the database; returns False when no connection is available."""
+        version = self._signal.current()
+        conn = self._connect()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                " UNION ALL ".join(
+                    f"SELECT DISTINCT %s, class_level FROM {table} WHERE class_level IS NOT NULL"
+                    for _, table in self.CATEGORIES
+                ),
+                [task_name for task_name, _ in self.CATEGORIES],
+            )
+            levels = {}
+            for task_name, class_level in cursor.fetchall():
+                levels.setdefault(int(class_level), set()).add(task_name)
+            cursor.execute("""
+                SELECT sa.section_id, sa.task_name
+                FROM section_assessments sa
+                LEFT JOIN tasks t ON t.task_name = sa.task_name
+                ORDER BY sa.section_id, t.id, sa.task_name
+            """)
+            sections = {}
+            for section_id, task_name in cursor.fetchall():
+                sections.setdefault(section_id, []).append(task_name)
+        finally:
+            cursor.close()
+            conn.close()
+        with self._lock:
+            self._levels, self._sections = levels, sections
+            self._version = version
+            self._loaded_at = time.monotonic()
+        return True
+
+    def _stale(self):
+        return (self._levels is None or self._signal.current() != self._version
+                or time.monotonic() - self._loaded_at > self._max_age)
+
+    def _ensure_fresh(self):
+        if self._stale():
+            with self._load_lock:
+                if self._stale():
+                    self.load()
+
+    def categories(self, class_level):
+        """Dashboard task names with content for class_level, in display order."""
+        self._ensure_fresh()
+        available = (self._levels or {}).get(class_level, ())
+        return [task_name for task_name, _ in self.CATEGORIES if task_name in available]
+
+    def section_tasks(self, section_id):
+        """Task names a school assigned to section_id (ordered like the tasks table), or []."""
+        if section_id is None:
+            return []
+        self._ensure_fresh()
+        return list(self._sections.get(section_id, ()))
+
+    def invalidate(self):
+        """Drops this worker's copy and signals every other worker to reload."""
+        with self._lock:
+            self._levels = None
+        try:
+            self._signal.bump()
+        except OSError as e:
+            print(f"Task matrix signal error: {e}")
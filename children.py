@@ -0,0 +1,150 @@
+# Batched loading of parents' children and their task progress.
+#
+# Parent-facing pages used to query children (and then each child's tasks) one
+# parent at a time. These helpers fetch everything for a whole set of parents in
+# one query per table and group the rows in Python.
+
+# Keeps IN (...) lists to a sane statement size for very large schools
+CHUNK_SIZE = 1000
+
+CHILD_COLUMNS = """
+    c.id, c.name, c.email, c.class, c.is_active, c.created_at,
+    c.school_id, c.parent_id, c.pending_parent_email,
+    sec.id AS section_id, sec.name AS section_name,
+    cls.id AS class_id, cls.name AS class_name, cls.academic_year,
+    sch.name AS school_name,
+    d.age, d.gender, d.dyslexia_status, d.education_level, d.native_language
+"""
+
+ORDERINGS = {
+    'name': 'c.name ASC',
+    'created_at_desc': 'c.created_at DESC',
+}
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def pick(row, fields):
+    """Projects a loaded row onto the fields an endpoint returns."""
+    return {field: row.get(field) for field in fields}
+
+
+def load_children(cursor, parents, school_id=None, match_pending_email=False,
+                  include_linked=False, child_id=None, order='name'):
+    """Returns {parent_id: [child rows]} for every parent in `parents`.
+
+    parents is a list of {'id', 'email'} dicts (email is only needed with
+    match_pending_email). A child belongs to a parent through users.parent_id,
+    through pending_parent_email (match_pending_email) or through the
+    parent_children link table (include_linked). cursor must be a dictionary cursor.
+    """
+    grouped = {parent['id']: [] for parent in parents}
+    if not parents:
+        return grouped
+    by_email = {}
+    if match_pending_email:
+        for parent in parents:
+            if parent.get('email'):
+                by_email.setdefault(parent['email'], []).append(parent['id'])
+
+    rows = []
+    for ids in _chunks(grouped):
+        chunk_ids = set(ids)
+        emails = [email for email, owners in by_email.items() if chunk_ids.intersection(owners)]
+        conditions = [f"c.parent_id IN ({_placeholders(ids)})"]
+        params = list(ids)
+        if emails:
+            conditions.append(f"c.pending_parent_email IN ({_placeholders(emails)})")
+            params.extend(emails)
+        linked_column = "NULL AS linked_parent_id"
+        linked_join = ""
+        if include_linked:
+            linked_column = "pc.parent_id AS linked_parent_id"
+            linked_join = f"LEFT JOIN parent_children pc ON pc.child_id = c.id AND pc.parent_id IN ({_placeholders(ids)})"
+            conditions.append("pc.parent_id IS NOT NULL")
+            params = list(ids) + params
+        filters = ""
+        if school_id is not None:
+            filters += " AND c.school_id = %s"
+            params.append(school_id)
+        if child_id is not None:
+            filters += " AND c.id = %s"
+            params.append(child_id)
+        cursor.execute(f"""
+            SELECT {CHILD_COLUMNS}, {linked_column}
+            FROM users c
+            {linked_join}
+            LEFT JOIN class_sections sec ON sec.id = c.section_id
+            LEFT JOIN school_classes cls ON cls.id = sec.class_id
+            LEFT JOIN schools sch ON sch.id = c.school_id
+            LEFT JOIN demographics d ON d.user_id = c.id
+            WHERE c.user_type = 'child' AND ({' OR '.join(conditions)}){filters}
+            ORDER BY {ORDERINGS[order]}, c.id
+        """, params)
+        rows.extend(cursor.fetchall())
+
+    if len(rows) > 1 and len(grouped) > CHUNK_SIZE:
+        # Chunks are ordered separately; restore the overall order
+        if order == 'name':
+            rows.sort(key=lambda r: ((r['name'] or '').lower(), r['id']))
+        else:
+            rows.sort(key=lambda r: (r['created_at'] is not None, r['created_at'], -r['id']), reverse=True)
+
+    seen = set()
+    for row in rows:
+        owners = set()
+        if row['parent_id'] in grouped:
+            owners.add(row['parent_id'])
+        owners.update(by_email.get(row['pending_parent_email'], ()))
+        if row.get('linked_parent_id') in grouped:
+            owners.add(row['linked_parent_id'])
+        for owner in owners:
+            if (owner, row['id']) not in seen:
+                seen.add((owner, row['id']))
+                grouped[owner].append(row)
+    return grouped
+
+
+def load_task_progress(cursor, child_ids):
+    """Returns {child_id: [user_tasks rows ordered by task_name]} in one query per chunk."""
+    progress = {child_id: [] for child_id in child_ids}
+    for ids in _chunks(progress):
+        cursor.execute(f"""
+            SELECT
+                ut.user_id,
+                ut.task_name,
+                ut.status,
+                ut.updated_at,
+                CASE
+                    WHEN ut.status = 'Completed' THEN 100
+                    WHEN ut.status = 'In Progress' THEN 50
+                    ELSE 0
+                END as progress_percentage
+            FROM user_tasks ut
+            WHERE ut.user_id IN ({_placeholders(ids)})
+            ORDER BY ut.user_id, ut.task_name
+        """, ids)
+        for row in cursor.fetchall():
+            progress[row.pop('user_id')].append(row)
+    return progress
+
+
+def recent_activity(task_progress, limit=5):
+    """The most recently updated tasks of one child, newest first."""
+    ordered = sorted(
+        task_progress,
+        key=lambda t: (t['updated_at'] is not None, t['updated_at']),
+        reverse=True,
+    )
+    return [
+        {'task_name': t['task_name'], 'status': t['status'], 'updated_at': t['updated_at']}
+        for t in ordered[:limit]
+    ]
@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, session
+
+# Resolved class level (1-12) per user.
+#
+# Task pages need the user's class level on every load. It is resolved once with
+# a single query and then kept in a worker-local LRU (with a TTL as a backstop
+# for edits made outside the app) and in the logged-in user's session, so a new
+# worker can answer from the cookie. The user's section_id is read by the same
+# query and cached alongside (see section()). Endpoints that change the inputs -
+# demographics, the profile, school section moves - call invalidate(). For one
+# user that drops the entry here and marks their session stale; session entries
+# carry the time they were written, so another worker holding an older entry
+# for the same user re-reads it on their next request (other users' sessions,
+# e.g. a parent moved by their school, catch up within the TTL). Bulk changes
+# call invalidate() without a user, which bumps a VersionSignal so every worker
+# and session entry goes stale at once.
+
+SESSION_KEY = 'class_level'
+
+RESOLVE_SQL = """
+    SELECT d.education_level, u.class, u.section_id, sc.name AS class_name
+    FROM users u
+    LEFT JOIN demographics d ON d.user_id = u.id
+    LEFT JOIN class_sections s ON s.id = u.section_id
+    LEFT JOIN school_classes sc ON sc.id = s.class_id
+    WHERE u.id = %s
+    LIMIT 1
+"""
+
+_MISS = object()
+_DIGITS = re.compile(r"(\d+)")
+
+
+def _level(value, pattern=None):
+    """Returns value as a class number 1-12 (searching it for digits when pattern is given), or None."""
+    if not value:
+        return None
+    try:
+        if pattern is None:
+            number = int(value)
+        else:
+            match = pattern.search(str(value))
+            if not match:
+                return None
+            number = int(match.group(1))
+    except (ValueError, TypeError):
+        return None
+    return number if 1 <= number <= 12 else None
+
+
+def resolve(conn, user_id):
+    """Returns (class level, section_id) for a user.
+
+    The level comes from demographics.education_level, users.class or their
+    section's class name, in that order.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(RESOLVE_SQL, (user_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return None, None
+    return level_of(row), row.get('section_id')
+
+
+def level_of(row):
+    """Class level from a row with education_level, class and class_name columns (see resolve)."""
+    level = _level(row.get('education_level'))
+    if level is None:
+        level = _level(row.get('class'), _DIGITS)
+    if level is None:
+        level = _level(row.get('class_name'), _DIGITS)
+    return level
+
+
+class ClassLevelCache:
+    """user_id -> (class level, section_id), cached per worker and in the user's own session."""
+
+    def __init__(self, signal, ttl=300.0, max_entries=10000):
+        self._signal = signal
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+    def _version_key(self, version):
+        # Stored in the session cookie, which serializes tuples as lists
+        return list(version) if version else None
+
+    def _session_get(self, user_id, version):
+        if not has_request_context() or session.get('user_id') != user_id:
+            return _MISS
+        entry = session.get(SESSION_KEY)
+        if (not entry or entry.get('user_id') != user_id
+                or entry.get('version') != self._version_key(version)
+                or entry.get('expires', 0) < time.time()):
+            return _MISS
+        return entry.get('level'), entry.get('section_id')
+
+    def _session_updated(self, user_id):
+        """When the user's own session entry was written (or marked stale), 0 without one."""
+        if not has_request_context() or session.get('user_id') != user_id:
+            return 0
+        entry = session.get(SESSION_KEY)
+        if not entry or entry.get('user_id') != user_id:
+            return 0
+        return entry.get('updated', 0)
+
+    def _session_put(self, user_id, placement, version, updated):
+        if has_request_context() and session.get('user_id') == user_id:
+            session[SESSION_KEY] = {
+                'user_id': user_id,
+                'level': placement[0],
+                'section_id': placement[1],
+                'version': self._version_key(version),
+                'expires': time.time() + self._ttl,
+                'updated': updated,
+            }
+
+    def _local_put(self, user_id, placement, version, updated):
+        with self._lock:
+            if version != self._version:
+                return
+            self._entries[user_id] = (placement, time.monotonic() + self._ttl, updated)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _placement(self, conn, user_id):
+        version = self._signal.current()
+        session_updated = self._session_updated(user_id)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(user_id)
+            # A newer session entry means the user changed it through another worker
+            if entry is not None and entry[1] > time.monotonic() and entry[2] >= session_updated:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+
+        placement = self._session_get(user_id, version)
+        if placement is _MISS:
+            placement = resolve(conn, user_id)
+            session_updated = time.time()
+            self._session_put(user_id, placement, version, session_updated)
+        self._local_put(user_id, placement, version, session_updated)
+        return placement
+
+    def get(self, conn, user_id):
+        """Returns the user's class level, querying the database only on a miss."""
+        return self._placement(conn, user_id)[0]
+
+    def section(self, conn, user_id):
+        """Returns the user's section_id (None for users outside a school section)."""
+        return self._placement(conn, user_id)[1]
+
+    def invalidate(self, user_id=None):
+        """Forgets one user's level here and in their session, or (user_id None) signals every worker and session to re-resolve."""
+        if user_id is not None:
+            with self._lock:
+                self._entries.pop(user_id, None)
+            if has_request_context() and session.get('user_id') == user_id:
+                # Kept as a marker, newer than any worker's entry for the user
+                session[SESSION_KEY] = {'user_id': user_id, 'updated': time.time()}
+            return
+        with self._lock:
+            self._entries.clear()
+        if has_request_context():
+            session.pop(SESSION_KEY, None)
+        try:
+            self._signal.bump()
+        except OSError as e:
+            print(f"Class level signal error: {e}")
@@ -0,0 +1,305 @@
+from flask import g, has_app_context
+
+# Materialized per-class statistics for the school dashboard.
+#
+# class_statistics holds one row per school class. A class's row is recomputed
+# with a handful of set-based queries at the end of every request that changes
+# it: a student starting or completing an attempt or having a task status set
+# (mark_user_changed), students added, imported or deleted, sections deleted
+# and assessments assigned or removed (mark_class_changed,
+# mark_classes_of_users). Code outside a request refreshes directly: the import
+# worker the section's class (refresh_for_section), the autosave flusher the
+# classes of students whose tasks it marked In Progress (refresh_for_users).
+# The dashboard reads every class in one query;
+# `flask rebuild-class-stats` recomputes all rows, e.g. after editing tables by
+# hand.
+
+SCORED_TASKS = {
+    'Reading Comprehension': ('reading', 'comprehension_progress', 'score'),
+    'Mathematical Comprehension': ('math', 'mathematical_comprehension_progress', 'score'),
+    'Aptitude Test': ('aptitude', 'aptitude_progress', 'total_score'),
+}
+
+TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS class_statistics (
+        class_id INT PRIMARY KEY,
+        school_id INT NOT NULL,
+        total_students INT NOT NULL DEFAULT 0,
+        total_tasks_completed INT NOT NULL DEFAULT 0,
+        students_attempted_all_tasks INT NOT NULL DEFAULT 0,
+        students_completed_all_tasks INT NOT NULL DEFAULT 0,
+        reading_avg DECIMAL(10,2), reading_min INT, reading_max INT,
+        reading_attempted INT NOT NULL DEFAULT 0, reading_completed INT NOT NULL DEFAULT 0,
+        math_avg DECIMAL(10,2), math_min INT, math_max INT,
+        math_attempted INT NOT NULL DEFAULT 0, math_completed INT NOT NULL DEFAULT 0,
+        aptitude_avg DECIMAL(10,2), aptitude_min INT, aptitude_max INT,
+        aptitude_attempted INT NOT NULL DEFAULT 0, aptitude_completed INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_class_statistics_school (school_id),
+        FOREIGN KEY (class_id) REFERENCES school_classes(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+COLUMNS = [
+    'total_students', 'total_tasks_completed', 'students_attempted_all_tasks', 'students_completed_all_tasks',
+] + [f'{prefix}_{stat}' for prefix, _, _ in SCORED_TASKS.values()
+     for stat in ('avg', 'min', 'max', 'attempted', 'completed')]
+
+# Children of one class, used as a derived table instead of IN (...) id lists
+STUDENTS_SQL = """
+    SELECT DISTINCT u.id
+    FROM users u
+    JOIN class_sections cs ON u.section_id = cs.id
+    WHERE cs.class_id = %s AND u.user_type = 'child' AND u.school_id = %s
+"""
+
+
+def ensure_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def mark_user_changed(user_id):
+    """Records that user_id's attempts changed in this request; refreshed at teardown."""
+    if not has_app_context():
+        return
+    changed = g.setdefault('class_stats_users', set())
+    changed.add(user_id)
+
+
+def changed_users():
+    return g.get('class_stats_users', set()) if has_app_context() else set()
+
+
+def mark_class_changed(school_id, class_id):
+    """Records that a class's students changed in this request; refreshed at teardown."""
+    if not has_app_context() or class_id is None:
+        return
+    changed = g.setdefault('class_stats_classes', set())
+    changed.add((school_id, class_id))
+
+
+def mark_classes_of_users(cursor, user_ids):
+    """Marks the classes of children about to be deleted, while their section still says which."""
+    if not user_ids:
+        return
+    for school_id, class_id in _classes_of_users(cursor, user_ids):
+        mark_class_changed(school_id, class_id)
+
+
+def _classes_of_users(cursor, user_ids):
+    cursor.execute(f"""
+        SELECT DISTINCT u.school_id, cs.class_id
+        FROM users u
+        JOIN class_sections cs ON u.section_id = cs.id
+        WHERE u.id IN ({', '.join(['%s'] * len(user_ids))}) AND u.school_id IS NOT NULL
+    """, list(user_ids))
+    return cursor.fetchall()
+
+
+def changed_classes():
+    return g.get('class_stats_classes', set()) if has_app_context() else set()
+
+
+def compute_class(cursor, school_id, class_id):
+    """Returns the statistics row for one class as {column: value}."""
+    row = dict.fromkeys(COLUMNS, 0)
+    for prefix, _, _ in SCORED_TASKS.values():
+        row[f'{prefix}_avg'] = row[f'{prefix}_min'] = row[f'{prefix}_max'] = None
+    params = (class_id, school_id)
+
+    cursor.execute(f"SELECT COUNT(*) FROM ({STUDENTS_SQL}) s", params)
+    row['total_students'] = cursor.fetchone()[0]
+    if not row['total_students']:
+        return row
+
+    cursor.execute(f"""
+        SELECT COUNT(DISTINCT ut.task_name)
+        FROM user_tasks ut
+        JOIN ({STUDENTS_SQL}) s ON s.id = ut.user_id
+        WHERE ut.status = 'Completed'
+    """, params)
+    row['total_tasks_completed'] = cursor.fetchone()[0]
+
+    # Tasks assigned to the class's sections, or every task when none are assigned
+    cursor.execute("""
+        SELECT COUNT(DISTINCT sa.task_name)
+        FROM section_assessments sa
+        JOIN class_sections cs ON sa.section_id = cs.id
+        WHERE cs.class_id = %s
+    """, (class_id,))
+    total_available_tasks = cursor.fetchone()[0]
+    if not total_available_tasks:
+        cursor.execute("SELECT COUNT(DISTINCT task_name) FROM tasks")
+        total_available_tasks = cursor.fetchone()[0]
+
+    if total_available_tasks:
+        cursor.execute(f"""
+            SELECT
+                COALESCE(SUM(per_student.attempted_tasks = %s), 0),
+                COALESCE(SUM(per_student.completed_tasks = %s), 0)
+            FROM (
+                SELECT ut.user_id,
+                       COUNT(DISTINCT ut.task_name) AS attempted_tasks,
+                       COUNT(DISTINCT CASE WHEN ut.status = 'Completed' THEN ut.task_name END) AS completed_tasks
+                FROM user_tasks ut
+                JOIN ({STUDENTS_SQL}) s ON s.id = ut.user_id
+                GROUP BY ut.user_id
+            ) per_student
+        """, (total_available_tasks, total_available_tasks) + params)
+        attempted_all, completed_all = cursor.fetchone()
+        row['students_attempted_all_tasks'] = int(attempted_all)
+        row['students_completed_all_tasks'] = int(completed_all)
+
+    task_names = list(SCORED_TASKS)
+    placeholders = ', '.join(['%s'] * len(task_names))
+    cursor.execute(f"""
+        SELECT t.task_name, COUNT(DISTINCT uta.user_id)
+        FROM user_task_attempts uta
+        JOIN tasks t ON t.id = uta.task_id
+        JOIN ({STUDENTS_SQL}) s ON s.id = uta.user_id
+        WHERE t.task_name IN ({placeholders})
+        GROUP BY t.task_name
+    """, params + tuple(task_names))
+    for task_name, attempted in cursor.fetchall():
+        row[f'{SCORED_TASKS[task_name][0]}_attempted'] = int(attempted)
+
+    # Score spread over completed attempts, one branch per progress table
+    branches = []
+    branch_params = []
+    for task_name, (_, table, score_col) in SCORED_TASKS.items():
+        branches.append(f"""
+            SELECT %s AS task_name, AVG(p.{score_col}), MIN(p.{score_col}), MAX(p.{score_col}),
+                   COUNT(DISTINCT uta.user_id)
+            FROM user_task_attempts uta
+            JOIN tasks t ON t.id = uta.task_id AND t.task_name = %s
+            JOIN {table} p ON p.attempt_id = uta.id AND p.status = 'Completed'
+            JOIN ({STUDENTS_SQL}) s ON s.id = uta.user_id
+            WHERE uta.status = 'Completed'
+        """)
+        branch_params.extend((task_name, task_name) + params)
+    cursor.execute(" UNION ALL ".join(branches), branch_params)
+    for task_name, avg_score, min_score, max_score, completed in cursor.fetchall():
+        if avg_score is None:
+            continue
+        prefix = SCORED_TASKS[task_name][0]
+        row[f'{prefix}_avg'] = round(float(avg_score), 2)
+        row[f'{prefix}_min'] = int(min_score)
+        row[f'{prefix}_max'] = int(max_score)
+        row[f'{prefix}_completed'] = int(completed)
+    return row
+
+
+def refresh_class(conn, school_id, class_id):
+    """Recomputes and stores one class's row (the caller commits)."""
+    cursor = conn.cursor()
+    try:
+        row = compute_class(cursor, school_id, class_id)
+        cursor.execute(f"""
+            INSERT INTO class_statistics (class_id, school_id, {', '.join(COLUMNS)})
+            VALUES ({', '.join(['%s'] * (len(COLUMNS) + 2))})
+            ON DUPLICATE KEY UPDATE school_id=VALUES(school_id), {', '.join(f'{col}=VALUES({col})' for col in COLUMNS)}
+        """, [class_id, school_id] + [row[col] for col in COLUMNS])
+    finally:
+        cursor.close()
+    return row
+
+
+def refresh_for_users(conn, user_ids, classes=()):
+    """Recomputes the classes the given children belong to, plus (school_id, class_id) pairs in classes (the caller commits)."""
+    classes = set(classes)
+    if user_ids:
+        cursor = conn.cursor()
+        try:
+            classes.update(_classes_of_users(cursor, user_ids))
+        finally:
+            cursor.close()
+    for school_id, class_id in classes:
+        refresh_class(conn, school_id, class_id)
+
+
+def refresh_for_section(conn, section_id):
+    """Recomputes the class a section belongs to (the caller commits); for code outside a request."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT c.school_id, c.id FROM class_sections s JOIN school_classes c ON c.id = s.class_id WHERE s.id = %s",
+            (section_id,)
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if row:
+        refresh_class(conn, row[0], row[1])
+
+
+def rebuild(conn, school_id=None):
+    """Recomputes every class (optionally of one school), committing per class; returns the count."""
+    cursor = conn.cursor()
+    try:
+        if school_id is None:
+            cursor.execute("SELECT school_id, id FROM school_classes")
+        else:
+            cursor.execute("SELECT school_id, id FROM school_classes WHERE school_id = %s", (school_id,))
+        classes = cursor.fetchall()
+        # Rows of classes that no longer exist are removed by the foreign key; this catches the rest
+        if school_id is None:
+            cursor.execute("DELETE cst FROM class_statistics cst LEFT JOIN school_classes sc ON sc.id = cst.class_id WHERE sc.id IS NULL")
+    finally:
+        cursor.close()
+    for class_school_id, class_id in classes:
+        refresh_class(conn, class_school_id, class_id)
+        conn.commit()
+    return len(classes)
+
+
+def _score_block(row, prefix):
+    return {
+        'average_score': float(row[f'{prefix}_avg']) if row[f'{prefix}_avg'] is not None else 0,
+        'min_score': row[f'{prefix}_min'] if row[f'{prefix}_min'] is not None else 0,
+        'max_score': row[f'{prefix}_max'] if row[f'{prefix}_max'] is not None else 0,
+        'students_attempted': row[f'{prefix}_attempted'],
+        'students_completed': row[f'{prefix}_completed'],
+    }
+
+
+def school_statistics(conn, school_id):
+    """Returns the class-wise statistics list for a school, computing rows that are missing."""
+    query = f"""
+        SELECT sc.id AS class_id, sc.name AS class_name, sc.academic_year,
+               cst.class_id AS materialized, {', '.join('cst.' + col for col in COLUMNS)}
+        FROM school_classes sc
+        LEFT JOIN class_statistics cst ON cst.class_id = sc.id
+        WHERE sc.school_id = %s
+        ORDER BY sc.academic_year DESC, sc.name ASC
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, (school_id,))
+        rows = cursor.fetchall()
+        missing = [row['class_id'] for row in rows if row['materialized'] is None]
+        if missing:
+            for class_id in missing:
+                refresh_class(conn, school_id, class_id)
+            conn.commit()
+            cursor.execute(query, (school_id,))
+            rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    return [{
+        'class_id': row['class_id'],
+        'class_name': row['class_name'],
+        'academic_year': row['academic_year'],
+        'total_students': row['total_students'] or 0,
+        'total_tasks_completed': row['total_tasks_completed'] or 0,
+        'students_attempted_all_tasks': row['students_attempted_all_tasks'] or 0,
+        'students_completed_all_tasks': row['students_completed_all_tasks'] or 0,
+        'reading_comprehension': _score_block(row, 'reading'),
+        'mathematical_comprehension': _score_block(row, 'math'),
+        'aptitude': _score_block(row, 'aptitude'),
+    } for row in rows]
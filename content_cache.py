@@ -0,0 +1,73 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from catalog import VersionSignal
+
+# Rendered JSON bodies of the task content endpoints (/api/<category>-tasks/<user_id>).
+#
+# Bodies are keyed by (category, class_level, scope) and tagged with the
+# category's content version - a VersionSignal file bumped by admin edits - so
+# an edit re-renders that category for every worker. The ETag is a hash of the
+# body, so class levels whose content did not change keep their ETag across
+# edits and clients keep getting 304s for them.
+
+
+class ContentCache:
+    """(category, class_level, scope) -> (JSON body, ETag), bounded LRU."""
+
+    def __init__(self, signal_dir, max_entries=512, max_age=300.0):
+        self._signal_dir = signal_dir
+        self._max_entries = max_entries
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._signals = {}
+
+    def _signal(self, category):
+        signal = self._signals.get(category)
+        if signal is None:
+            signal = self._signals.setdefault(
+                category, VersionSignal(os.path.join(self._signal_dir, f'content-{category}.version'))
+            )
+        return signal
+
+    def version(self, category):
+        """The category's current content version; read it before rendering."""
+        return self._signal(category).current()
+
+    def get(self, category, class_level, version, scope=None):
+        """Returns (body, etag) if a rendering of this version is cached, else None."""
+        key = (category, class_level, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, etag, entry_version, rendered_at = entry
+            if entry_version != version or time.monotonic() - rendered_at > self._max_age:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def put(self, category, class_level, body, version, scope=None):
+        """Stores a body rendered at `version`; returns (body, etag)."""
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[(category, class_level, scope)] = (body, etag, version, time.monotonic())
+            self._entries.move_to_end((category, class_level, scope))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def invalidate(self, category):
+        """Drops this worker's renderings of a category and signals the other workers."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == category]:
+                del self._entries[key]
+        try:
+            self._signal(category).bump()
+        except OSError as e:
+            print(f"Content cache signal error: {e}")
@@ -93,7 +93,8 @@ CREATE TABLE IF NOT EXISTS demographics (
     education_level VARCHAR(100),
     dyslexia_status VARCHAR(50),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_demographics_user (user_id)
 );
 
 -- Create user_tasks table to track each user's task status (Not Started, In Progress, Completed) for each task
@@ -143,9 +144,11 @@ CREATE TABLE IF NOT EXISTS typing_progress (
     attempt_id INT NOT NULL,
     text TEXT,
     keystrokes LONGTEXT,
+    keystrokes_packed LONGBLOB,
     timer INT,
     updated_at DATETIME,
-    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_typing_progress_attempt (attempt_id)
 );
 
 CREATE TABLE IF NOT EXISTS comprehension_progress (
@@ -156,7 +159,8 @@ CREATE TABLE IF NOT EXISTS comprehension_progress (
     q3 TEXT,
     status ENUM('In Progress', 'Completed') DEFAULT 'In Progress',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_comprehension_progress_attempt (attempt_id)
 );
 ALTER TABLE comprehension_progress ADD COLUMN score INT DEFAULT 0, ADD COLUMN max_score INT DEFAULT 2;
 
@@ -175,7 +179,8 @@ CREATE TABLE IF NOT EXISTS aptitude_progress (
     answered_count INT DEFAULT 0,
     progress_percent INT DEFAULT 0,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_aptitude_progress_attempt (attempt_id)
 );
 ALTER TABLE aptitude_progress ADD COLUMN max_score INT DEFAULT 4;
 -- Update existing records to have proper max_score values
@@ -189,7 +194,8 @@ CREATE TABLE IF NOT EXISTS writing_samples (
     filename VARCHAR(255) NOT NULL,
     status ENUM('In Progress', 'Completed') DEFAULT 'In Progress',
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_writing_samples_attempt (attempt_id)
 );
 
 CREATE TABLE IF NOT EXISTS mathematical_comprehension_progress (
@@ -200,7 +206,8 @@ CREATE TABLE IF NOT EXISTS mathematical_comprehension_progress (
     q3 TEXT,
     status ENUM('In Progress', 'Completed') DEFAULT 'In Progress',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY uniq_mathematical_comprehension_progress_attempt (attempt_id)
 );
 ALTER TABLE mathematical_comprehension_progress ADD COLUMN score INT DEFAULT 0, ADD COLUMN max_score INT DEFAULT 3;
 
@@ -850,6 +857,154 @@ CREATE TABLE IF NOT EXISTS user_task_attempts (
     UNIQUE KEY unique_attempt (user_id, task_id, attempt_number)
 );
 
+-- Append-only keystroke log chunks (events seq_start..seq_end-1 of an attempt)
+CREATE TABLE IF NOT EXISTS typing_keystroke_chunks (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    attempt_id INT NOT NULL,
+    seq_start INT NOT NULL,
+    seq_end INT NOT NULL,
+    events LONGTEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_attempt_chunk (attempt_id, seq_start)
+);
+
+-- Typing-dynamics features per attempt (see typing_features.py; rebuild with `flask typing-features`)
+CREATE TABLE IF NOT EXISTS typing_features (
+    attempt_id INT PRIMARY KEY,
+    event_count INT NOT NULL,
+    char_count INT NOT NULL,
+    backspace_count INT NOT NULL,
+    delete_count INT NOT NULL,
+    correction_rate FLOAT,
+    iki_mean FLOAT,
+    iki_median FLOAT,
+    iki_std FLOAT,
+    iki_p10 FLOAT,
+    iki_p90 FLOAT,
+    iki_histogram TEXT,
+    pause_count INT NOT NULL,
+    pause_total_ms BIGINT NOT NULL,
+    burst_count INT NOT NULL,
+    burst_mean_len FLOAT,
+    burst_max_len INT,
+    duration_ms BIGINT NOT NULL,
+    final_length INT NOT NULL,
+    wpm FLOAT,
+    wpm_curve TEXT,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+);
+
+-- Resumable Reading Aloud uploads (see audio_uploads.py; partial files live in uploads/partial)
+CREATE TABLE IF NOT EXISTS audio_uploads (
+    id CHAR(32) PRIMARY KEY,
+    user_id INT NOT NULL,
+    task_name VARCHAR(255) NOT NULL,
+    is_retake BOOLEAN NOT NULL DEFAULT FALSE,
+    original_name VARCHAR(255) NOT NULL,
+    total_bytes BIGINT NULL,
+    status ENUM('open', 'finalized') NOT NULL DEFAULT 'open',
+    filename VARCHAR(255) NULL,
+    attempt_id INT NULL,
+    attempt_number INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finalized_at TIMESTAMP NULL,
+    INDEX idx_audio_uploads_user (user_id),
+    INDEX idx_audio_uploads_status_created (status, created_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Content-addressed upload index (see storage.py; blobs live in uploads/blobs/<aa>/<bb>/<sha256>)
+CREATE TABLE IF NOT EXISTS upload_files (
+    name VARCHAR(255) PRIMARY KEY,
+    user_id INT NULL,
+    sha256 CHAR(64) NOT NULL,
+    size BIGINT NOT NULL,
+    content_type VARCHAR(100) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_upload_files_sha256 (sha256)
+);
+
+-- Audio post-processing queue and results (see audio_jobs.py; run `flask worker`)
+CREATE TABLE IF NOT EXISTS audio_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    recording_id INT NOT NULL UNIQUE,
+    filename VARCHAR(255) NOT NULL,
+    status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    INDEX idx_audio_jobs_status_available (status, available_at)
+);
+
+CREATE TABLE IF NOT EXISTS audio_features (
+    recording_id INT PRIMARY KEY,
+    duration_ms INT NOT NULL,
+    normalized_filename VARCHAR(255) NULL,
+    rms_dbfs FLOAT,
+    peak_dbfs FLOAT,
+    silence_ratio FLOAT,
+    speech_segment_count INT NOT NULL,
+    speech_ms INT NOT NULL,
+    rms_envelope MEDIUMTEXT,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Writing-sample renditions (see image_renditions.py; made by `flask worker`)
+CREATE TABLE IF NOT EXISTS image_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL UNIQUE,
+    status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    INDEX idx_image_jobs_status_available (status, available_at)
+);
+
+CREATE TABLE IF NOT EXISTS image_renditions (
+    filename VARCHAR(255) PRIMARY KEY,
+    width INT NOT NULL,
+    height INT NOT NULL,
+    review_width INT NOT NULL,
+    review_height INT NOT NULL,
+    review_bytes INT NOT NULL,
+    thumb_width INT NOT NULL,
+    thumb_height INT NOT NULL,
+    thumb_bytes INT NOT NULL,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Background student imports (see import_jobs.py; run `flask worker`)
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    school_id INT NOT NULL,
+    section_id INT NOT NULL,
+    file_path VARCHAR(255) NOT NULL,
+    original_name VARCHAR(255) NOT NULL,
+    status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT NULL,
+    available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    total_rows INT NULL,
+    last_row INT NOT NULL DEFAULT 1,
+    rows_added INT NOT NULL DEFAULT 0,
+    rows_failed INT NOT NULL DEFAULT 0,
+    row_errors MEDIUMTEXT NULL,
+    INDEX idx_import_jobs_status_available (status, available_at),
+    INDEX idx_import_jobs_school (school_id)
+);
+
 
 CREATE TABLE IF NOT EXISTS suggested_tasks (
                 id INT AUTO_INCREMENT PRIMARY KEY,
@@ -901,6 +1056,26 @@ CREATE TABLE IF NOT EXISTS class_sections (
     UNIQUE KEY unique_class_section (class_id, name)
 );
 
+-- Materialized per-class statistics for /api/school/class-wise-statistics (see class_stats.py;
+-- refreshed as attempts start/complete, rebuild with `flask rebuild-class-stats`)
+CREATE TABLE IF NOT EXISTS class_statistics (
+    class_id INT PRIMARY KEY,
+    school_id INT NOT NULL,
+    total_students INT NOT NULL DEFAULT 0,
+    total_tasks_completed INT NOT NULL DEFAULT 0,
+    students_attempted_all_tasks INT NOT NULL DEFAULT 0,
+    students_completed_all_tasks INT NOT NULL DEFAULT 0,
+    reading_avg DECIMAL(10,2), reading_min INT, reading_max INT,
+    reading_attempted INT NOT NULL DEFAULT 0, reading_completed INT NOT NULL DEFAULT 0,
+    math_avg DECIMAL(10,2), math_min INT, math_max INT,
+    math_attempted INT NOT NULL DEFAULT 0, math_completed INT NOT NULL DEFAULT 0,
+    aptitude_avg DECIMAL(10,2), aptitude_min INT, aptitude_max INT,
+    aptitude_attempted INT NOT NULL DEFAULT 0, aptitude_completed INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_class_statistics_school (school_id),
+    FOREIGN KEY (class_id) REFERENCES school_classes(id) ON DELETE CASCADE
+);
+
 -- Map section to assigned assessments (by task_name from tasks table)
 CREATE TABLE IF NOT EXISTS section_assessments (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+
+
+class PoolTimeout(mysql.connector.Error):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Small thread-safe MySQL connection pool with health checks and recycling."""
+
+    def __init__(self, config, size=5, timeout=10.0, recycle=1800, ping_on_borrow=True, wrap_cursor=None):
+        self.config = dict(config)
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self.recycle = int(recycle)
+        self.ping_on_borrow = ping_on_borrow
+        # Optional hook applied to every cursor handed out (e.g. for query timing)
+        self.wrap_cursor = wrap_cursor
+        self._idle = deque()
+        self._created = {}
+        self._in_use = 0
+        self._lock = threading.Condition()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    def _open(self):
+        raw = mysql.connector.connect(**self.config)
+        self._created[id(raw)] = time.monotonic()
+        return raw
+
+    def _discard(self, raw):
+        self._created.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _is_stale(self, raw):
+        created = self._created.get(id(raw), 0)
+        return self.recycle > 0 and time.monotonic() - created > self.recycle
+
+    def _healthy(self, raw):
+        if not self.ping_on_borrow:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Borrow a raw connection, waiting up to the checkout timeout."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._lock:
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(msg=f"No database connection available after {self.timeout}s")
+                self._lock.wait(remaining)
+            raw = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            waited = time.monotonic() - started
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_last = waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            if raw is not None and (self._is_stale(raw) or not self._healthy(raw)):
+                self._discard(raw)
+                raw = None
+            if raw is None:
+                raw = self._open()
+            return raw
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, raw):
+        """Return a borrowed connection, rolling back anything left uncommitted."""
+        keep = True
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            keep = False
+        if keep and self._is_stale(raw):
+            keep = False
+        if not keep:
+            self._discard(raw)
+        with self._lock:
+            self._in_use -= 1
+            if keep:
+                self._idle.append(raw)
+            self._lock.notify()
+
+    def connection(self, request_bound=False):
+        """Borrow a connection wrapped so that close() hands it back to the pool."""
+        return PooledConnection(self, self.acquire(), request_bound)
+
+    def stats(self):
+        """Gauges for monitoring: connections in use/idle and checkout wait times."""
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'checkout_wait_last_ms': round(self._wait_last * 1000, 2),
+                'checkout_wait_max_ms': round(self._wait_max * 1000, 2),
+                'checkout_wait_avg_ms': round(self._wait_total * 1000 / self._checkouts, 2) if self._checkouts else 0.0,
+            }
+
+
+class PooledConnection:
+    """Proxy around a pooled connection.
+
+    Request-bound connections ignore close() so that every helper in a request
+    can share them; the Flask teardown hook calls release() instead.
+    """
+
+    def __init__(self, pool, raw, request_bound=False):
+        self._pool = pool
+        self._raw = raw
+        self._request_bound = request_bound
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise mysql.connector.errors.OperationalError(msg="Connection already returned to the pool")
+        return getattr(raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        wrap = self._pool.wrap_cursor
+        return wrap(cursor) if wrap is not None else cursor
+
+    def close(self):
+        if not self._request_bound:
+            self.release()
+
+    def release(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
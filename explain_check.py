@@ -0,0 +1,85 @@
+# EXPLAIN checker for the hot query shapes in app.py.
+#
+# Each entry is a representative copy of a query the app runs on every request
+# or autosave. `flask explain-check` runs EXPLAIN on each and reports any table
+# the optimizer would read with a full scan (type ALL). Parameter values only
+# need to have the right type; the plan does not depend on matching rows.
+
+HOT_QUERIES = [
+    ('active attempt lookup', """
+        SELECT id, attempt_number, status FROM user_task_attempts
+        WHERE user_id = %s AND task_id = %s
+        ORDER BY attempt_number DESC
+    """, (1, 1)),
+    ('in-progress attempt with typing progress', """
+        SELECT uta.id, uta.attempt_number, tp.text, tp.timer, tp.updated_at
+        FROM user_task_attempts uta
+        LEFT JOIN typing_progress tp ON tp.attempt_id = uta.id
+        WHERE uta.user_id = %s AND uta.task_id = %s AND uta.status = 'In Progress'
+        ORDER BY tp.updated_at DESC
+        LIMIT 1
+    """, (1, 1)),
+    ('comprehension progress by attempt', "SELECT * FROM comprehension_progress WHERE attempt_id = %s", (1,)),
+    ('mathematical comprehension progress by attempt',
+     "SELECT * FROM mathematical_comprehension_progress WHERE attempt_id = %s", (1,)),
+    ('aptitude progress by attempt', "SELECT * FROM aptitude_progress WHERE attempt_id = %s", (1,)),
+    ('writing sample by attempt', "SELECT * FROM writing_samples WHERE attempt_id = %s", (1,)),
+    ('user task statuses', "SELECT task_name, status FROM user_tasks WHERE user_id = %s", (1,)),
+    ('demographics by user', "SELECT * FROM demographics WHERE user_id = %s", (1,)),
+    ('school parents', """
+        SELECT id, name, email FROM users
+        WHERE school_id = %s AND user_type = 'parent'
+        ORDER BY created_at DESC
+    """, (1,)),
+    ('children of a parent', """
+        SELECT id, name FROM users
+        WHERE parent_id = %s AND user_type = 'child'
+        ORDER BY name
+    """, (1,)),
+    ('children pending a parent email', """
+        SELECT id, name FROM users
+        WHERE pending_parent_email = %s AND user_type = 'child'
+    """, ('parent@example.com',)),
+    ('students of a class', """
+        SELECT DISTINCT u.id
+        FROM users u
+        JOIN class_sections cs ON u.section_id = cs.id
+        WHERE cs.class_id = %s AND u.user_type = 'child' AND u.school_id = %s
+    """, (1, 1)),
+    ('reading tasks for a class', """
+        SELECT * FROM reading_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+    ('reading comprehension tasks for a class', """
+        SELECT * FROM reading_comprehension_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+    ('typing tasks for a class', """
+        SELECT * FROM typing_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+    ('mathematical comprehension tasks for a class', """
+        SELECT * FROM mathematical_comprehension_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+    ('aptitude tasks for a class', """
+        SELECT * FROM aptitude_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+    ('writing tasks for a class', """
+        SELECT * FROM writing_tasks WHERE class_level = %s ORDER BY difficulty_level, class_level
+    """, (5,)),
+]
+
+
+def check(conn):
+    """Runs EXPLAIN on every hot query; returns [(query name, table, plan row)] for full scans."""
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for name, sql, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN " + sql, params)
+            for row in cursor.fetchall():
+                plan = {key.lower(): value for key, value in row.items()}
+                table = plan.get('table') or ''
+                # Derived tables and unions are materialized results, not base table scans
+                if plan.get('type') == 'ALL' and not table.startswith('<'):
+                    problems.append((name, table, plan))
+    finally:
+        cursor.close()
+    return problems
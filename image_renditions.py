@@ -0,0 +1,167 @@
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # the web app only needs rendition names; the worker needs Pillow
+    Image = ImageOps = None
+
+from job_queue import JobQueue
+
+# Review renditions of uploaded writing samples.
+#
+# Handwriting photos arrive at full phone resolution. Saving a writing_samples
+# row queues an image_jobs row; the worker (`flask worker`) applies
+# the EXIF orientation, then writes a 'review' and a 'thumb' JPEG without EXIF
+# metadata through the upload store and records the dimensions in
+# image_renditions. The originals are kept untouched as research data.
+# /uploads/<name>?size=review|thumb serves a rendition once it exists and the
+# original until then.
+
+RENDITIONS = {
+    'review': 1600,  # longest edge in pixels
+    'thumb': 320,
+}
+JPEG_QUALITY = 82
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS image_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        filename VARCHAR(255) NOT NULL UNIQUE,
+        status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        last_error TEXT NULL,
+        available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        locked_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP NULL,
+        INDEX idx_image_jobs_status_available (status, available_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+RENDITIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS image_renditions (
+        filename VARCHAR(255) PRIMARY KEY,
+        width INT NOT NULL,
+        height INT NOT NULL,
+        review_width INT NOT NULL,
+        review_height INT NOT NULL,
+        review_bytes INT NOT NULL,
+        thumb_width INT NOT NULL,
+        thumb_height INT NOT NULL,
+        thumb_bytes INT NOT NULL,
+        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+COLUMNS = [
+    'width', 'height', 'review_width', 'review_height', 'review_bytes',
+    'thumb_width', 'thumb_height', 'thumb_bytes',
+]
+
+UPSERT_SQL = f"""
+    INSERT INTO image_renditions (filename, {', '.join(COLUMNS)})
+    VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})
+    ON DUPLICATE KEY UPDATE {', '.join(f'{col}=VALUES({col})' for col in COLUMNS)}
+"""
+
+QUEUE = JobQueue('image_jobs', ['filename'])
+
+# EXIF orientations that rotate the image by 90 degrees
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+def ensure_tables(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(JOBS_DDL)
+        cursor.execute(RENDITIONS_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def enqueue(cursor, filename):
+    """Queues an uploaded image for renditions (the caller commits with the writing_samples row)."""
+    cursor.execute("""
+        INSERT INTO image_jobs (filename) VALUES (%s)
+        ON DUPLICATE KEY UPDATE status = 'pending', attempts = 0, available_at = NOW()
+    """, (filename,))
+
+
+def enqueue_missing(conn):
+    """Queues every writing sample that has never had a job; returns the count."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT IGNORE INTO image_jobs (filename)
+            SELECT DISTINCT ws.filename FROM writing_samples ws
+            LEFT JOIN image_jobs j ON j.filename = ws.filename
+            WHERE ws.filename IS NOT NULL AND j.id IS NULL
+        """)
+        count = cursor.rowcount
+        conn.commit()
+    finally:
+        cursor.close()
+    return count
+
+
+def rendition_name(filename, size):
+    return f"{os.path.splitext(filename)[0]}_{size}.jpg"
+
+
+def render(path):
+    """Returns (width, height, {size: PIL image}) for the image at path, with EXIF orientation applied."""
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    with Image.open(path) as im:
+        width, height = im.size
+        if im.getexif().get(0x0112) in _TRANSPOSED:
+            width, height = height, width
+        # JPEG decoders can scale down by 1/2-1/8 while decoding, which is most of the work for large photos
+        im.draft('RGB', (RENDITIONS['review'], RENDITIONS['review']))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != 'RGB':
+            im = im.convert('RGB')
+        renditions = {}
+        for size, edge in RENDITIONS.items():
+            copy = im.copy()
+            copy.thumbnail((edge, edge), Image.LANCZOS)
+            renditions[size] = copy
+    return width, height, renditions
+
+
+def process(conn, storage, job):
+    """Renders one claimed job and records the result or the failure."""
+    cursor = conn.cursor()
+    try:
+        try:
+            located = storage.locate(conn, job['filename'])
+            if not located:
+                raise FileNotFoundError(f"file {job['filename']!r} not found")
+            width, height, renditions = render(located[0])
+            row = {'width': width, 'height': height}
+            for size, image in renditions.items():
+                fd, tmp_path = tempfile.mkstemp(suffix='.jpg')
+                os.close(fd)
+                try:
+                    # No exif= argument, so no metadata (GPS, device) is written
+                    image.save(tmp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                    storage.save_file(cursor, rendition_name(job['filename'], size), tmp_path, located[3])
+                    row[f'{size}_bytes'] = os.path.getsize(tmp_path)
+                finally:
+                    os.remove(tmp_path)
+                row[f'{size}_width'], row[f'{size}_height'] = image.size
+
+            cursor.execute(UPSERT_SQL, [job['filename']] + [row[col] for col in COLUMNS])
+            QUEUE.done(cursor, job)
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Image job {job['id']} ({job['filename']}) error: {e}")
+            QUEUE.failed(cursor, job, e, retry=not isinstance(e, FileNotFoundError))
+            conn.commit()
+            return False
+    finally:
+        cursor.close()
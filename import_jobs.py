@@ -0,0 +1,204 @@
+import json
+import os
+import secrets
+import shutil
+
+from openpyxl import load_workbook
+
+import class_stats
+import student_import
+from job_queue import JobQueue
+
+# Background student imports.
+#
+# The upload request only stores the spreadsheet under instance/imports and
+# queues an import_jobs row, then returns the job id. The worker (`flask
+# worker`) imports it with student_import in committed chunks, updating the
+# job's progress (last spreadsheet row, counts, row errors) inside each chunk's
+# transaction. A job interrupted by a worker restart is reclaimed by the queue
+# and resumes after the last committed row, so no student is added twice.
+# When a run added students, the section's class statistics are recomputed.
+# Schools poll /api/school/import-jobs/<id> for progress.
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS import_jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        school_id INT NOT NULL,
+        section_id INT NOT NULL,
+        file_path VARCHAR(255) NOT NULL,
+        original_name VARCHAR(255) NOT NULL,
+        status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        last_error TEXT NULL,
+        available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        locked_at TIMESTAMP NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP NULL,
+        finished_at TIMESTAMP NULL,
+        total_rows INT NULL,
+        last_row INT NOT NULL DEFAULT 1,
+        rows_added INT NOT NULL DEFAULT 0,
+        rows_failed INT NOT NULL DEFAULT 0,
+        row_errors MEDIUMTEXT NULL,
+        INDEX idx_import_jobs_status_available (status, available_at),
+        INDEX idx_import_jobs_school (school_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Progress is written with every chunk, which doubles as the heartbeat, so a
+# job is only reclaimed when its worker has stopped for a few minutes
+QUEUE = JobQueue(
+    'import_jobs',
+    ['school_id', 'section_id', 'file_path', 'total_rows', 'last_row', 'rows_added', 'rows_failed', 'row_errors'],
+    max_attempts=3,
+    stale_minutes=5,
+)
+
+
+def ensure_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(JOBS_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def create(conn, folder, school_id, section_id, stream, original_name):
+    """Stores an uploaded spreadsheet and queues its import; returns the job id."""
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{secrets.token_hex(16)}.xlsx")
+    with open(path, 'wb') as fh:
+        shutil.copyfileobj(stream, fh, 64 * 1024)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO import_jobs (school_id, section_id, file_path, original_name)
+            VALUES (%s, %s, %s, %s)
+        """, (school_id, section_id, path, original_name[:255]))
+        job_id = cursor.lastrowid
+        conn.commit()
+    except Exception:
+        os.remove(path)
+        raise
+    finally:
+        cursor.close()
+    return job_id
+
+
+def _count_rows(path):
+    """Data rows in the first sheet, from the sheet's recorded dimensions (used for progress only)."""
+    workbook = load_workbook(path, read_only=True)
+    try:
+        sheet = workbook.worksheets[0] if workbook.worksheets else None
+        return max((sheet.max_row or 1) - 1, 0) if sheet is not None else 0
+    finally:
+        workbook.close()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def process(conn, job, on_moved_parents=None):
+    """Runs (or resumes) one claimed import job; returns True when it finished."""
+    result = student_import.ImportResult()
+    result.added = job['rows_added']
+    result.failed = job['rows_failed']
+    result.errors = json.loads(job['row_errors'] or '[]')
+
+    def checkpoint(cursor, last_row, result):
+        cursor.execute("""
+            UPDATE import_jobs
+            SET last_row = %s, rows_added = %s, rows_failed = %s, row_errors = %s, locked_at = NOW()
+            WHERE id = %s
+        """, (last_row, result.added, result.failed, json.dumps(result.errors), job['id']))
+
+    cursor = conn.cursor()
+    try:
+        try:
+            if job['total_rows'] is None:
+                cursor.execute(
+                    "UPDATE import_jobs SET total_rows = %s, started_at = NOW() WHERE id = %s",
+                    (_count_rows(job['file_path']), job['id'])
+                )
+                conn.commit()
+            with open(job['file_path'], 'rb') as fh:
+                rows = (
+                    (number, row) for number, row in student_import.read_xlsx(fh)
+                    if number > job['last_row']
+                )
+                student_import.import_students(
+                    conn, job['school_id'], job['section_id'], rows, result=result, checkpoint=checkpoint
+                )
+            QUEUE.done(cursor, job)
+            conn.commit()
+            _remove(job['file_path'])
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Import job {job['id']} error: {e}")
+            # A file that cannot be read will not become readable on a retry
+            permanent = isinstance(e, (student_import.ImportFileError, FileNotFoundError))
+            QUEUE.failed(cursor, job, e, retry=not permanent)
+            conn.commit()
+            if permanent or job['attempts'] >= QUEUE.max_attempts:
+                _remove(job['file_path'])
+            return False
+    finally:
+        cursor.close()
+        if result.added > job['rows_added']:
+            _refresh_class_statistics(conn, job)
+        if result.moved_parents and on_moved_parents:
+            on_moved_parents()
+
+
+def _refresh_class_statistics(conn, job):
+    try:
+        class_stats.refresh_for_section(conn, job['section_id'])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Import job {job['id']} class statistics error: {e}")
+
+
+def status(conn, job_id, school_id):
+    """Progress of one of a school's import jobs, or None if it does not exist."""
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, section_id, original_name, status, total_rows, last_row, rows_added, rows_failed,
+                   row_errors, last_error, created_at, started_at, finished_at,
+                   TIMESTAMPDIFF(SECOND, started_at, COALESCE(finished_at, NOW())) AS elapsed
+            FROM import_jobs
+            WHERE id = %s AND school_id = %s
+        """, (job_id, school_id))
+        job = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not job:
+        return None
+    rows_done = job['last_row'] - 1
+    total = job['total_rows']
+    eta = None
+    if job['status'] in ('pending', 'running') and total and rows_done > 0 and job['elapsed']:
+        eta = round(job['elapsed'] / rows_done * max(total - rows_done, 0))
+    return {
+        'id': job['id'],
+        'section_id': job['section_id'],
+        'filename': job['original_name'],
+        'status': job['status'],
+        'total_rows': total,
+        'rows_done': rows_done,
+        'added': job['rows_added'],
+        'failed': job['rows_failed'],
+        'errors': sorted(json.loads(job['row_errors'] or '[]'), key=lambda error: error['row']),
+        'error': job['last_error'] if job['status'] == 'failed' else None,
+        'eta_seconds': eta,
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+    }
@@ -0,0 +1,134 @@
+import time
+
+# Database-backed job queues for the background worker (`flask worker`).
+#
+# Each queue is a table with the columns below plus its own payload columns.
+# Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several workers
+# can share a queue; failed jobs are retried with exponential backoff and
+# jobs left running by a crashed worker are reclaimed after stale_minutes
+# (or marked failed if that was their last attempt).
+#
+#   id INT AUTO_INCREMENT PRIMARY KEY,
+#   status ENUM('pending', 'running', 'done', 'failed') NOT NULL DEFAULT 'pending',
+#   attempts INT NOT NULL DEFAULT 0,
+#   last_error TEXT NULL,
+#   available_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+#   locked_at TIMESTAMP NULL,
+#   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+#   finished_at TIMESTAMP NULL,
+#   INDEX (status, available_at)
+
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+
+class JobQueue:
+    """One queue table; `columns` are the payload columns returned with a claimed job."""
+
+    def __init__(self, table, columns, max_attempts=5, retry_base_seconds=30, stale_minutes=15):
+        self.table = table
+        self.columns = columns
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.stale_minutes = stale_minutes
+
+    def claim(self, conn):
+        """Marks the next due job running and returns it as a dict, or None when the queue is empty."""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # A job whose worker died on its last attempt is given up on like any other failure
+            cursor.execute(f"""
+                UPDATE {self.table}
+                SET status = IF(attempts >= %s, 'failed', 'pending'),
+                    last_error = IF(attempts >= %s, 'Worker stopped during the last attempt', last_error),
+                    finished_at = IF(attempts >= %s, NOW(), finished_at),
+                    locked_at = NULL
+                WHERE status = 'running' AND locked_at < NOW() - INTERVAL {int(self.stale_minutes)} MINUTE
+            """, (self.max_attempts,) * 3)
+            cursor.execute(f"""
+                SELECT id, attempts, {', '.join(self.columns)} FROM {self.table}
+                WHERE status = 'pending' AND available_at <= NOW()
+                ORDER BY available_at, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """)
+            job = cursor.fetchone()
+            if job:
+                cursor.execute(f"""
+                    UPDATE {self.table} SET status = 'running', locked_at = NOW(), attempts = attempts + 1
+                    WHERE id = %s
+                """, (job['id'],))
+                job['attempts'] += 1
+            conn.commit()
+        finally:
+            cursor.close()
+        return job
+
+    def done(self, cursor, job):
+        """Marks a job finished (the caller commits with the job's results)."""
+        cursor.execute(f"""
+            UPDATE {self.table} SET status = 'done', last_error = NULL, locked_at = NULL, finished_at = NOW()
+            WHERE id = %s
+        """, (job['id'],))
+
+    def failed(self, cursor, job, error, retry=True):
+        """Schedules a retry with backoff, or gives up after max_attempts or when retry is False (the caller commits)."""
+        if not retry or job['attempts'] >= self.max_attempts:
+            cursor.execute(f"""
+                UPDATE {self.table} SET status = 'failed', last_error = %s, locked_at = NULL, finished_at = NOW()
+                WHERE id = %s
+            """, (str(error)[:2000], job['id']))
+        else:
+            cursor.execute(f"""
+                UPDATE {self.table}
+                SET status = 'pending', last_error = %s, locked_at = NULL,
+                    available_at = NOW() + INTERVAL %s SECOND
+                WHERE id = %s
+            """, (str(error)[:2000], self.retry_base_seconds * 2 ** (job['attempts'] - 1), job['id']))
+
+    def backlog(self, conn):
+        """Queue depth: job counts by status and the age in seconds of the oldest pending job."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status")
+            counts = {status: 0 for status in STATUSES}
+            counts.update({status: count for status, count in cursor.fetchall()})
+            cursor.execute(f"SELECT TIMESTAMPDIFF(SECOND, MIN(created_at), NOW()) FROM {self.table} WHERE status = 'pending'")
+            oldest = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+        counts['oldest_pending_seconds'] = int(oldest) if oldest is not None else None
+        return counts
+
+
+def run(connect, workers, once=False, poll_interval=5.0):
+    """Processes jobs until stopped (or until every queue is empty when once=True).
+
+    workers is a list of (queue, process) pairs; process(conn, job) returns True
+    on success. Queues are polled in turn. Returns (done, failed).
+    """
+    done = failed = 0
+    while True:
+        conn = connect()
+        if not conn:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        claimed = False
+        try:
+            for queue, process in workers:
+                job = queue.claim(conn)
+                if not job:
+                    continue
+                claimed = True
+                if process(conn, job):
+                    done += 1
+                else:
+                    failed += 1
+        finally:
+            conn.close()
+        if not claimed:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return done, failed
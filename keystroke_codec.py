@@ -0,0 +1,240 @@
+import json
+import zlib
+
+# Compact columnar encoding for typing keystroke logs.
+#
+# The typing page records one event per keydown:
+#   {"key", "value", "selectionStart", "selectionEnd", "time", "timeDiff"}
+# where value is the whole textarea content. Events of exactly that shape are
+# split into columns: a flags byte per event, key-dictionary indexes, time deltas,
+# selection deltas and value edits (common prefix/suffix + inserted text), all as
+# varints. Anything else is kept verbatim as JSON, so decoding is always exact.
+
+MAGIC = b'KS'
+VERSION = 1
+MODE_COLUMNS = 0
+MODE_COLUMNS_ZLIB = 1
+MODE_TEXT_ZLIB = 2
+
+FIELDS = ('key', 'value', 'selectionStart', 'selectionEnd', 'time', 'timeDiff')
+
+# Per-event flag bits
+RAW = 1               # event stored as JSON in the raw column
+SEL_COLLAPSED = 2     # selectionEnd == selectionStart
+VALUE_SAME = 4        # value unchanged from the previous event
+TIMEDIFF_DERIVED = 8  # timeDiff == time - previous time
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _put_signed(out, n):
+    _put_varint(out, (n << 1) if n >= 0 else ((-n << 1) - 1))
+
+
+def _put_bytes(out, data):
+    _put_varint(out, len(data))
+    out.extend(data)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def signed(self):
+        n = self.varint()
+        return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+
+    def bytes(self):
+        size = self.varint()
+        data = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return bytes(data)
+
+
+def _is_int(value):
+    return type(value) is int
+
+
+def _is_standard(event):
+    return (
+        isinstance(event, dict)
+        and tuple(event) == FIELDS
+        and isinstance(event['key'], str)
+        and isinstance(event['value'], str)
+        and all(_is_int(event[field]) for field in FIELDS[2:])
+    )
+
+
+def _common_prefix(a, b):
+    # Binary search on slice equality keeps the comparisons in C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def encode(events, compress=True):
+    """Encodes a list of keystroke events into bytes."""
+    flags, keys, times, diffs, sels, edits, texts, raw = (bytearray() for _ in range(8))
+    key_index = {}
+    prev_time = prev_sel = None
+    prev_value = ''
+    for event in events:
+        if not _is_standard(event):
+            flags.append(RAW)
+            _put_bytes(raw, json.dumps(event, ensure_ascii=False).encode('utf-8'))
+            continue
+        flag = 0
+        _put_varint(keys, key_index.setdefault(event['key'], len(key_index)))
+
+        time = event['time']
+        _put_signed(times, time - (prev_time if prev_time is not None else 0))
+        expected_diff = time - prev_time if prev_time is not None else 0
+        if event['timeDiff'] == expected_diff:
+            flag |= TIMEDIFF_DERIVED
+        else:
+            _put_signed(diffs, event['timeDiff'] - expected_diff)
+        prev_time = time
+
+        start, end = event['selectionStart'], event['selectionEnd']
+        _put_signed(sels, start - (prev_sel if prev_sel is not None else 0))
+        if end == start:
+            flag |= SEL_COLLAPSED
+        else:
+            _put_signed(sels, end - start)
+        prev_sel = start
+
+        value = event['value']
+        if value == prev_value:
+            flag |= VALUE_SAME
+        else:
+            prefix = _common_prefix(prev_value, value)
+            suffix = _common_suffix(prev_value, value, min(len(prev_value), len(value)) - prefix)
+            _put_varint(edits, prefix)
+            _put_varint(edits, suffix)
+            _put_bytes(texts, value[prefix:len(value) - suffix].encode('utf-8'))
+        prev_value = value
+        flags.append(flag)
+
+    payload = bytearray()
+    _put_varint(payload, len(events))
+    _put_varint(payload, len(key_index))
+    for key in key_index:
+        _put_bytes(payload, key.encode('utf-8'))
+    for column in (flags, keys, times, diffs, sels, edits, texts, raw):
+        _put_bytes(payload, column)
+
+    mode = MODE_COLUMNS
+    if compress:
+        packed = zlib.compress(bytes(payload), 9)
+        if len(packed) < len(payload):
+            payload, mode = packed, MODE_COLUMNS_ZLIB
+    return MAGIC + bytes((VERSION, mode)) + bytes(payload)
+
+
+def decode(blob):
+    """Decodes bytes from encode() back into the original list of events."""
+    if blob[:2] != MAGIC or blob[2] != VERSION:
+        raise ValueError("Not an encoded keystroke log")
+    mode = blob[3]
+    payload = blob[4:]
+    if mode == MODE_TEXT_ZLIB:
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+    if mode == MODE_COLUMNS_ZLIB:
+        payload = zlib.decompress(payload)
+    elif mode != MODE_COLUMNS:
+        raise ValueError(f"Unknown keystroke encoding mode {mode}")
+
+    header = _Reader(payload)
+    count = header.varint()
+    key_list = [header.bytes().decode('utf-8') for _ in range(header.varint())]
+    flags, keys, times, diffs, sels, edits, texts, raw = (header.bytes() for _ in range(8))
+    keys, times, diffs, sels, edits, texts, raw = (_Reader(c) for c in (keys, times, diffs, sels, edits, texts, raw))
+
+    events = []
+    prev_time = prev_sel = None
+    prev_value = ''
+    for i in range(count):
+        flag = flags[i]
+        if flag & RAW:
+            events.append(json.loads(raw.bytes().decode('utf-8')))
+            continue
+        key = key_list[keys.varint()]
+
+        time = times.signed() + (prev_time if prev_time is not None else 0)
+        expected_diff = time - prev_time if prev_time is not None else 0
+        time_diff = expected_diff if flag & TIMEDIFF_DERIVED else expected_diff + diffs.signed()
+        prev_time = time
+
+        start = sels.signed() + (prev_sel if prev_sel is not None else 0)
+        end = start if flag & SEL_COLLAPSED else start + sels.signed()
+        prev_sel = start
+
+        if flag & VALUE_SAME:
+            value = prev_value
+        else:
+            prefix, suffix = edits.varint(), edits.varint()
+            inserted = texts.bytes().decode('utf-8')
+            value = prev_value[:prefix] + inserted + prev_value[len(prev_value) - suffix:]
+        prev_value = value
+
+        events.append({
+            'key': key, 'value': value, 'selectionStart': start,
+            'selectionEnd': end, 'time': time, 'timeDiff': time_diff,
+        })
+    return events
+
+
+def pack(keystrokes):
+    """Encodes a keystroke log as sent by clients (a JSON string); None/'' gives None.
+
+    Text that is not a JSON list is stored compressed as-is.
+    """
+    if not keystrokes:
+        return None
+    try:
+        events = json.loads(keystrokes)
+    except ValueError:
+        events = None
+    if not isinstance(events, list):
+        return MAGIC + bytes((VERSION, MODE_TEXT_ZLIB)) + zlib.compress(json.dumps(keystrokes).encode('utf-8'), 9)
+    return encode(events)
+
+
+def unpack(blob):
+    """Returns the keystroke log stored by pack() as a JSON string."""
+    if blob is None:
+        return None
+    data = decode(bytes(blob))
+    return data if isinstance(data, str) else json.dumps(data)
@@ -0,0 +1,157 @@
+import json
+
+from keystroke_codec import pack, decode
+
+# Append-only keystroke store: clients send only the events after the last
+# acknowledged sequence number and the full log is rebuilt on read.
+
+TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS typing_keystroke_chunks (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        attempt_id INT NOT NULL,
+        seq_start INT NOT NULL,
+        seq_end INT NOT NULL,
+        events LONGTEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE,
+        UNIQUE KEY unique_attempt_chunk (attempt_id, seq_start)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Upper bound on events accepted in one chunk
+MAX_CHUNK_EVENTS = 5000
+
+
+def ensure_schema(conn):
+    """Creates the chunk table and typing_progress.keystrokes_packed if missing."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL)
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'typing_progress' AND column_name = 'keystrokes_packed'
+        """)
+        if not cursor.fetchone()[0]:
+            cursor.execute("ALTER TABLE typing_progress ADD COLUMN keystrokes_packed LONGBLOB NULL AFTER keystrokes")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _contiguous_end(ranges):
+    """Length of the gap-free prefix covered by (seq_start, seq_end) ranges."""
+    end = 0
+    for seq_start, seq_end in sorted(ranges):
+        if seq_start > end:
+            break
+        end = max(end, seq_end)
+    return end
+
+
+def append_chunk(conn, attempt_id, seq_start, events):
+    """Stores events[i] as sequence number seq_start + i and returns the next expected seq.
+
+    Chunks are keyed by (attempt_id, seq_start): a retried chunk is a no-op and a
+    longer chunk from the same seq (a resend with newer events) replaces the shorter
+    one. Chunks may arrive out of order; the returned value is the end of the
+    gap-free prefix, which is where the client should resume sending from.
+    """
+    cursor = conn.cursor()
+    try:
+        if events:
+            # events is assigned before seq_end so the comparison sees the stored seq_end
+            cursor.execute("""
+                INSERT INTO typing_keystroke_chunks (attempt_id, seq_start, seq_end, events)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    events = IF(VALUES(seq_end) > seq_end, VALUES(events), events),
+                    seq_end = GREATEST(seq_end, VALUES(seq_end))
+            """, (attempt_id, seq_start, seq_start + len(events), json.dumps(events)))
+        cursor.execute("""
+            SELECT seq_start, seq_end FROM typing_keystroke_chunks
+            WHERE attempt_id = %s
+        """, (attempt_id,))
+        return _contiguous_end(cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def load_keystrokes(conn, attempt_id):
+    """Rebuilds an attempt's keystroke log from its chunks.
+
+    Returns (events, next_seq), or None if the attempt has no chunks. Overlapping
+    chunks (a retry that re-sent some events) contribute each sequence number once;
+    events past a gap are kept in seq order so nothing recorded is lost.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT seq_start, seq_end, events FROM typing_keystroke_chunks
+            WHERE attempt_id = %s
+            ORDER BY seq_start
+        """, (attempt_id,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not rows:
+        return None
+    by_seq = {}
+    for seq_start, _, events in rows:
+        for offset, event in enumerate(json.loads(events)):
+            by_seq.setdefault(seq_start + offset, event)
+    events = [by_seq[seq] for seq in sorted(by_seq)]
+    return events, _contiguous_end((row[0], row[1]) for row in rows)
+
+
+def drop_chunks(conn, attempt_id):
+    """Removes an attempt's chunks once its log has been written to typing_progress."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM typing_keystroke_chunks WHERE attempt_id = %s", (attempt_id,))
+    finally:
+        cursor.close()
+
+
+def pack_legacy_rows(conn, batch_size=200):
+    """Converts typing_progress.keystrokes JSON into keystrokes_packed, one batch per commit.
+
+    Each row is decoded again and compared before its JSON copy is cleared.
+    Returns (rows converted, bytes before, bytes after).
+    """
+    converted = before = after = 0
+    last_id = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT id, keystrokes FROM typing_progress
+                WHERE id > %s AND keystrokes IS NOT NULL AND keystrokes_packed IS NULL
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for row_id, keystrokes in rows:
+                last_id = row_id
+                packed = pack(keystrokes)
+                if packed is None:
+                    continue
+                try:
+                    original = json.loads(keystrokes)
+                except ValueError:
+                    original = keystrokes
+                if decode(packed) != original:
+                    print(f"Keystroke round trip mismatch for typing_progress.id={row_id}, left as JSON")
+                    continue
+                cursor.execute(
+                    "UPDATE typing_progress SET keystrokes_packed = %s, keystrokes = NULL WHERE id = %s",
+                    (packed, row_id),
+                )
+                converted += 1
+                before += len(keystrokes.encode('utf-8'))
+                after += len(packed)
+            conn.commit()
+    finally:
+        cursor.close()
+    return converted, before, after
@@ -0,0 +1,147 @@
+# Versioned schema migrations.
+#
+# Each migration is (version, name, steps). Steps are idempotent - they check
+# information_schema before changing anything - so a migration that failed half
+# way can simply be run again. Applied versions are recorded in schema_migrations.
+# Run pending migrations with `flask db-migrate`.
+
+MIGRATIONS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+
+def _table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,))
+    return cursor.fetchone()[0] > 0
+
+
+def _has_index(cursor, table, columns, unique=False):
+    """True if an index on table starts with `columns` (exactly `columns` when unique)."""
+    cursor.execute("""
+        SELECT index_name, non_unique, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for index_name, non_unique, column_name in cursor.fetchall():
+        entry = indexes.setdefault(index_name, {'unique': not non_unique, 'columns': []})
+        entry['columns'].append((column_name or '').lower())
+    wanted = [col.lower() for col in columns]
+    for entry in indexes.values():
+        if unique:
+            if entry['unique'] and entry['columns'] == wanted:
+                return True
+        elif entry['columns'][:len(wanted)] == wanted:
+            return True
+    return False
+
+
+def add_index(table, name, columns, unique=False):
+    """Step: CREATE [UNIQUE] INDEX unless an equivalent index already exists."""
+    def step(cursor):
+        if not _table_exists(cursor, table) or _has_index(cursor, table, columns, unique):
+            return
+        cursor.execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"
+        )
+    step.description = f"{'unique ' if unique else ''}index {table}({', '.join(columns)})"
+    return step
+
+
+def dedupe(table, key_columns):
+    """Step: deletes duplicate rows per key, keeping the newest (highest id), so a unique index can be added."""
+    def step(cursor):
+        if not _table_exists(cursor, table) or _has_index(cursor, table, key_columns, unique=True):
+            return
+        join = ' AND '.join(f"older.{col} = newer.{col}" for col in key_columns)
+        cursor.execute(f"""
+            DELETE older FROM {table} older
+            JOIN {table} newer ON {join} AND older.id < newer.id
+        """)
+        if cursor.rowcount:
+            print(f"  removed {cursor.rowcount} duplicate rows from {table}")
+    step.description = f"dedupe {table}({', '.join(key_columns)})"
+    return step
+
+
+PROGRESS_TABLES = [
+    'typing_progress', 'comprehension_progress', 'mathematical_comprehension_progress',
+    'aptitude_progress', 'writing_samples',
+]
+
+CONTENT_TABLES = [
+    'reading_tasks', 'reading_comprehension_tasks', 'typing_tasks',
+    'mathematical_comprehension_tasks', 'aptitude_tasks', 'writing_tasks',
+]
+
+MIGRATIONS = [
+    (1, 'Indexes for attempt lookups', [
+        add_index('user_task_attempts', 'idx_attempts_user_task_status', ['user_id', 'task_id', 'status', 'attempt_number']),
+        add_index('user_task_attempts', 'idx_attempts_task_status', ['task_id', 'status']),
+    ]),
+    (2, 'Indexes for users by school, parent and section', [
+        add_index('users', 'idx_users_school_type', ['school_id', 'user_type']),
+        add_index('users', 'idx_users_parent_type', ['parent_id', 'user_type']),
+        add_index('users', 'idx_users_section', ['section_id']),
+        add_index('users', 'idx_users_pending_parent_email', ['pending_parent_email']),
+    ]),
+    (3, 'One demographics row per user', [
+        dedupe('demographics', ['user_id']),
+        add_index('demographics', 'uniq_demographics_user', ['user_id'], unique=True),
+    ]),
+    (4, 'One progress row per attempt', [
+        step
+        for table in PROGRESS_TABLES
+        for step in (dedupe(table, ['attempt_id']),
+                     add_index(table, f'uniq_{table}_attempt', ['attempt_id'], unique=True))
+    ]),
+    (5, 'Indexes for task content by class and difficulty', [
+        add_index(table, f'idx_{table}_class_difficulty', ['class_level', 'difficulty_level'])
+        for table in CONTENT_TABLES
+    ]),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE_DDL)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending(conn):
+    """Returns the migrations that have not been applied yet."""
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+    finally:
+        cursor.close()
+    return [migration for migration in MIGRATIONS if migration[0] not in done]
+
+
+def migrate(conn):
+    """Applies pending migrations in version order; returns the versions applied."""
+    applied = []
+    cursor = conn.cursor()
+    try:
+        done = applied_versions(cursor)
+        for version, name, steps in MIGRATIONS:
+            if version in done:
+                continue
+            print(f"Applying migration {version}: {name}")
+            for step in steps:
+                print(f"  {step.description}")
+                step(cursor)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+    finally:
+        cursor.close()
+    return applied
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from flask import has_request_context, session
+
+# Random Reading Aloud passage selection without ORDER BY RAND().
+#
+# The picker keeps reading task ids in memory, indexed by every age their
+# [age_min, age_max] interval covers, so a pick is a dict lookup plus a random
+# choice. Databases created from database_setup.sql have no age columns; there
+# the index is by class_level instead. The index is rebuilt when its
+# VersionSignal changes (admin edits to reading tasks) or after max_age seconds.
+#
+# Passages a user opened are remembered in their session and skipped until
+# every candidate has been seen.
+
+# Ages outside this range are treated as data errors and not indexed
+MAX_AGE = 120
+# Passages remembered per session; older ones can be served again
+SEEN_LIMIT = 100
+SESSION_KEY = 'reading_tasks_seen'
+
+
+class ReadingTaskPicker:
+    """Picks a reading task id for an age (or class level) from an in-memory interval index.
+
+    With weighted=True candidates are weighted by 1 / (1 + times served by this
+    worker), favouring passages that have been served least.
+    """
+
+    def __init__(self, connect, signal, max_age=300.0, weighted=False):
+        self._connect = connect
+        self._signal = signal
+        self._max_age = max_age
+        self._weighted = weighted
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._index = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._served = Counter()
+
+    def load(self):
+        """Rebuilds the index from reading_tasks; returns False when no connection is available."""
+        version = self._signal.current()
+        conn = self._connect()
+        if not conn:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SHOW COLUMNS FROM reading_tasks LIKE 'age_max'")
+            has_ages = cursor.fetchone() is not None
+            if has_ages:
+                cursor.execute("SELECT id, class_level, age_min, age_max FROM reading_tasks ORDER BY id")
+            else:
+                cursor.execute("SELECT id, class_level, NULL, NULL FROM reading_tasks ORDER BY id")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+        by_age, by_class = {}, {}
+        for task_id, class_level, age_min, age_max in rows:
+            if class_level is not None:
+                by_class.setdefault(int(class_level), []).append(task_id)
+            if age_min is None or age_max is None:
+                continue
+            for age in range(max(int(age_min), 0), min(int(age_max), MAX_AGE) + 1):
+                by_age.setdefault(age, []).append(task_id)
+        index = {
+            'has_ages': has_ages,
+            'all': tuple(row[0] for row in rows),
+            'by_age': {age: tuple(ids) for age, ids in by_age.items()},
+            'by_class': {level: tuple(ids) for level, ids in by_class.items()},
+        }
+        with self._lock:
+            self._index = index
+            self._version = version
+            self._loaded_at = time.monotonic()
+        return True
+
+    def _stale(self):
+        return (self._index is None or self._signal.current() != self._version
+                or time.monotonic() - self._loaded_at > self._max_age)
+
+    def _ensure_fresh(self):
+        if self._stale():
+            with self._load_lock:
+                if self._stale():
+                    self.load()
+
+    def candidates(self, age=None, class_level=None):
+        """Task ids a user of this age / class level may be served.
+
+        Mirrors the old query: an age selects tasks whose interval covers it,
+        no age selects any task. Without age columns the class level is used.
+        """
+        self._ensure_fresh()
+        index = self._index or {'has_ages': False, 'all': (), 'by_age': {}, 'by_class': {}}
+        if age and index['has_ages']:
+            return index['by_age'].get(age, ())
+        if age and class_level:
+            return index['by_class'].get(class_level, ())
+        return index['all']
+
+    def pick(self, age=None, class_level=None, exclude=()):
+        """Returns a random candidate task id not in exclude (any candidate once all are excluded), or None."""
+        candidates = self.candidates(age, class_level)
+        if not candidates:
+            return None
+        if self._weighted:
+            pool = [task_id for task_id in candidates if task_id not in exclude] or candidates
+            with self._lock:
+                weights = [1.0 / (1 + self._served[task_id]) for task_id in pool]
+            task_id = random.choices(pool, weights)[0]
+        else:
+            # A few O(1) draws usually land on an unseen passage; filter only when they do not
+            task_id = None
+            for _ in range(8):
+                draw = random.choice(candidates)
+                if draw not in exclude:
+                    task_id = draw
+                    break
+            if task_id is None:
+                pool = [task_id for task_id in candidates if task_id not in exclude] or candidates
+                task_id = random.choice(pool)
+        with self._lock:
+            self._served[task_id] += 1
+        return task_id
+
+    def invalidate(self):
+        """Drops this worker's index and signals every other worker to rebuild."""
+        with self._lock:
+            self._index = None
+        try:
+            self._signal.bump()
+        except OSError as e:
+            print(f"Reading picker signal error: {e}")
+
+
+def seen(user_id):
+    """Reading task ids the logged-in user has opened (empty for anyone else)."""
+    if not has_request_context() or session.get('user_id') != user_id:
+        return set()
+    return set(session.get(SESSION_KEY) or [])
+
+
+def remember(user_id, task_id):
+    """Records that the logged-in user opened a reading task."""
+    if not has_request_context() or session.get('user_id') != user_id:
+        return
+    ids = [seen_id for seen_id in (session.get(SESSION_KEY) or []) if seen_id != task_id]
+    ids.append(task_id)
+    session[SESSION_KEY] = ids[-SEEN_LIMIT:]
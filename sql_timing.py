@@ -0,0 +1,157 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from flask import g, has_app_context, has_request_context, request
+
+# Per-request SQL timing and slow-query log.
+#
+# With SQL_TIMING=1 the connection pool wraps every cursor it hands out in a
+# TimedCursor, which times execute/executemany/callproc. Within a request the
+# query count, total database time and slowest statement are kept in g and
+# reported in a Server-Timing header (browser dev tools show it next to the
+# request). Statements, and requests, whose database time reaches SQL_SLOW_MS
+# are written as JSON lines to SQL_SLOW_LOG (or printed) with the route and a
+# fingerprint of the SQL: literals and placeholders replaced by ?, so the log
+# groups by statement shape and never holds parameter values. When timing is
+# off the pool hands out plain cursors and nothing here runs.
+
+_COMMENTS = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_PLACEHOLDERS = re.compile(r"%\(\w+\)s|%s")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalized statement text: comments dropped, literals and lists of values as ?, whitespace collapsed."""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', 'replace')
+    sql = _COMMENTS.sub(' ', sql)
+    sql = _STRINGS.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('?', sql)
+    sql = _NUMBERS.sub('?', sql)
+    sql = _LISTS.sub('(?+)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint_id(fingerprinted):
+    return hashlib.sha1(fingerprinted.encode('utf-8')).hexdigest()[:12]
+
+
+class RequestStats:
+    __slots__ = ('count', 'seconds', 'slowest_seconds', 'slowest_sql')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+
+
+class TimedCursor:
+    """Cursor proxy that reports the duration of each statement to a SqlTiming."""
+
+    __slots__ = ('_cursor', '_timing')
+
+    def __init__(self, cursor, timing):
+        self._cursor = cursor
+        self._timing = timing
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, operation, args, kwargs):
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            self._timing.record(operation, time.perf_counter() - started)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, args, kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, args, kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        return self._timed(self._cursor.callproc, procname, args, kwargs)
+
+
+class SqlTiming:
+    def __init__(self, slow_ms=200.0, log_path=None):
+        self.slow_seconds = slow_ms / 1000.0
+        self.log_path = log_path
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self.add_header)
+
+    def wrap(self, cursor):
+        return TimedCursor(cursor, self)
+
+    def record(self, sql, seconds):
+        if has_app_context():
+            stats = g.get('sql_timing')
+            if stats is None:
+                stats = g.sql_timing = RequestStats()
+            stats.count += 1
+            stats.seconds += seconds
+            if stats.slowest_sql is None or seconds > stats.slowest_seconds:
+                stats.slowest_seconds = seconds
+                stats.slowest_sql = sql
+        if seconds >= self.slow_seconds:
+            fingerprinted = fingerprint(sql)
+            self.log({
+                'type': 'query',
+                'ms': round(seconds * 1000, 1),
+                'fingerprint_id': fingerprint_id(fingerprinted),
+                'fingerprint': fingerprinted,
+            })
+
+    def add_header(self, response):
+        stats = g.pop('sql_timing', None) if has_app_context() else None
+        if stats is None:
+            return response
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} queries, slowest {stats.slowest_seconds * 1000:.1f}ms"',
+        )
+        # Many fast queries add up too (one query per row); log the request as a whole
+        if stats.seconds >= self.slow_seconds:
+            fingerprinted = fingerprint(stats.slowest_sql)
+            self.log({
+                'type': 'request',
+                'status': response.status_code,
+                'queries': stats.count,
+                'ms': round(stats.seconds * 1000, 1),
+                'slowest_ms': round(stats.slowest_seconds * 1000, 1),
+                'slowest_fingerprint_id': fingerprint_id(fingerprinted),
+                'slowest_fingerprint': fingerprinted,
+            })
+        return response
+
+    def log(self, entry):
+        entry = {'time': datetime.now().isoformat(timespec='milliseconds'), **entry}
+        if has_request_context():
+            entry.update({'route': request.endpoint, 'method': request.method, 'path': request.path})
+        else:
+            entry['route'] = None
+        line = json.dumps(entry)
+        if not self.log_path:
+            print(f"Slow SQL: {line}")
+            return
+        try:
+            with self._lock, open(self.log_path, 'a', encoding='utf-8') as fh:
+                fh.write(line + '\n')
+        except OSError as e:
+            print(f"Slow SQL log error: {e}")
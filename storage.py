@@ -0,0 +1,238 @@
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Content-addressed storage for uploaded files.
+#
+# Uploads keep their logical names (user5_20240101120000_recording.webm) - that
+# is what the database rows and /uploads/<name> URLs refer to - but the bytes
+# live once per distinct content under blobs/<aa>/<bb>/<sha256>. The
+# upload_files table maps names to blobs, so identical files (retakes,
+# re-saved progress) share one blob. Names that are not in the index are
+# served from the flat uploads folder they were written to before this
+# existed; `flask migrate-uploads` moves those into the store. Each name also
+# records the participant it belongs to, which /uploads checks before serving.
+
+TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS upload_files (
+        name VARCHAR(255) PRIMARY KEY,
+        user_id INT NULL,
+        sha256 CHAR(64) NOT NULL,
+        size BIGINT NOT NULL,
+        content_type VARCHAR(100) NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_upload_files_sha256 (sha256)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+COPY_BUFFER = 64 * 1024
+
+# Upload names are generated server-side as user<id>_... or writing_user<id>_...
+_OWNER_PREFIX = re.compile(r"^(?:writing_)?user(\d+)_")
+
+
+def owner_from_name(name):
+    """The participant id in a generated upload name, or None."""
+    match = _OWNER_PREFIX.match(name or '')
+    return int(match.group(1)) if match else None
+
+
+def ensure_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL)
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'upload_files' AND column_name = 'user_id'
+        """)
+        if not cursor.fetchone()[0]:
+            cursor.execute("ALTER TABLE upload_files ADD COLUMN user_id INT NULL AFTER name")
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+class LocalBlobStore:
+    """Blobs named by their SHA-256 under root/blobs, sharded by the first two byte pairs."""
+
+    def __init__(self, root):
+        self.root = root
+        self._tmp = os.path.join(root, 'tmp')
+
+    def path(self, sha256):
+        return os.path.join(self.root, 'blobs', sha256[:2], sha256[2:4], sha256)
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def _commit(self, tmp_path, sha256):
+        """Moves a fully written temp file into place unless the blob already exists."""
+        target = self.path(sha256)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+
+    def put_stream(self, stream):
+        """Copies a stream into the store, hashing as it goes; returns (sha256, size)."""
+        os.makedirs(self._tmp, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                while True:
+                    block = stream.read(COPY_BUFFER)
+                    if not block:
+                        break
+                    digest.update(block)
+                    size += len(block)
+                    fh.write(block)
+                fh.flush()
+                os.fsync(fh.fileno())
+            sha256 = digest.hexdigest()
+            self._commit(tmp_path, sha256)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size
+
+    def put_file(self, path):
+        """Adds an existing file without removing it (hard link, or a copy across devices); returns (sha256, size).
+
+        The file must not be written to afterwards, since a hard link shares its bytes with the blob.
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(COPY_BUFFER), b''):
+                digest.update(block)
+        sha256 = digest.hexdigest()
+        if not self.exists(sha256):
+            os.makedirs(self._tmp, exist_ok=True)
+            tmp_path = os.path.join(self._tmp, f"{sha256}.{os.getpid()}.{threading.get_ident()}")
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            self._commit(tmp_path, sha256)
+        return sha256, os.path.getsize(path)
+
+
+class UploadStorage:
+    """Logical upload names on top of a blob store, indexed in upload_files."""
+
+    def __init__(self, blobs, legacy_folder, cache_size=4096):
+        self.blobs = blobs
+        self.legacy_folder = legacy_folder
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        # name -> (path, sha256, content_type, owner user_id); names are never rebound to other content
+        self._located = OrderedDict()
+
+    def save(self, cursor, name, stream, user_id):
+        """Stores user_id's upload under `name` (the caller commits the index row); returns its sha256."""
+        sha256, size = self.blobs.put_stream(stream)
+        self._index(cursor, name, sha256, size, user_id)
+        return sha256
+
+    def save_file(self, cursor, name, path, user_id):
+        """Stores an existing file under `name`, leaving the file in place; returns its sha256.
+
+        The file must no longer change: it may be hard-linked into the store.
+        """
+        sha256, size = self.blobs.put_file(path)
+        self._index(cursor, name, sha256, size, user_id)
+        return sha256
+
+    def _index(self, cursor, name, sha256, size, user_id):
+        # The type always comes from the name's (allowlisted) extension, never from the
+        # client, so an upload cannot be served back as HTML
+        cursor.execute("""
+            INSERT INTO upload_files (name, user_id, sha256, size, content_type)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), sha256 = VALUES(sha256), size = VALUES(size),
+                                    content_type = VALUES(content_type)
+        """, (name, user_id, sha256, size, mimetypes.guess_type(name)[0]))
+        with self._lock:
+            self._located.pop(name, None)
+
+    def locate(self, conn, name):
+        """Returns (path, sha256 or None, content_type, owner user_id or None) for an upload name,
+        or None if it does not exist.
+
+        Without a connection only the cache and the flat folder are consulted.
+        """
+        if not name or os.path.basename(name) != name or name.startswith('.'):
+            return None
+        with self._lock:
+            located = self._located.get(name)
+            if located is not None:
+                self._located.move_to_end(name)
+                return located
+        row = None
+        if conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT sha256, user_id FROM upload_files WHERE name = %s", (name,))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        if row:
+            # Rows stored before types were derived from names may hold a client-sent type
+            located = (self.blobs.path(row[0]), row[0], mimetypes.guess_type(name)[0],
+                       row[1] if row[1] is not None else owner_from_name(name))
+        else:
+            legacy_path = os.path.join(self.legacy_folder, name)
+            if not os.path.isfile(legacy_path):
+                return None
+            # Not cached: the file may be migrated into the store at any time
+            return legacy_path, None, mimetypes.guess_type(name)[0], owner_from_name(name)
+        with self._lock:
+            self._located[name] = located
+            while len(self._located) > self._cache_size:
+                self._located.popitem(last=False)
+        return located
+
+    def migrate_flat_folder(self, conn, delete=True, batch=200):
+        """Moves files from the flat uploads folder into the store.
+
+        Originals are deleted only after their index rows are committed.
+        Returns (files, bytes, bytes saved by deduplication).
+        """
+        files = total = saved = 0
+        pending = []
+        cursor = conn.cursor()
+
+        def commit_batch():
+            conn.commit()
+            if delete:
+                for path in pending:
+                    os.remove(path)
+            pending.clear()
+
+        try:
+            for entry in os.scandir(self.legacy_folder):
+                if not entry.is_file():
+                    continue
+                size = entry.stat().st_size
+                sha256, _ = self.blobs.put_file(entry.path)
+                cursor.execute("SELECT COUNT(*) FROM upload_files WHERE sha256 = %s AND name <> %s", (sha256, entry.name))
+                if cursor.fetchone()[0]:
+                    saved += size
+                self._index(cursor, entry.name, sha256, size, owner_from_name(entry.name))
+                pending.append(entry.path)
+                files += 1
+                total += size
+                if len(pending) >= batch:
+                    commit_batch()
+            commit_batch()
+        finally:
+            cursor.close()
+        return files, total, saved
@@ -0,0 +1,279 @@
+import re
+
+from openpyxl import load_workbook
+
+# Bulk student import for a school section.
+#
+# Rows come from an uploaded .xlsx (read with openpyxl in read-only mode, so
+# the sheet is streamed rather than loaded whole) or from the JSON bulk
+# endpoint. They are imported in chunks: one query resolves every parent email
+# in the chunk, new parents and children are written with executemany (which
+# mysql-connector sends as one multi-row INSERT), and parent_children links
+# are filled from the children's parent_id with INSERT ... SELECT. Each chunk
+# is its own transaction; when one fails its rows are retried one at a time
+# under savepoints, so a bad row does not take the rest of its chunk with it.
+# Rows that cannot be imported are reported with their spreadsheet row number
+# instead of failing the import.
+
+CHUNK_SIZE = 500
+# Errors returned to the browser; the counts always cover every row
+MAX_REPORTED_ERRORS = 200
+
+# Column headers accepted for each field, as the school page's XLSX parser accepted them
+HEADERS = {
+    'student_name': ('student name', 'name', 'student_name'),
+    'parent_email': ('parent email', 'parent_email', 'email'),
+    'student_email': ('student email', 'student_email', 'student email address'),
+}
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class ImportFileError(Exception):
+    """The upload is not a readable workbook or lacks the required columns."""
+
+
+def _text(value):
+    return str(value).strip() if value is not None else ''
+
+
+def read_xlsx(stream):
+    """Yields (row number, row dict) from the first sheet of an .xlsx file.
+
+    Raises ImportFileError when the file cannot be read or has no name / parent email columns.
+    """
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f"Could not read the spreadsheet: {e}")
+    try:
+        sheet = workbook.worksheets[0] if workbook.worksheets else None
+        if sheet is None:
+            raise ImportFileError("The spreadsheet has no sheets")
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            raise ImportFileError("The spreadsheet is empty")
+        labels = [_text(cell).lower() for cell in header]
+        columns = {}
+        for field, names in HEADERS.items():
+            # First matching header wins, in the order the aliases are listed
+            for name in names:
+                if name in labels and labels.index(name) not in columns.values():
+                    columns[field] = labels.index(name)
+                    break
+        if 'student_name' not in columns or 'parent_email' not in columns:
+            raise ImportFileError(
+                'Columns "Student Name" (or "Name") and "Parent Email" (or "Email") are required'
+            )
+        for number, values in enumerate(rows, start=2):
+            if not values or all(value is None or _text(value) == '' for value in values):
+                continue
+            yield number, {
+                field: _text(values[index]) if index < len(values) else ''
+                for field, index in columns.items()
+            }
+    finally:
+        workbook.close()
+
+
+def rows_from_json(students):
+    """Yields (row number, row dict) from the JSON bulk endpoint's students list (1-based positions)."""
+    for number, row in enumerate(students, start=1):
+        if not isinstance(row, dict):
+            yield number, {}
+            continue
+        yield number, {
+            'student_name': _text(row.get('student_name') or row.get('name')),
+            'parent_email': _text(row.get('parent_email') or row.get('Parent Email')),
+            'student_email': _text(row.get('student_email') or row.get('Email')),
+        }
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+class ImportResult:
+    def __init__(self):
+        self.added = 0
+        self.failed = 0
+        self.errors = []
+        self.moved_parents = False
+
+    def error(self, row, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'message': message})
+
+    def as_dict(self):
+        return {'added': self.added, 'failed': self.failed, 'errors': sorted(self.errors, key=lambda error: error['row'])}
+
+
+def import_students(conn, school_id, section_id, rows, chunk_size=CHUNK_SIZE, result=None, checkpoint=None):
+    """Imports (row number, row dict) pairs into a section; returns an ImportResult.
+
+    result continues the counts of an earlier, interrupted run. checkpoint, if
+    given, is called as checkpoint(cursor, last row number, result) inside each
+    chunk's transaction, so progress is committed together with the chunk's rows.
+    """
+    result = result or ImportResult()
+    seen_student_emails = set()
+    chunk = []
+    for number, row in rows:
+        chunk.append((number, row))
+        if len(chunk) >= chunk_size:
+            _import_chunk(conn, school_id, section_id, chunk, seen_student_emails, result, checkpoint)
+            chunk = []
+    if chunk:
+        _import_chunk(conn, school_id, section_id, chunk, seen_student_emails, result, checkpoint)
+    return result
+
+
+def _validate(chunk, seen_student_emails, result):
+    valid = []
+    for number, row in chunk:
+        name = (row.get('student_name') or '').strip()
+        parent_email = (row.get('parent_email') or '').strip().lower()
+        student_email = (row.get('student_email') or '').strip().lower() or None
+        if not name or not parent_email:
+            result.error(number, 'Student name and parent email are required')
+        elif not _EMAIL.match(parent_email):
+            result.error(number, f'Invalid parent email "{parent_email}"')
+        elif student_email and not _EMAIL.match(student_email):
+            result.error(number, f'Invalid student email "{student_email}"')
+        elif student_email and (student_email in seen_student_emails or student_email == parent_email):
+            result.error(number, f'Student email "{student_email}" appears more than once')
+        elif len(name) > 100:
+            result.error(number, 'Student name is longer than 100 characters')
+        else:
+            if student_email:
+                seen_student_emails.add(student_email)
+            valid.append((number, name, parent_email, student_email))
+    return valid
+
+
+def _import_chunk(conn, school_id, section_id, chunk, seen_student_emails, result, checkpoint):
+    pending = _validate(chunk, seen_student_emails, result)
+    last_row = chunk[-1][0]
+    cursor = conn.cursor()
+    try:
+        added = 0
+        try:
+            if pending:
+                added = _write_rows(cursor, school_id, section_id, pending, result)
+            result.added += added
+            if checkpoint:
+                checkpoint(cursor, last_row, result)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            result.added -= added
+            print(f"Student import chunk error: {e}")
+            _retry_rows(conn, cursor, school_id, section_id, pending, result, last_row, checkpoint)
+    finally:
+        cursor.close()
+
+
+def _retry_rows(conn, cursor, school_id, section_id, pending, result, last_row, checkpoint):
+    """Writes a failed chunk's rows one by one, each under a savepoint, so a bad row fails alone.
+
+    The rows still commit together with the checkpoint. If that fails too, every
+    row of the chunk is reported as not saved.
+    """
+    saved = (result.added, result.failed, len(result.errors))
+    try:
+        added, failed = 0, []
+        for row in pending:
+            cursor.execute("SAVEPOINT import_row")
+            try:
+                added += _write_rows(cursor, school_id, section_id, [row], result)
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                print(f"Student import row {row[0]} error: {e}")
+                failed.append(row[0])
+        for number in failed:
+            result.error(number, 'Could not be saved')
+        result.added += added
+        if checkpoint:
+            checkpoint(cursor, last_row, result)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Student import retry error: {e}")
+        result.added, result.failed = saved[0], saved[1]
+        del result.errors[saved[2]:]
+        for number, *_ in pending:
+            result.error(number, 'Could not be saved')
+        if checkpoint:
+            checkpoint(cursor, last_row, result)
+            conn.commit()
+
+
+def _write_rows(cursor, school_id, section_id, pending, result):
+    """Writes validated rows; rows that conflict with existing accounts are reported and dropped
+    from pending, which is left holding the rows being written. Returns the number of students added."""
+    parent_emails = sorted({row[2] for row in pending})
+    student_emails = sorted({row[3] for row in pending if row[3]})
+    cursor.execute(
+        f"SELECT id, email, user_type FROM users WHERE email IN ({_placeholders(parent_emails + student_emails)})",
+        parent_emails + student_emails,
+    )
+    accounts = {email.lower(): (user_id, user_type) for user_id, email, user_type in cursor.fetchall()}
+
+    rows = []
+    for number, name, parent_email, student_email in pending:
+        account = accounts.get(parent_email)
+        if account and account[1] != 'parent':
+            result.error(number, f'"{parent_email}" belongs to an account that is not a parent')
+        elif student_email and (student_email in accounts or student_email in parent_emails):
+            result.error(number, f'Student email "{student_email}" is already registered')
+        else:
+            rows.append((number, name, parent_email, student_email))
+    pending[:] = rows
+    if not rows:
+        return 0
+
+    existing = sorted({accounts[row[2]][0] for row in rows if row[2] in accounts})
+    if existing:
+        cursor.execute(
+            f"UPDATE users SET school_id=%s, section_id=%s WHERE user_type='parent' AND id IN ({_placeholders(existing)})",
+            [school_id, section_id] + existing,
+        )
+        result.moved_parents = True
+
+    new_parents = sorted({row[2] for row in rows if row[2] not in accounts})
+    parent_ids = {email: account[0] for email, account in accounts.items()}
+    if new_parents:
+        cursor.executemany(
+            "INSERT INTO users (name, email, password_hash, is_18_or_above, user_type, school_id, section_id) VALUES (%s,%s,%s,%s,%s,%s,%s)",
+            [(email.split('@')[0].title(), email, None, True, 'parent', school_id, section_id) for email in new_parents],
+        )
+        cursor.execute(
+            f"SELECT id, email FROM users WHERE email IN ({_placeholders(new_parents)})",
+            new_parents,
+        )
+        parent_ids.update({email.lower(): user_id for user_id, email in cursor.fetchall()})
+
+    cursor.executemany(
+        """
+        INSERT INTO users (name, email, password_hash, is_18_or_above, user_type, parent_id, school_id, section_id, is_active, pending_parent_email)
+        VALUES (%s,%s,%s,%s,'child',%s,%s,%s,%s,%s)
+        """,
+        [
+            (name, student_email, None, True, parent_ids[parent_email], school_id, section_id, False, parent_email)
+            for _, name, parent_email, student_email in rows
+        ],
+    )
+    # A multi-row insert's lastrowid is its first id; the chunk's children are all at or above it
+    first_child_id = cursor.lastrowid
+    cursor.execute(
+        """
+        INSERT IGNORE INTO parent_children (parent_id, child_id)
+        SELECT parent_id, id FROM users
+        WHERE user_type='child' AND section_id=%s AND parent_id IS NOT NULL AND id >= %s
+          AND NOT EXISTS (SELECT 1 FROM parent_children pc WHERE pc.child_id = users.id)
+        """,
+        (section_id, first_child_id),
+    )
+    return len(rows)
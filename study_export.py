@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import typing_features
+from class_levels import level_of
+
+# Study-wide research data export.
+#
+# One query joins every participant with their demographics, task attempts,
+# scores, typing features and media file names, ordered by participant, and is
+# read through an unbuffered (server-side) cursor in batches, so memory stays
+# flat however large the study grows. Rows are grouped back into participants
+# as they arrive and written out as NDJSON (one participant per line, with
+# their attempts nested) or CSV (one row per attempt), optionally gzipped on
+# the fly. Names and email addresses are left out; user_id links rows back to
+# the admin pages.
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+BATCH_SIZE = 500
+FLUSH_BYTES = 64 * 1024
+# GROUP_CONCAT truncates at 1024 bytes by default, a few dozen file names
+GROUP_CONCAT_MAX_LEN = 1024 * 1024
+
+PARTICIPANT_FIELDS = [
+    'user_id', 'user_type', 'school_id', 'section_id', 'class_level', 'registered_at',
+    'age', 'gender', 'native_language', 'education_level', 'dyslexia_status',
+]
+
+# Per-attempt columns: (output field, SQL expression)
+ATTEMPT_COLUMNS = [
+    ('attempt_id', 'a.id'),
+    ('task_name', 't.task_name'),
+    ('attempt_number', 'a.attempt_number'),
+    ('status', 'a.status'),
+    ('started_at', 'a.started_at'),
+    ('completed_at', 'a.completed_at'),
+    ('comprehension_score', 'cp.score'),
+    ('comprehension_max_score', 'cp.max_score'),
+    ('math_score', 'mcp.score'),
+    ('math_max_score', 'mcp.max_score'),
+    ('aptitude_logical_reasoning_score', 'ap.logical_reasoning_score'),
+    ('aptitude_numerical_ability_score', 'ap.numerical_ability_score'),
+    ('aptitude_verbal_ability_score', 'ap.verbal_ability_score'),
+    ('aptitude_spatial_reasoning_score', 'ap.spatial_reasoning_score'),
+    ('aptitude_total_score', 'ap.total_score'),
+    ('aptitude_max_score', 'ap.max_score'),
+] + [
+    # The histogram and WPM curve are JSON series; the per-attempt scalars are what analyses use
+    (f'typing_{col}', f'tf.{col}') for col in typing_features.COLUMNS if col not in ('iki_histogram', 'wpm_curve')
+] + [
+    ('audio_files', "(SELECT GROUP_CONCAT(ar.filename ORDER BY ar.id SEPARATOR '\\n') "
+                    "FROM audio_recordings ar WHERE ar.attempt_id = a.id)"),
+    ('writing_file', 'ws.filename'),
+]
+ATTEMPT_FIELDS = [field for field, _ in ATTEMPT_COLUMNS]
+
+EXPORT_SQL = """
+    SELECT u.id AS user_id, u.user_type, u.school_id, u.section_id, u.created_at AS registered_at,
+           u.class, sc.name AS class_name,
+           d.age, d.gender, d.native_language, d.education_level, d.dyslexia_status,
+           {attempt_columns}
+    FROM users u
+    LEFT JOIN demographics d ON d.user_id = u.id
+    LEFT JOIN class_sections s ON s.id = u.section_id
+    LEFT JOIN school_classes sc ON sc.id = s.class_id
+    LEFT JOIN user_task_attempts a ON a.user_id = u.id{attempt_filter}
+    LEFT JOIN tasks t ON t.id = a.task_id
+    LEFT JOIN comprehension_progress cp ON cp.attempt_id = a.id
+    LEFT JOIN mathematical_comprehension_progress mcp ON mcp.attempt_id = a.id
+    LEFT JOIN aptitude_progress ap ON ap.attempt_id = a.id
+    LEFT JOIN typing_features tf ON tf.attempt_id = a.id
+    LEFT JOIN writing_samples ws ON ws.attempt_id = a.id
+    WHERE u.user_type IN ('child', 'participant'){user_filter}
+    ORDER BY u.id, a.id
+"""
+
+
+def parse_filters(school_id=None, class_level=None, since=None, until=None):
+    """Validates export filters given as strings (query parameters or CLI options).
+
+    Raises ValueError with a message for the caller to show.
+    """
+    filters = {}
+    try:
+        if school_id not in (None, ''):
+            filters['school_id'] = int(school_id)
+        if class_level not in (None, ''):
+            filters['class_level'] = int(class_level)
+    except ValueError:
+        raise ValueError('school_id and class_level must be numbers')
+    if 'class_level' in filters and not 1 <= filters['class_level'] <= 12:
+        raise ValueError('class_level must be between 1 and 12')
+    for name, value in (('since', since), ('until', until)):
+        if value not in (None, ''):
+            try:
+                filters[name] = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+    return filters
+
+
+def _query(school_id=None, since=None, until=None):
+    user_filter, attempt_filter, params = '', '', []
+    # Dates limit the attempts (by start date), not the participants listed
+    if since:
+        attempt_filter += ' AND a.started_at >= %s'
+        params.append(since)
+    if until:
+        attempt_filter += ' AND a.started_at < %s'
+        params.append(until + timedelta(days=1))
+    if school_id is not None:
+        user_filter += ' AND u.school_id = %s'
+        params.append(school_id)
+    sql = EXPORT_SQL.format(
+        attempt_columns=',\n           '.join(f'{expr} AS {field}' for field, expr in ATTEMPT_COLUMNS),
+        attempt_filter=attempt_filter,
+        user_filter=user_filter,
+    )
+    return sql, params
+
+
+def _attempt(row):
+    attempt = {field: row[field] for field in ATTEMPT_FIELDS}
+    attempt['audio_files'] = attempt['audio_files'].split('\n') if attempt['audio_files'] else []
+    return attempt
+
+
+def participants(conn, school_id=None, class_level=None, since=None, until=None, batch_size=BATCH_SIZE):
+    """Yields one dict per participant, in user id order, with their attempts under 'attempts'."""
+    sql, params = _query(school_id, since, until)
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(f"SET SESSION group_concat_max_len = {GROUP_CONCAT_MAX_LEN}")
+        cursor.execute(sql, params)
+        current = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                if current is None or current['user_id'] != row['user_id']:
+                    if current is not None and (class_level is None or current['class_level'] == class_level):
+                        yield current
+                    current = {field: row.get(field) for field in PARTICIPANT_FIELDS}
+                    current['class_level'] = level_of(row)
+                    current['attempts'] = []
+                if row['attempt_id'] is not None:
+                    current['attempts'].append(_attempt(row))
+        if current is not None and (class_level is None or current['class_level'] == class_level):
+            yield current
+    finally:
+        if conn.unread_result:
+            # The download was abandoned; the rest of the result must be read before the connection is reused
+            conn.consume_results()
+        cursor.close()
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, default=_value, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    """One row per attempt; participants without attempts get a row with the attempt columns empty."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(['' if value is None else _value(value) for value in values])
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(PARTICIPANT_FIELDS + ATTEMPT_FIELDS)
+    for record in records:
+        participant = [record[field] for field in PARTICIPANT_FIELDS]
+        for attempt in record['attempts'] or [None]:
+            if attempt is None:
+                yield line(participant + [None] * len(ATTEMPT_FIELDS))
+            else:
+                values = [attempt[field] for field in ATTEMPT_FIELDS]
+                values[ATTEMPT_FIELDS.index('audio_files')] = ' '.join(attempt['audio_files']) or None
+                yield line(participant + values)
+
+
+def stream(conn, fmt='ndjson', compress=False, **filters):
+    """Yields the export as bytes in chunks of about FLUSH_BYTES, gzipped when compress is set."""
+    lines = (ndjson_lines if fmt == 'ndjson' else csv_lines)(participants(conn, **filters))
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    pending, size = [], 0
+    try:
+        for text in lines:
+            pending.append(text)
+            size += len(text)
+            if size < FLUSH_BYTES:
+                continue
+            data = ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+            data = gzip.compress(data) if gzip else data
+            if data:
+                yield data
+        data = ''.join(pending).encode('utf-8')
+        if gzip:
+            data = gzip.compress(data) + gzip.flush()
+        if data:
+            yield data
+    except Exception as e:
+        print(f"Study export error: {e}")
+        raise
@@ -0,0 +1,293 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+import typing_features
+from class_levels import level_of
+
+# Columnar snapshot of the study data for analysis.
+#
+# `flask snapshot` writes participants (users with demographics and their
+# resolved class level) and completed attempts (with comprehension, math and
+# aptitude scores and typing features joined in) to a directory of typed .npy
+# columns that np.load can memory-map:
+#
+#   manifest.json              row counts, column kinds, the incremental watermark
+#   strings.json               string table; text columns hold int32 codes into it
+#   participants/<column>.npy  rewritten on every build (demographics change)
+#   attempts/<column>.npy      appended to: a rebuild only adds attempts
+#                              completed since the previous snapshot
+#
+# Missing values are -1 in id, integer and code columns, NaN in float columns
+# and NaT in time columns. Read a snapshot with load().
+
+VERSION = 1
+BATCH_SIZE = 5000
+
+# Column kinds: numpy dtype and the stored value for NULL
+KINDS = {
+    'id': (np.int32, -1),
+    'int': (np.int16, -1),
+    'code': (np.int32, -1),
+    'float': (np.float32, np.nan),
+    'time': ('datetime64[s]', np.datetime64('NaT')),
+}
+
+# (column, SQL expression, kind)
+PARTICIPANT_COLUMNS = [
+    ('user_id', 'u.id', 'id'),
+    ('user_type', 'u.user_type', 'code'),
+    ('school_id', 'u.school_id', 'id'),
+    ('section_id', 'u.section_id', 'id'),
+    ('class_level', None, 'int'),  # resolved in Python with class_levels.level_of
+    ('registered_at', 'u.created_at', 'time'),
+    ('age', 'd.age', 'int'),
+    ('gender', 'd.gender', 'code'),
+    ('native_language', 'd.native_language', 'code'),
+    ('education_level', 'd.education_level', 'code'),
+    ('dyslexia_status', 'd.dyslexia_status', 'code'),
+]
+
+ATTEMPT_COLUMNS = [
+    ('attempt_id', 'a.id', 'id'),
+    ('user_id', 'a.user_id', 'id'),
+    ('task_name', 't.task_name', 'code'),
+    ('attempt_number', 'a.attempt_number', 'int'),
+    ('started_at', 'a.started_at', 'time'),
+    ('completed_at', 'a.completed_at', 'time'),
+    ('comprehension_score', 'cp.score', 'float'),
+    ('comprehension_max_score', 'cp.max_score', 'float'),
+    ('math_score', 'mcp.score', 'float'),
+    ('math_max_score', 'mcp.max_score', 'float'),
+    ('aptitude_logical_reasoning_score', 'ap.logical_reasoning_score', 'float'),
+    ('aptitude_numerical_ability_score', 'ap.numerical_ability_score', 'float'),
+    ('aptitude_verbal_ability_score', 'ap.verbal_ability_score', 'float'),
+    ('aptitude_spatial_reasoning_score', 'ap.spatial_reasoning_score', 'float'),
+    ('aptitude_total_score', 'ap.total_score', 'float'),
+    ('aptitude_max_score', 'ap.max_score', 'float'),
+] + [
+    (f'typing_{col}', f'tf.{col}', 'float')
+    for col in typing_features.COLUMNS if col not in ('iki_histogram', 'wpm_curve')
+]
+
+PARTICIPANTS_SQL = f"""
+    SELECT {', '.join(f'{expr} AS {name}' for name, expr, _ in PARTICIPANT_COLUMNS if expr)},
+           u.class, sc.name AS class_name
+    FROM users u
+    LEFT JOIN demographics d ON d.user_id = u.id
+    LEFT JOIN class_sections s ON s.id = u.section_id
+    LEFT JOIN school_classes sc ON sc.id = s.class_id
+    WHERE u.user_type IN ('child', 'participant')
+    ORDER BY u.id
+"""
+
+ATTEMPTS_SQL = f"""
+    SELECT {', '.join(f'{expr} AS {name}' for name, expr, _ in ATTEMPT_COLUMNS)}
+    FROM user_task_attempts a
+    JOIN users u ON u.id = a.user_id
+    LEFT JOIN tasks t ON t.id = a.task_id
+    LEFT JOIN comprehension_progress cp ON cp.attempt_id = a.id
+    LEFT JOIN mathematical_comprehension_progress mcp ON mcp.attempt_id = a.id
+    LEFT JOIN aptitude_progress ap ON ap.attempt_id = a.id
+    LEFT JOIN typing_features tf ON tf.attempt_id = a.id
+    WHERE u.user_type IN ('child', 'participant')
+      AND a.status = 'Completed' AND a.completed_at IS NOT NULL{{since}}
+    ORDER BY a.completed_at, a.id
+"""
+
+
+class StringTable:
+    """Dictionary encoding for text columns; codes never change once assigned."""
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self._codes = {value: code for code, value in enumerate(self.strings)}
+
+    def code(self, value):
+        if value is None:
+            return -1
+        value = str(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+
+def _column(values, kind, strings):
+    dtype, missing = KINDS[kind]
+    if kind == 'code':
+        return np.array([strings.code(value) for value in values], dtype=dtype)
+    if kind == 'time':
+        return np.array([missing if value is None else np.datetime64(value, 's') for value in values], dtype=dtype)
+    return np.array([missing if value is None else value for value in values], dtype=dtype)
+
+
+def _columns(rows, spec, strings):
+    return {name: _column([row[name] for row in rows], kind, strings) for name, _, kind in spec}
+
+
+def _append(path, values, rows):
+    """Appends values to a 1-d .npy file holding `rows` valid rows, rewriting its header in place.
+
+    Bytes past `rows` (left by a build that stopped before updating the
+    manifest) are truncated first.
+    """
+    with open(path, 'r+b') as fh:
+        version = npy_format.read_magic(fh)
+        read_header = npy_format.read_array_header_1_0 if version == (1, 0) else npy_format.read_array_header_2_0
+        _, fortran_order, dtype = read_header(fh)
+        data_start = fh.tell()
+        fh.truncate(data_start + rows * dtype.itemsize)
+        fh.seek(0, os.SEEK_END)
+        fh.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        fh.seek(0)
+        header = {'descr': npy_format.dtype_to_descr(dtype), 'fortran_order': fortran_order, 'shape': (rows + len(values),)}
+        # .npy headers are padded so the row count can grow without moving the data
+        if version == (1, 0):
+            npy_format.write_array_header_1_0(fh, header)
+        else:
+            npy_format.write_array_header_2_0(fh, header)
+        if fh.tell() != data_start:
+            raise ValueError(f"{path}: header no longer fits, rebuild with --full")
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(folder):
+    try:
+        with open(os.path.join(folder, 'manifest.json'), encoding='utf-8') as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        return None
+    if manifest.get('version') != VERSION:
+        return None
+    return manifest
+
+
+def _participant_columns(conn, strings):
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(PARTICIPANTS_SQL)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    for row in rows:
+        row['class_level'] = level_of(row)
+    return len(rows), _columns(rows, PARTICIPANT_COLUMNS, strings)
+
+
+def _save_participants(folder, columns):
+    tmp_folder = os.path.join(folder, 'participants.tmp')
+    shutil.rmtree(tmp_folder, ignore_errors=True)
+    os.makedirs(tmp_folder)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_folder, f'{name}.npy'), values)
+    final_folder = os.path.join(folder, 'participants')
+    shutil.rmtree(final_folder, ignore_errors=True)
+    os.replace(tmp_folder, final_folder)
+
+
+def build(conn, folder, full=False, batch_size=BATCH_SIZE):
+    """Builds or updates the snapshot in folder; returns (participants, attempts added, attempts total).
+
+    Unless full is set, an existing snapshot keeps its attempts and only
+    attempts completed after its watermark are appended.
+    """
+    manifest = None if full else _read_manifest(folder)
+    attempts_folder = os.path.join(folder, 'attempts')
+    if manifest is None:
+        # Only the snapshot's own files are replaced; folder may be any directory
+        for name in ('manifest.json', 'strings.json'):
+            if os.path.exists(os.path.join(folder, name)):
+                os.remove(os.path.join(folder, name))
+        shutil.rmtree(attempts_folder, ignore_errors=True)
+        os.makedirs(attempts_folder)
+        for name, _, kind in ATTEMPT_COLUMNS:
+            np.save(os.path.join(attempts_folder, f'{name}.npy'), np.zeros(0, dtype=KINDS[kind][0]))
+        manifest = {'version': VERSION, 'tables': {'attempts': {'rows': 0}}, 'watermark': None}
+        strings = StringTable()
+    else:
+        with open(os.path.join(folder, 'strings.json'), encoding='utf-8') as fh:
+            strings = StringTable(json.load(fh))
+
+    rows_before = rows_total = manifest['tables']['attempts']['rows']
+    watermark = manifest['watermark']
+    since, params, seen = '', [], set()
+    if watermark:
+        watermark['completed_at'] = datetime.fromisoformat(watermark['completed_at'])
+        # Attempts completed in the watermark's second may not all have been there last time
+        since = ' AND a.completed_at >= %s'
+        params.append(watermark['completed_at'])
+        seen = set(watermark['attempt_ids'])
+
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(ATTEMPTS_SQL.format(since=since), params)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            rows = [row for row in batch if row['attempt_id'] not in seen]
+            if not rows:
+                continue
+            for name, values in _columns(rows, ATTEMPT_COLUMNS, strings).items():
+                _append(os.path.join(attempts_folder, f'{name}.npy'), values, rows_total)
+            rows_total += len(rows)
+            last = rows[-1]['completed_at']
+            if watermark is None or last != watermark['completed_at']:
+                watermark = {'completed_at': last, 'attempt_ids': []}
+            watermark['attempt_ids'] += [row['attempt_id'] for row in rows if row['completed_at'] == last]
+    finally:
+        cursor.close()
+
+    participants, participant_columns = _participant_columns(conn, strings)
+    # The string table only grows, so writing it first keeps the previous manifest valid
+    _write_json(os.path.join(folder, 'strings.json'), strings.strings)
+    _save_participants(folder, participant_columns)
+    if watermark:
+        watermark['completed_at'] = watermark['completed_at'].isoformat(sep=' ')
+    manifest.update({
+        'built_at': datetime.now().isoformat(timespec='seconds'),
+        'watermark': watermark,
+        'tables': {
+            'participants': {'rows': participants, 'columns': {name: kind for name, _, kind in PARTICIPANT_COLUMNS}},
+            'attempts': {'rows': rows_total, 'columns': {name: kind for name, _, kind in ATTEMPT_COLUMNS}},
+        },
+    })
+    _write_json(os.path.join(folder, 'manifest.json'), manifest)
+    return participants, rows_total - rows_before, rows_total
+
+
+def load(folder, mmap=True):
+    """Reads a snapshot: {'strings': [...], 'participants': {column: array}, 'attempts': {...}}.
+
+    Columns are memory-mapped read-only unless mmap is False. Text columns hold
+    codes; decode them with decode(snapshot, column).
+    """
+    manifest = _read_manifest(folder)
+    if manifest is None:
+        raise FileNotFoundError(f"no snapshot in {folder}")
+    with open(os.path.join(folder, 'strings.json'), encoding='utf-8') as fh:
+        snapshot = {'strings': json.load(fh), 'manifest': manifest}
+    for table, info in manifest['tables'].items():
+        snapshot[table] = {
+            name: np.load(os.path.join(folder, table, f'{name}.npy'), mmap_mode='r' if mmap else None)[:info['rows']]
+            for name in info['columns']
+        }
+    return snapshot
+
+
+def decode(snapshot, codes):
+    """Turns a code column into an object array of strings (None for missing)."""
+    table = np.array(snapshot['strings'] + [None], dtype=object)
+    return table[np.where(codes < 0, len(snapshot['strings']), codes)]
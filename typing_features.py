@@ -0,0 +1,242 @@
+import json
+import math
+
+import numpy as np
+
+from keystroke_codec import decode
+
+# Typing-dynamics features per attempt, computed from the stored keystroke log.
+# The typing page logs keydown events only, so key hold (dwell) times are not
+# available; everything here is derived from keydown timestamps, keys and the
+# textarea length after each key.
+
+PAUSE_MS = 2000        # inter-key gap that ends a typing burst
+WPM_WINDOW_MS = 30000  # window of the words-per-minute curve
+MAX_WPM_WINDOWS = 240  # the curve covers at most the first two hours
+IKI_BINS = [0, 50, 100, 150, 200, 300, 400, 600, 800, 1000, 1500, 2000, np.inf]
+
+TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS typing_features (
+        attempt_id INT PRIMARY KEY,
+        event_count INT NOT NULL,
+        char_count INT NOT NULL,
+        backspace_count INT NOT NULL,
+        delete_count INT NOT NULL,
+        correction_rate FLOAT,
+        iki_mean FLOAT,
+        iki_median FLOAT,
+        iki_std FLOAT,
+        iki_p10 FLOAT,
+        iki_p90 FLOAT,
+        iki_histogram TEXT,
+        pause_count INT NOT NULL,
+        pause_total_ms BIGINT NOT NULL,
+        burst_count INT NOT NULL,
+        burst_mean_len FLOAT,
+        burst_max_len INT,
+        duration_ms BIGINT NOT NULL,
+        final_length INT NOT NULL,
+        wpm FLOAT,
+        wpm_curve TEXT,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        FOREIGN KEY (attempt_id) REFERENCES user_task_attempts(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+COLUMNS = [
+    'event_count', 'char_count', 'backspace_count', 'delete_count', 'correction_rate',
+    'iki_mean', 'iki_median', 'iki_std', 'iki_p10', 'iki_p90', 'iki_histogram',
+    'pause_count', 'pause_total_ms', 'burst_count', 'burst_mean_len', 'burst_max_len',
+    'duration_ms', 'final_length', 'wpm', 'wpm_curve',
+]
+
+UPSERT_SQL = f"""
+    INSERT INTO typing_features (attempt_id, {', '.join(COLUMNS)})
+    VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})
+    ON DUPLICATE KEY UPDATE {', '.join(f'{col}=VALUES({col})' for col in COLUMNS)}
+"""
+
+
+def ensure_table(conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TABLE_DDL)
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _events_from_row(keystrokes, keystrokes_packed):
+    if keystrokes_packed is not None:
+        events = decode(bytes(keystrokes_packed))
+    elif keystrokes:
+        try:
+            events = json.loads(keystrokes)
+        except ValueError:
+            return []
+    else:
+        return []
+    return events if isinstance(events, list) else []
+
+
+def _round(value, digits=2):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+def extract(events):
+    """Computes the feature dict for one keystroke log (None if it has no usable events)."""
+    usable = [
+        e for e in events
+        if isinstance(e, dict) and isinstance(e.get('time'), (int, float)) and math.isfinite(e['time'])
+        and isinstance(e.get('key'), str)
+    ]
+    if not usable:
+        return None
+
+    # One pass to columns, then everything else is array arithmetic
+    times = np.fromiter((e['time'] for e in usable), dtype=np.float64, count=len(usable))
+    keys = np.array([e['key'] for e in usable], dtype=object)
+    lengths = np.fromiter(
+        (len(e['value']) if isinstance(e.get('value'), str) else -1 for e in usable),
+        dtype=np.int64, count=len(usable),
+    )
+    n = len(usable)
+
+    is_backspace = keys == 'Backspace'
+    is_delete = keys == 'Delete'
+    is_char = np.fromiter((len(k) == 1 for k in keys), dtype=bool, count=n)
+    corrections = int(is_backspace.sum() + is_delete.sum())
+
+    iki = np.diff(times)
+    iki = iki[iki >= 0]
+    is_pause = iki > PAUSE_MS
+    flow = iki[~is_pause]
+
+    # Bursts are the runs of keys between pauses
+    pause_at = np.flatnonzero(np.diff(times) > PAUSE_MS)
+    bursts = np.diff(np.concatenate(([0], pause_at + 1, [n])))
+
+    # Client clocks can step back; a key never counts as earlier than the one before it
+    elapsed = np.maximum.accumulate(times) - times[0]
+    duration = float(elapsed[-1])
+    char_count = int(is_char.sum())
+    if duration > 0:
+        wpm = (char_count / 5) / (duration / 60000)
+        # Bounded however far apart the timestamps are; keys past the last window are left out
+        covered = min(duration, MAX_WPM_WINDOWS * WPM_WINDOW_MS)
+        windows = max(int(math.ceil(covered / WPM_WINDOW_MS)), 1)
+        per_window, _ = np.histogram(
+            elapsed, bins=windows, range=(0, windows * WPM_WINDOW_MS), weights=is_char.astype(np.float64)
+        )
+        # The last window is usually partial; rate it over the time it actually covers
+        spans = np.full(windows, float(WPM_WINDOW_MS))
+        spans[-1] = max(covered - (windows - 1) * WPM_WINDOW_MS, 1000.0)
+        wpm_curve = [round(float(v), 1) for v in per_window / 5 / (spans / 60000)]
+    else:
+        wpm, wpm_curve = None, []
+
+    if flow.size:
+        p10, median, p90 = np.percentile(flow, [10, 50, 90])
+        iki_mean, iki_std = flow.mean(), flow.std()
+    else:
+        p10 = median = p90 = iki_mean = iki_std = None
+    histogram, _ = np.histogram(iki, bins=IKI_BINS)
+
+    return {
+        'event_count': n,
+        'char_count': char_count,
+        'backspace_count': int(is_backspace.sum()),
+        'delete_count': int(is_delete.sum()),
+        'correction_rate': _round(corrections / n, 4),
+        'iki_mean': _round(iki_mean),
+        'iki_median': _round(median),
+        'iki_std': _round(iki_std),
+        'iki_p10': _round(p10),
+        'iki_p90': _round(p90),
+        'iki_histogram': json.dumps({'bins_ms': IKI_BINS[:-1], 'counts': histogram.tolist()}),
+        'pause_count': int(is_pause.sum()),
+        'pause_total_ms': int(iki[is_pause].sum()),
+        'burst_count': int(bursts.size),
+        'burst_mean_len': _round(bursts.mean()),
+        'burst_max_len': int(bursts.max()),
+        'duration_ms': int(duration),
+        'final_length': int(max(lengths[-1], 0)),
+        'wpm': _round(wpm),
+        'wpm_curve': json.dumps(wpm_curve),
+    }
+
+
+def _params(attempt_id, features):
+    return [attempt_id] + [features[col] for col in COLUMNS]
+
+
+def refresh_attempt(conn, attempt_id, events):
+    """Recomputes and upserts one attempt's features (the caller commits)."""
+    features = extract(events)
+    if features is None:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute(UPSERT_SQL, _params(attempt_id, features))
+    finally:
+        cursor.close()
+    return features
+
+
+def refresh_stored(conn, attempt_id):
+    """Recomputes one attempt's features from its saved typing_progress row (the caller commits)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT keystrokes, keystrokes_packed FROM typing_progress
+            WHERE attempt_id = %s
+            ORDER BY id DESC
+            LIMIT 1
+        """, (attempt_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row:
+        return None
+    return refresh_attempt(conn, attempt_id, _events_from_row(*row))
+
+
+def refresh_all(conn, batch_size=500):
+    """Recomputes features for every stored keystroke log in one pass over typing_progress.
+
+    Rows are read in id order, batch by batch, so memory stays bounded by the batch.
+    Returns (attempts processed, attempts skipped).
+    """
+    processed = skipped = 0
+    last_id = 0
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute("""
+                SELECT id, attempt_id, keystrokes, keystrokes_packed FROM typing_progress
+                WHERE id > %s AND (keystrokes IS NOT NULL OR keystrokes_packed IS NOT NULL)
+                ORDER BY id
+                LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            batch = []
+            for row_id, attempt_id, keystrokes, keystrokes_packed in rows:
+                last_id = row_id
+                try:
+                    features = extract(_events_from_row(keystrokes, keystrokes_packed))
+                except Exception as e:
+                    print(f"Typing features error for typing_progress.id={row_id}: {e}")
+                    features = None
+                if features is None:
+                    skipped += 1
+                    continue
+                batch.append(_params(attempt_id, features))
+            if batch:
+                cursor.executemany(UPSERT_SQL, batch)
+            conn.commit()
+            processed += len(batch)
+    finally:
+        cursor.close()
+    return processed, skipped